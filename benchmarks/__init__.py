@@ -0,0 +1,5 @@
+"""
+Benchmarks of the tracer's call overhead, serialization, thread scaling, flush batching and connector ingest.
+
+Run them with `python -m benchmarks`, see `python -m benchmarks --help`.
+"""
@@ -0,0 +1,79 @@
+import argparse
+import json
+import sys
+from . import connectors, flush_limit, overhead, serialization, threads
+from .common import environment
+
+SUITES = {
+    'overhead': overhead.run,
+    'serialization': serialization.run,
+    'threads': threads.run,
+    'flush_limit': flush_limit.run,
+    'connectors': connectors.run,
+}
+
+
+def describe(result: dict) -> str:
+    parts = []
+    for key in ('events_per_second', 'tasks_per_second'):
+        if key in result:
+            parts.append(f"{result[key]:>12,.0f} {key.replace('_', ' ')}")
+    if 'median_ns' in result:
+        parts.append(f"median {result['median_ns'] / 1000:>9.2f}us  p99 {result['p99_ns'] / 1000:>9.2f}us")
+    return '  '.join(parts)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns the cases that got slower than the baseline by more than threshold (0.1 is 10%).
+    Medians are compared for timings, lower is better, and throughputs for ingest and scaling runs, higher is better.
+    """
+    regressions = []
+    for suite, cases in results.items():
+        for case, result in cases.items():
+            previous = baseline.get('results', {}).get(suite, {}).get(case)
+            if not isinstance(result, dict) or not isinstance(previous, dict):
+                continue
+            for key, higher_is_better in (('median_ns', False), ('events_per_second', True), ('tasks_per_second', True)):
+                if not result.get(key) or not previous.get(key):
+                    continue
+                change = result[key] / previous[key] - 1
+                if (-change if higher_is_better else change) > threshold:
+                    regressions.append(f"{suite}/{case}: {key} {previous[key]} -> {result[key]} ({change:+.1%})")
+    return regressions
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the extensitrace tracer and connectors.')
+    parser.add_argument('suites', nargs='*', help=f"Suites to run, all by default: {', '.join(SUITES)}")
+    parser.add_argument('--quick', action='store_true', help='Fewer iterations, for smoke testing')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the results are written to')
+    parser.add_argument('--compare', metavar='BASELINE', help='Results file of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown reported as a regression')
+    arguments = parser.parse_args(arguments)
+    unknown = [suite for suite in arguments.suites if suite not in SUITES]
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(unknown)}")
+
+    results = {}
+    for suite in arguments.suites or SUITES:
+        print(f'== {suite}')
+        results[suite] = SUITES[suite](quick=arguments.quick)
+        for case, result in results[suite].items():
+            if isinstance(result, dict):
+                print(f'  {case:<40} {describe(result)}')
+    with open(arguments.output, 'w') as f:
+        json.dump({'environment': environment(), 'quick': arguments.quick, 'results': results}, f, indent=2)
+    print(f'Results written to {arguments.output}')
+
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            regressions = compare(results, json.load(f), arguments.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
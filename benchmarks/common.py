@@ -0,0 +1,113 @@
+import os
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+import gc
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+class NullConnector(BaseConnector):
+    def flush(self, logs):
+        return True
+
+
+def tracer(**kwargs) -> ExtensiTrace:
+    """
+    Returns a new tracer with the given options, closing the one created by the previous benchmark.
+    ExtensiTrace is a singleton, so every configuration replaces the instance.
+    """
+    ExtensiTrace.reset()
+    kwargs.setdefault('connector', NullConnector())
+    return ExtensiTrace(**kwargs)
+
+
+def scratch_dir() -> str:
+    """
+    Returns a new directory on tmpfs when available, so file connectors measure encoding and syscalls rather than the disk.
+    """
+    root = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+    return tempfile.mkdtemp(prefix='extensitrace-bench-', dir=root)
+
+
+def measure(run, number: int, repeat: int=20, warmup: int=2) -> dict:
+    """
+    Calls run(number) repeat times after warmup calls and returns statistics of the time per operation.
+
+    :param run: Callable performing number operations.
+    :param number: Operations per sample, large enough for a sample to take well over a timer tick.
+    """
+    for _ in range(warmup):
+        run(number)
+    gc.collect()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        run(number)
+        samples.append((time.perf_counter_ns() - start) / number)
+    return {**summarize(samples), 'number': number, 'repeat': repeat}
+
+
+def summarize(samples_ns: list) -> dict:
+    """
+    Returns mean, percentiles and throughput of per-operation times in nanoseconds.
+    """
+    ordered = sorted(samples_ns)
+    mean = sum(ordered) / len(ordered)
+    return {
+        'mean_ns': round(mean, 1),
+        'median_ns': round(percentile(ordered, 50), 1),
+        'p90_ns': round(percentile(ordered, 90), 1),
+        'p99_ns': round(percentile(ordered, 99), 1),
+        'min_ns': round(ordered[0], 1),
+        'max_ns': round(ordered[-1], 1),
+        'ops_per_second': round(1e9 / mean, 1) if mean else None,
+    }
+
+
+def percentile(ordered: list, q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    index = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def event(index: int, payload_bytes: int=1000, task_size: int=10) -> dict:
+    """
+    Returns an event shaped like the ones the tracer records, with a string argument of payload_bytes.
+    """
+    return {'log_id': f'log_{index}', 'function_name': 'step', 'start_time': 1700000000.0 + index, 'end_time': 1700000000.5 + index,
+            'args': {'prompt': 'x' * payload_bytes, 'index': index}, 'result': {'value': index}, 'task_id': f'task_{index // task_size}',
+            'agent_id': 'benchmark', 'parent_log_id': None, 'metadata': None, 'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+def environment() -> dict:
+    """
+    Describes the machine and revision the results were measured on.
+    """
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    optional = {}
+    for module in ('orjson', 'msgpack', 'pyarrow', 'mongomock', 'zstandard'):
+        try:
+            __import__(module)
+            optional[module] = True
+        except ImportError:
+            optional[module] = False
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': revision,
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'optional_packages': optional,
+    }
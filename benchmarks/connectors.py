@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from extensitrace.collector import Collector
+from extensitrace.connectors import CollectorConnector, ExtensibleConnector, MongoConnector
+from extensitrace.connectors.local_connector import LocalConnector
+from extensitrace.event import Event
+from .common import NullConnector, event, scratch_dir
+
+
+class DiscardHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the Extensible API, reads and discards the request body.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def ingest(connector, batches: list, finish=None) -> dict:
+    """
+    Flushes the batches through the connector and returns its throughput.
+    finish is called before the clock stops, for connectors that buffer or write asynchronously.
+    """
+    connector.flush(batches[0])
+    count = sum(len(batch) for batch in batches[1:])
+    start = time.perf_counter()
+    failed = 0
+    for batch in batches[1:]:
+        if connector.flush(batch) is False:
+            failed += 1
+    if finish is not None:
+        finish()
+    elapsed = time.perf_counter() - start
+    return {'events': count, 'batch_size': len(batches[1]), 'seconds': round(elapsed, 4),
+            'events_per_second': round(count / elapsed, 1), 'failed_batches': failed}
+
+
+def local_connectors(directory: str) -> dict:
+    connectors = {'local': lambda: LocalConnector(f'{directory}/events.jsonl'),
+                  'local_gzip': lambda: LocalConnector(f'{directory}/events.jsonl.gz', compression='gzip'),
+                  'local_dedup': lambda: LocalConnector(f'{directory}/dedup.jsonl', dedup=True)}
+    try:
+        import zstandard
+        connectors['local_zstd'] = lambda: LocalConnector(f'{directory}/events.jsonl.zst', compression='zstd')
+    except ImportError:
+        pass
+    return connectors
+
+
+def run(quick: bool=False) -> dict:
+    """
+    Ingest throughput of every connector against a local stand-in: files on tmpfs, an in-process HTTP server,
+    mongomock, and a collector on a unix socket. Stand-ins leave out the network and the database, so the
+    numbers are the encoding and client-side cost each connector adds on top of its backend.
+    PostgresConnector is measured against a real server when EXTENSITRACE_BENCH_POSTGRES holds a connection string.
+    """
+    batch_size, batch_count = (100, 11) if quick else (500, 41)
+    logs = [event(index) for index in range(batch_size * batch_count)]
+    batches = [logs[index:index + batch_size] for index in range(0, len(logs), batch_size)]
+    compact_batches = [[Event(**log) for log in batch] for batch in batches]
+    directory = scratch_dir()
+    results = {}
+    try:
+        for name, create in local_connectors(directory).items():
+            connector = create()
+            results[name] = ingest(connector, batches)
+            connector.close()
+        connector = LocalConnector(f'{directory}/compact.jsonl')
+        results['local_compact_events'] = ingest(connector, compact_batches)
+        connector.close()
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), DiscardHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = f'http://127.0.0.1:{server.server_address[1]}/api/push_tasks'
+        results['extensible'] = ingest(ExtensibleConnector(endpoint), batches)
+        results['extensible_gzip'] = ingest(ExtensibleConnector(endpoint, compress=True), batches)
+        server.shutdown()
+
+        collector = Collector(NullConnector(), f'{directory}/collector.sock', max_linger_time=0.01).start()
+        expected = len(logs)
+
+        def received():
+            deadline = time.monotonic() + 30
+            while collector.stats()['received'] < expected and time.monotonic() < deadline:
+                time.sleep(0.001)
+
+        for wire_format in ('json', 'msgpack'):
+            try:
+                connector = CollectorConnector(f'{directory}/collector.sock', wire_format=wire_format)
+                results[f'collector_{wire_format}'] = ingest(connector, batches, finish=received)
+            except ImportError:
+                continue
+            connector.close()
+            expected += len(logs)
+        collector.close()
+
+        try:
+            import mongomock
+            connector = MongoConnector('', 'benchmark', 'events', client=mongomock.MongoClient())
+            results['mongo_mongomock'] = ingest(connector, batches)
+        except ImportError:
+            pass
+
+        try:
+            from extensitrace.connectors import ParquetConnector
+            connector = ParquetConnector(f'{directory}/parquet', row_group_size=batch_size * 10)
+            results['parquet'] = ingest(connector, batches, finish=connector.close)
+        except ImportError:
+            pass
+
+        connection_string = os.environ.get('EXTENSITRACE_BENCH_POSTGRES')
+        if connection_string:
+            from extensitrace.connectors import PostgresConnector
+            table = f'extensitrace_benchmark_{os.getpid()}'
+            results['postgres'] = ingest(PostgresConnector(connection_string, table), batches)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
@@ -0,0 +1,45 @@
+import shutil
+import time
+from extensitrace.connectors.local_connector import LocalConnector
+from .common import scratch_dir, tracer
+
+FLUSH_LIMITS = (1, 10, 100, 1000)
+
+
+def run(quick: bool=False) -> dict:
+    """
+    Effect of task_flush_limit on the call path and on end to end throughput into a LocalConnector on tmpfs.
+    call_ns is the time spent in traced code per task, total_seconds includes waiting for the connector to write everything.
+    """
+    tasks = 2000 if quick else 20000
+    directory = scratch_dir()
+    results = {}
+    try:
+        for limit in FLUSH_LIMITS:
+            connector = LocalConnector(f'{directory}/flush_limit_{limit}.jsonl')
+            et = tracer(connector=connector, task_flush_limit=limit, max_queue_size=100000, max_batch_size=1000)
+
+            @et.log()
+            def step(value):
+                return {'value': value}
+
+            @et.log(track=True)
+            def task(value):
+                return step(value)
+
+            start = time.perf_counter()
+            for value in range(tasks):
+                task(value)
+            called = time.perf_counter() - start
+            et.flush()
+            total = time.perf_counter() - start
+            stats = et.flush_stats()
+            connector.close()
+            results[f'task_flush_limit/{limit}'] = {
+                'task_flush_limit': limit, 'tasks': tasks, 'call_ns': round(called / tasks * 1e9, 1),
+                'total_seconds': round(total, 4), 'tasks_per_second': round(tasks / total, 1),
+                'flushed': stats['flushed'], 'dropped': stats['dropped'],
+            }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
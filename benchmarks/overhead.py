@@ -0,0 +1,53 @@
+from .common import measure, tracer
+
+
+def bare(a, b):
+    return a
+
+
+def build(et):
+    """
+    Decorates the benchmark functions with the given tracer.
+    """
+    @et.log()
+    def nested(a, b):
+        return a
+
+    @et.log()
+    def deep(depth):
+        return deep(depth - 1) if depth > 1 else depth
+
+    @et.log(track=True)
+    def flat(a, b):
+        return a
+
+    @et.log(track=True)
+    def task(calls):
+        for _ in range(calls):
+            nested(1, 'b')
+
+    @et.log(track=True)
+    def deep_task(calls, depth):
+        for _ in range(calls):
+            deep(depth)
+
+    return flat, task, deep_task
+
+
+def run(quick: bool=False) -> dict:
+    """
+    Time per decorated call, next to an undecorated call, for top level (one task per call), nested and deeply nested calls.
+    """
+    number, repeat = (2000, 5) if quick else (20000, 20)
+    results = {'undecorated': measure(lambda n: [bare(1, 'b') for _ in range(n)], number, repeat)}
+    configurations = {'default': {}, 'compact_events': {'compact_events': True}, 'metrics': {'metrics': True},
+                      'task_summary': {'task_summary': True}}
+    for name, options in configurations.items():
+        et = tracer(**options)
+        flat, task, deep_task = build(et)
+        results[f'{name}/top_level'] = measure(lambda n: [flat(1, 'b') for _ in range(n)], number, repeat)
+        results[f'{name}/nested'] = measure(task, number, repeat)
+        results[f'{name}/depth_10'] = measure(lambda n: deep_task(n // 10, 10), number, repeat)
+        et.flush()
+        results[f'{name}/top_level']['dropped'] = et.flush_stats()['dropped']
+    return results
@@ -0,0 +1,42 @@
+from extensitrace.event import Event, encode_json
+from extensitrace.serializer import Serializer
+from .common import event, measure, tracer
+
+PAYLOAD_BYTES = (100, 1000, 10000, 100000)
+
+
+def history(payload_bytes: int) -> list:
+    """
+    Returns a chat history of about payload_bytes, in messages of up to 500 characters.
+    """
+    count = max(payload_bytes // 500, 1)
+    return [{'role': 'user' if index % 2 else 'assistant', 'content': 'x' * min(payload_bytes, 500)} for index in range(count)]
+
+
+def run(quick: bool=False) -> dict:
+    """
+    Cost of serializing arguments, encoding events and of a whole traced call, by payload size.
+    """
+    repeat, limit, budget = (5, 1000, 2000000) if quick else (20, 10000, 50000000)
+    serializer = Serializer()
+    et = tracer()
+
+    @et.log(track=True)
+    def traced(payload):
+        return None
+
+    results = {}
+    for size in PAYLOAD_BYTES:
+        number = max(min(limit, budget // size), 10)
+        text, messages = 'x' * size, history(size)
+        log, compact = event(0, size), Event(**event(0, size))
+        results[f'serialize_string/{size}'] = measure(lambda n: [serializer.serialize_arguments({'payload': text}) for _ in range(n)], number, repeat)
+        results[f'serialize_messages/{size}'] = measure(lambda n: [serializer.serialize_arguments({'messages': messages}) for _ in range(n)], number, repeat)
+        results[f'encode_dict/{size}'] = measure(lambda n: [encode_json(log) for _ in range(n)], number, repeat)
+        results[f'encode_event/{size}'] = measure(lambda n: [encode_json(compact) for _ in range(n)], number, repeat)
+        results[f'traced_call/{size}'] = measure(lambda n: [traced(messages) for _ in range(n)], number, repeat)
+        for name, result in results.items():
+            if name.endswith(f'/{size}'):
+                result['payload_bytes'] = size
+    et.flush()
+    return results
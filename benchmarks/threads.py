@@ -0,0 +1,50 @@
+import threading
+import time
+from .common import summarize, tracer
+
+
+def run(quick: bool=False) -> dict:
+    """
+    Task throughput and per-task latency with 1 to 64 threads tracing concurrently.
+    Tasks are a top level call with two nested calls, the GIL bounds throughput so the curve shows the contention added by the tracer.
+    """
+    thread_counts, tasks = ((1, 4), 500) if quick else ((1, 2, 4, 8, 16, 32, 64), 6400)
+    et = tracer(max_queue_size=100000)
+
+    @et.log()
+    def step(value):
+        return value + 1
+
+    @et.log(track=True)
+    def task(value):
+        return step(step(value))
+
+    task(0)
+    results = {}
+    for count in thread_counts:
+        per_thread = tasks // count
+        latencies = [[] for _ in range(count)]
+        barrier = threading.Barrier(count + 1)
+
+        def worker(samples):
+            barrier.wait()
+            for value in range(per_thread):
+                start = time.perf_counter_ns()
+                task(value)
+                samples.append(time.perf_counter_ns() - start)
+
+        threads = [threading.Thread(target=worker, args=(samples,)) for samples in latencies]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        et.flush()
+        result = summarize([sample for samples in latencies for sample in samples])
+        result.pop('ops_per_second')
+        results[f'threads/{count}'] = {'threads': count, 'tasks': per_thread * count, 'seconds': round(elapsed, 4),
+                                       'tasks_per_second': round(per_thread * count / elapsed, 1), **result}
+    results['dropped'] = et.flush_stats()['dropped']
+    return results
@@ -0,0 +1,114 @@
+import argparse
+import threading
+from multiprocessing.connection import Listener
+
+from .event import decode_array
+from .flush_worker import FlushWorker
+
+
+class Collector:
+    """
+    Receives batches from CollectorConnector instances in other processes and flushes them through one connector.
+
+    Worker processes (e.g. gunicorn workers) send their events over a local socket, so only the
+    collector opens files or database connections and the events of all workers end up in one stream,
+    in arrival order. Batching and connector I/O happen on a FlushWorker as in ExtensiTrace.
+    """
+    def __init__(self, connector, address, authkey: bytes=None, max_queue_size: int=100000, max_batch_size: int=1000, max_linger_time: float=1.0):
+        """
+        :param connector: Connector writing the collected events.
+        :param address: Unix socket path, or a (host, port) tuple for TCP. Port 0 picks a free port, see the address attribute.
+        :param authkey: Shared secret the connecting processes have to present.
+        :param max_queue_size: Maximum number of events waiting to be flushed, further events are dropped.
+        :param max_batch_size: Maximum number of events passed to a single connector flush.
+        :param max_linger_time: Seconds to wait for a batch to fill up before flushing it anyway.
+        """
+        self.connector = connector
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.flush_worker = FlushWorker(connector, max_queue_size=max_queue_size, max_batch_size=max_batch_size,
+                                        max_linger_time=max_linger_time, name='extensitrace-collector-flush')
+        self.received = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+
+    def serve_forever(self):
+        """
+        Accepts connections until close is called, each connection is read by its own thread.
+        """
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                if self.closed:
+                    return
+                continue
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._receive, args=(connection,), name='extensitrace-collector-receive', daemon=True).start()
+
+
+    def start(self) -> 'Collector':
+        """
+        Serves on a background thread of this process.
+        """
+        threading.Thread(target=self.serve_forever, name='extensitrace-collector', daemon=True).start()
+        return self
+
+
+    def flush(self, timeout: float=None) -> bool:
+        """
+        Blocks until the events received so far have been written by the connector.
+        """
+        return self.flush_worker.flush(timeout)
+
+
+    def close(self, timeout: float=None):
+        """
+        Stops accepting connections and flushes the received events.
+        """
+        self.closed = True
+        self.listener.close()
+        self.flush_worker.close(timeout)
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'connections': self.connections, 'received': self.received, **self.flush_worker.stats()}
+
+
+    def _receive(self, connection):
+        with connection:
+            while True:
+                try:
+                    data = connection.recv_bytes()
+                except (EOFError, OSError):
+                    return
+                try:
+                    logs = decode_array(data)
+                except ValueError as e:
+                    print(f"Discarding malformed batch from a collector client: {e}")
+                    continue
+                with self.lock:
+                    self.received += len(logs)
+                self.flush_worker.submit(logs)
+
+
+if __name__ == '__main__':
+    from .connectors.local_connector import LocalConnector
+
+    parser = argparse.ArgumentParser(description='Collect events from extensitrace worker processes into one log file.')
+    parser.add_argument('--address', default='/tmp/extensitrace.sock', help='Unix socket path or host:port')
+    parser.add_argument('--log-file', default='./event_log.jsonl')
+    arguments = parser.parse_args()
+    address = arguments.address
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        address = (host, int(port))
+    collector = Collector(LocalConnector(arguments.log_file), address)
+    try:
+        collector.serve_forever()
+    except KeyboardInterrupt:
+        collector.close()
@@ -1,3 +1,8 @@
+from .base_connector import BaseConnector, AsyncBaseConnector
 from .mongo_connector import MongoConnector
 from .postgres_connector import PostgresConnector
-from .extensible_connector import ExtensibleConnector
\ No newline at end of file
+from .extensible_connector import ExtensibleConnector
+from .parquet_connector import ParquetConnector
+from .spooling_connector import SpoolingConnector
+from .composite_connector import CompositeConnector, function_route
+from .collector_connector import CollectorConnector
\ No newline at end of file
@@ -15,3 +15,19 @@ class BaseConnector(ABC):
         This method should be overridden by subclasses.
         """
         raise NotImplementedError("This method must be implemented by the subclass.")
+
+
+class AsyncBaseConnector(ABC):
+    def __init__(self):
+        """
+        Initialize the Connector.
+        """
+        pass
+
+    @abstractmethod
+    async def flush(self, logs: List):
+        """
+        Awaitable flush, this method should be overridden by subclasses.
+        The flush worker awaits it on its own event loop so the traced event loop never waits on it.
+        """
+        raise NotImplementedError("This method must be implemented by the subclass.")
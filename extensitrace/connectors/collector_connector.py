@@ -0,0 +1,65 @@
+import threading
+from multiprocessing.connection import Client
+from ..event import encode_json_array, encode_msgpack_array
+from ..forking import at_fork_in_child
+from .base_connector import BaseConnector
+
+
+class CollectorConnector(BaseConnector):
+    def __init__(self, address, authkey: bytes=None, wire_format: str='json'):
+        """
+        Initialize the Collector Connector, which sends the logs to an extensitrace.collector.Collector in another process.
+
+        :param address: Address of the collector, a Unix socket path or a (host, port) tuple.
+        :param authkey: Shared secret configured on the collector.
+        :param wire_format: 'json' or 'msgpack' (requires the msgpack package), the collector reads both.
+        """
+        if wire_format not in ('json', 'msgpack'):
+            raise ValueError(f"Unsupported wire format: {wire_format}")
+        self.address = address
+        self.authkey = authkey
+        self.encode = encode_msgpack_array if wire_format == 'msgpack' else encode_json_array
+        self.connection = None
+        self.lock = threading.Lock()
+        at_fork_in_child(self.__after_fork)
+
+
+    def flush(self, logs: list) -> bool:
+        """
+        Sends the logs to the collector as one message, reconnecting once if the connection was lost.
+        """
+        data = self.encode(logs)
+        with self.lock:
+            error = None
+            for _ in range(2):
+                try:
+                    if self.connection is None:
+                        self.connection = Client(self.address, authkey=self.authkey)
+                    self.connection.send_bytes(data)
+                    return True
+                except (OSError, EOFError) as e:
+                    error = e
+                    self.__disconnect()
+            print(f"Failed to send logs to the collector: {error}")
+            return False
+
+
+    def close(self):
+        with self.lock:
+            self.__disconnect()
+
+
+    def __disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+            self.connection = None
+
+
+    def __after_fork(self):
+        # Every process needs its own connection, messages of two processes on one socket would interleave.
+        # Closing the inherited descriptor leaves the socket of the parent open.
+        self.lock = threading.Lock()
+        self.__disconnect()
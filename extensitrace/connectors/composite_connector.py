@@ -0,0 +1,84 @@
+import atexit
+import time
+from typing import Callable
+from ..flush_worker import FlushWorker
+from .base_connector import BaseConnector
+
+
+class CompositeConnector(BaseConnector):
+    """
+    Fans every batch out to several connectors, each fed by its own FlushWorker.
+
+    A slow or failing sink only fills and drops from its own queue, the other sinks and the traced
+    code never wait on it. Sinks can be given a route, a predicate on the event deciding whether the
+    sink receives it. Events are shared between the sinks, connectors must not modify them.
+    """
+    def __init__(self, sinks: list, max_queue_size: int=10000, max_batch_size: int=100, max_linger_time: float=1.0, metrics=None):
+        """
+        :param sinks: Connectors, or (connector, route) tuples where route(event) returns whether the connector receives the event.
+        :param max_queue_size: Maximum number of events waiting for each sink, further events for that sink are dropped.
+        :param max_batch_size: Maximum number of events passed to a single flush of a sink.
+        :param max_linger_time: Seconds a sink waits for a batch to fill up before flushing it anyway.
+        :param metrics: MetricsRegistry recording the queue depth, flush latency and failures of every sink.
+        """
+        self.sinks = []
+        for index, sink in enumerate(sinks):
+            connector, route = sink if isinstance(sink, tuple) else (sink, None)
+            name = f'{index}:{type(connector).__name__}'
+            worker = FlushWorker(connector, max_queue_size=max_queue_size, max_batch_size=max_batch_size,
+                                 max_linger_time=max_linger_time, name=f'extensitrace-sink-{name}', metrics=metrics, metrics_label=name)
+            self.sinks.append((name, connector, route, worker))
+        atexit.register(self.close)
+
+
+    def flush(self, logs: list) -> bool:
+        """
+        Hands the logs off to the queue of every sink they are routed to, without waiting for the sinks.
+        """
+        for name, _, route, worker in self.sinks:
+            if route is None:
+                worker.submit(logs)
+                continue
+            try:
+                routed = [log for log in logs if route(log)]
+            except Exception as e:
+                print(f"An error occurred while routing logs to {name}: {e}")
+                continue
+            if routed:
+                worker.submit(routed)
+        return True
+
+
+    def drain(self, timeout: float=None) -> bool:
+        """
+        Blocks until every sink has flushed the logs handed off so far. Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        drained = True
+        for _, _, _, worker in self.sinks:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            drained = worker.flush(remaining) and drained
+        return drained
+
+
+    def close(self, timeout: float=None):
+        """
+        Flushes the queued logs of every sink and stops their workers.
+        """
+        for _, _, _, worker in self.sinks:
+            worker.close(timeout)
+
+
+    def stats(self) -> dict:
+        """
+        Returns the flush worker counters of every sink.
+        """
+        return {name: worker.stats() for name, _, _, worker in self.sinks}
+
+
+def function_route(*function_names: str) -> Callable[[dict], bool]:
+    """
+    Returns a route passing only events of the given functions, e.g. function_route('openai.chat.completions.create').
+    """
+    names = frozenset(function_names)
+    return lambda event: event['function_name'] in names
@@ -1,32 +1,123 @@
+from ..event import encode_json
 from .base_connector import BaseConnector
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+import atexit
+import gzip
+import random
 import requests
-import json
+import time
+
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
 
 
 class ExtensibleConnector(BaseConnector):
-    def __init__(self, endpoint: str="http://127.0.0.1:5000/api/push_tasks"):
+    def __init__(self, endpoint: str="http://127.0.0.1:5000/api/push_tasks", timeout=(5, 30), compress: bool=False,
+                 max_request_bytes: int=4 * 1024 * 1024, max_retries: int=3, retry_backoff: float=0.5,
+                 max_backoff: float=30, pool_maxsize: int=4):
         """
         Initialize the Extensible Connector.
+
+        :param endpoint: URL the logs are posted to.
+        :param timeout: Seconds to wait for the server, a single number or a (connect, read) tuple.
+        :param compress: Send gzip compressed request bodies, only for endpoints that decompress them (Flask does not by default).
+        :param max_request_bytes: Batches are split into requests of at most this many uncompressed bytes.
+        :param max_retries: Retries of a request after a connection error, a timeout, 429 or a 5xx response.
+        :param retry_backoff: Base of the exponential backoff between retries in seconds, a Retry-After header takes precedence.
+        :param max_backoff: Upper bound of a single wait between retries in seconds.
+        :param pool_maxsize: Keep-alive connections kept open to the endpoint.
         """
         self.credentials = {}
-        self.endpoint = endpoint 
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.compress = compress
+        self.max_request_bytes = max_request_bytes
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        if compress:
+            self.session.headers["Content-Encoding"] = "gzip"
+        atexit.register(self.close)
 
 
-    def flush(self, logs: list):
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        self.session.close()
+
+
+    def flush(self, logs: list) -> bool:
         """
         Flushes the provided logs using the connector.
 
+        The logs are posted as JSON arrays of at most max_request_bytes over a keep-alive session.
+        Failed requests are retried, a batch is only reported as flushed once every request succeeded.
+
         Args:
             logs (list): A list of log entries to be flushed.
         """
         try:
-            headers = {"Content-Type": "application/json"}
-            data = json.dumps(logs)
-
-            response = requests.post(self.endpoint, headers=headers, data=data)
-            if response.status_code != 201:
-                print(f"Failed to push logs: {response.text}")
-
+            ok = True
+            for body in self.__request_bodies(logs):
+                ok = self.__post(body) and ok
+            return ok
         except Exception as e:
             print(f"An error occurred while pushing logs: {e}")
-            
+            return False
+
+
+    def __request_bodies(self, logs: list):
+        encoded, size = [], 2
+        for log in logs:
+            line = encode_json(log)
+            if encoded and size + len(line) + 1 > self.max_request_bytes:
+                yield b'[' + b','.join(encoded) + b']'
+                encoded, size = [], 2
+            # A single log larger than max_request_bytes is still sent on its own
+            encoded.append(line)
+            size += len(line) + 1
+        if encoded:
+            yield b'[' + b','.join(encoded) + b']'
+
+
+    def __post(self, body: bytes) -> bool:
+        data = gzip.compress(body, compresslevel=5) if self.compress else body
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.endpoint, data=data, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    print(f"An error occurred while pushing logs: {e}")
+                    return False
+                time.sleep(self.__backoff(attempt))
+                continue
+
+            if 200 <= response.status_code < 300:
+                return True
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                print(f"Failed to push logs: {response.status_code} {response.text}")
+                return False
+            time.sleep(self.__backoff(attempt, response.headers.get('Retry-After')))
+        return False
+
+
+    def __backoff(self, attempt: int, retry_after: str=None) -> float:
+        if retry_after is not None:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0), self.max_backoff)
+        # Full jitter keeps many clients from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.retry_backoff * 2 ** attempt))
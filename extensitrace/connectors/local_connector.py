@@ -1,31 +1,250 @@
 from __future__ import annotations
+import atexit
+import gzip
 import json
+import os
+import threading
+import time
+from ..dedup import MessageDeduplicator
+from ..event import Event, encode_json
+from ..forking import at_fork_in_child
 from .base_connector import BaseConnector
 
+try:
+    import fcntl
+except ImportError:  # Windows, appends from several processes are not locked there
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
 class LocalConnector(BaseConnector):
-    def __init__(self, log_file: str):
+    def __init__(self, log_file: str, dedup: bool=False, blob_file: str=None, compression: str=None,
+                 max_bytes: int=None, rotate_interval: float=None, fsync=False, json_encoder: str='auto'):
         """
         Initialize the Local Connector.
+
+        :param log_file: JSON Lines file the logs are appended to.
+        :param dedup: Store repeated completion messages once in blob_file and reference them from the logs.
+        :param blob_file: JSON Lines file for deduplicated messages, defaults to <log_file>.blobs.jsonl.
+        :param compression: None, 'gzip' or 'zstd'. Every flush is appended as a complete gzip member / zstd frame,
+                            so the file stays readable as a single stream (e.g. by gzip.open).
+        :param max_bytes: Rotate the log file once it reaches this size.
+        :param rotate_interval: Rotate the log file after this many seconds.
+        :param fsync: False to leave syncing to the OS, True to fsync after every flush or a number of seconds between fsyncs.
+        :param json_encoder: 'auto' uses orjson when it is installed, 'json' always uses the standard library.
+        """
+        self.log_file = log_file
+        self.blob_file = blob_file or f'{log_file}.blobs.jsonl'
+        self.deduplicator = MessageDeduplicator() if dedup else None
+        self.use_orjson = orjson is not None and json_encoder == 'auto'
+        self.writer = AppendWriter(log_file, compression=compression, max_bytes=max_bytes, rotate_interval=rotate_interval, fsync=fsync)
+        self.blob_writer = AppendWriter(self.blob_file, fsync=fsync) if dedup else None
+        atexit.register(self.close)
+
+
+    def close(self):
+        """
+        Close the open log files.
         """
-        self.log_file = log_file 
+        self.writer.close()
+        if self.blob_writer:
+            self.blob_writer.close()
 
 
-    def flush(self, logs: list) -> None:
+    def flush(self, logs: list) -> bool:
         """
         Flushes the provided logs into the local log file without loading the file into memory.
 
-        This method appends the new logs directly to the log file in a JSON Lines (jsonl) format. 
-        If the log file does not exist, it creates a new log file. This approach allows for efficient 
+        This method appends the new logs directly to the log file in a JSON Lines (jsonl) format.
+        If the log file does not exist, it creates a new log file. This approach allows for efficient
         appends and easy parsing of individual log entries without needing to load the entire file into memory.
+        The whole batch is encoded up front and appended with a single write while holding an exclusive
+        file lock, so several processes can append to the same file without interleaving lines.
 
         Args:
             logs (list): A list of log entries to be written to the log file.
         """
         try:
-            # Open the file in append mode, creating it if it doesn't exist
-            with open(self.log_file, 'a') as f:
-                for log in logs:
-                    # Write each log entry as a new line in JSON Lines format
-                    f.write(json.dumps(log) + '\n')
+            if self.deduplicator:
+                logs, blobs = self.deduplicator.deduplicate(logs)
+                if blobs:
+                    self.__write_blobs(blobs)
+
+            self.writer.write(self.encode_lines(logs))
+            return True
         except Exception as e:
             print(f'Error appending to file: {e}')
+            return False
+
+
+    def encode_lines(self, logs: list) -> bytes:
+        """
+        Encodes the logs as JSON Lines, with orjson when available and the standard library for anything it rejects.
+        """
+        if self.use_orjson:
+            return b''.join(encode_json(log) + b'\n' for log in logs)
+        return b''.join((json.dumps(log.to_dict() if type(log) is Event else log, default=str) + '\n').encode('utf-8') for log in logs)
+
+
+    def __write_blobs(self, blobs: dict):
+        # Blobs are written before the logs referencing them
+        self.blob_writer.write(self.encode_lines([{'hash': blob_hash, 'content': content} for blob_hash, content in blobs.items()]))
+        self.deduplicator.confirm(blobs)
+
+
+    def load_blobs(self, hashes: list) -> dict:
+        """
+        Returns the stored messages for the given hashes, for use with extensitrace.dedup.rehydrate.
+        """
+        wanted = set(hashes)
+        blobs = {}
+        try:
+            with open(self.blob_file, 'r') as f:
+                for line in f:
+                    blob = json.loads(line)
+                    if blob['hash'] in wanted:
+                        blobs[blob['hash']] = blob['content']
+        except FileNotFoundError:
+            pass
+        return blobs
+
+
+class AppendWriter:
+    """
+    Long-lived append-only file handle shared by the threads of a process and safe across processes.
+
+    Each write is a single os.write on an O_APPEND descriptor under an exclusive flock. Rotation renames
+    the file under the same lock, other processes notice the inode change on their next write and reopen.
+    """
+    def __init__(self, path: str, compression: str=None, max_bytes: int=None, rotate_interval: float=None, fsync=False):
+        if compression not in (None, 'gzip', 'zstd'):
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.path = path
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.fsync = fsync
+        self.compressor = None
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression requires the zstandard package, install it with `pip install zstandard`")
+            self.compressor = zstandard.ZstdCompressor()
+        self.fd = None
+        self.inode = None
+        self.opened_at = None
+        self.last_fsync = time.monotonic()
+        self.lock = threading.Lock()
+        at_fork_in_child(self.__after_fork)
+
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        if self.compression == 'gzip':
+            data = gzip.compress(data)
+        elif self.compression == 'zstd':
+            data = self.compressor.compress(data)
+
+        with self.lock:
+            if self.fd is None:
+                self.__open()
+            self.__lock_file()
+            try:
+                while self.__replaced():
+                    self.__reopen()
+                if self.__should_rotate():
+                    self.__rotate()
+                view = memoryview(data)
+                while view:
+                    written = os.write(self.fd, view)
+                    view = view[written:]
+                if self.fsync is True or (self.fsync and time.monotonic() - self.last_fsync >= self.fsync):
+                    os.fsync(self.fd)
+                    self.last_fsync = time.monotonic()
+            finally:
+                self.__unlock_file()
+
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                if self.fsync:
+                    os.fsync(self.fd)
+                os.close(self.fd)
+                self.fd = None
+
+
+    def __after_fork(self):
+        # A descriptor inherited from the parent shares its flock, so the child opens its own
+        self.lock = threading.Lock()
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+    def __open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.inode = os.fstat(self.fd).st_ino
+        self.opened_at = time.monotonic()
+
+
+    def __reopen(self):
+        self.__unlock_file()
+        os.close(self.fd)
+        self.__open()
+        self.__lock_file()
+
+
+    def __replaced(self) -> bool:
+        # Another process rotated or removed the file since it was opened here
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+
+    def __should_rotate(self) -> bool:
+        if self.max_bytes is not None and os.fstat(self.fd).st_size >= self.max_bytes:
+            return True
+        return self.rotate_interval is not None and time.monotonic() - self.opened_at >= self.rotate_interval and os.fstat(self.fd).st_size > 0
+
+
+    def __rotate(self):
+        os.rename(self.path, rotated_path(self.path))
+        self.__reopen()
+
+
+    def __lock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+
+    def __unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+def rotated_path(path: str) -> str:
+    """
+    Returns the name a rotated log file is renamed to, e.g. event_log.jsonl -> event_log.20240101T120000.123456-42.jsonl
+    """
+    stamp = time.strftime('%Y%m%dT%H%M%S') + f'.{int(time.time() * 1e6) % 1000000:06d}-{os.getpid()}'
+    directory, name = os.path.split(path)
+    if '.jsonl' in name:
+        index = name.index('.jsonl')
+        name = f'{name[:index]}.{stamp}{name[index:]}'
+    else:
+        name = f'{name}.{stamp}'
+    return os.path.join(directory, name)
@@ -1,23 +1,64 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import AutoReconnect, BulkWriteError, ConnectionFailure, NetworkTimeout, OperationFailure
+from pymongo.write_concern import WriteConcern
 import atexit
+import random
+import time
+import bson
 
+from ..dedup import MessageDeduplicator
 from .base_connector import BaseConnector
 
+
+DUPLICATE_KEY = 11000
+# Server limits are 16MB per message and 100,000 documents per write, chunks stay below both
+MAX_CHUNK_BYTES = 15 * 1024 * 1024
+MAX_DOCUMENT_BYTES = 16 * 1024 * 1024
+MAX_CHUNK_DOCUMENTS = 100000
+INDEXES = (
+    [('task_id', ASCENDING), ('start_time', ASCENDING)],
+    [('agent_id', ASCENDING), ('start_time', ASCENDING)],
+    [('function_name', ASCENDING), ('start_time', ASCENDING)],
+    [('start_time', ASCENDING)],
+)
+
+
 class MongoConnector(BaseConnector):
-    def __init__(self, connection_string: str, db_name: str, collection_name: str, client: MongoClient=None):
+    def __init__(self, connection_string: str, db_name: str, collection_name: str, client: MongoClient=None, dedup: bool=False,
+                 write_concern: dict=None, max_retries: int=3, retry_backoff: float=0.5, create_indexes: bool=True,
+                 max_chunk_bytes: int=MAX_CHUNK_BYTES, max_chunk_documents: int=MAX_CHUNK_DOCUMENTS):
         """
         Initialize the MongoDB Connector using a connection string.
         :param connection_string: MongoDB connection URI.
         :param db_name: Name of the database.
         :param collection_name: Name of the collection.
+        :param dedup: Store repeated completion messages once in the <collection_name>_blobs collection.
+        :param write_concern: Write concern options, e.g. {'w': 1, 'j': False} or {'w': 'majority', 'wtimeout': 5000}.
+        :param max_retries: Retries of a chunk after a transient network error.
+        :param retry_backoff: Base of the exponential backoff between retries in seconds.
+        :param create_indexes: Create indexes for lookups by task, agent and function over time.
+        :param max_chunk_bytes: Batches are split into inserts of at most this many BSON bytes.
+        :param max_chunk_documents: Batches are split into inserts of at most this many documents.
         """
         self.db_name = db_name
         self.collection_name = collection_name
+        self.blob_collection_name = f'{collection_name}_blobs'
+        self.deduplicator = MessageDeduplicator() if dedup else None
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_chunk_bytes = max_chunk_bytes
+        self.max_chunk_documents = max_chunk_documents
         self.client = client or MongoClient(connection_string, tlsAllowInvalidCertificates=True)
+        db = self.client[self.db_name]
+        options = {'write_concern': WriteConcern(**write_concern)} if write_concern else {}
+        self.collection = db[self.collection_name].with_options(**options)
+        self.blob_collection = db[self.blob_collection_name].with_options(**options)
         try:
             # Verify server connectivity
             self.client.admin.command('ping')
+            if create_indexes:
+                for keys in INDEXES:
+                    self.collection.create_index(keys)
         except ConnectionFailure as e:
             print("Failed to connect to MongoDB:", e)
         except OperationFailure as e:
@@ -32,16 +73,88 @@ class MongoConnector(BaseConnector):
             self.client.close()
             print("MongoDB connection closed.")
 
-    def flush(self, json_data):
+    def flush(self, json_data) -> bool:
         """
         Insert a list of JSON documents into the specified MongoDB collection.
-        :param json_data: A JSON document or dict to be inserted.
+
+        Documents use the log_id as their _id and are inserted unordered in chunks below the server
+        limits. Chunks are retried on transient errors, documents stored by an earlier attempt are
+        skipped as duplicates, so a batch can be delivered more than once.
+        :param json_data: A list of log entries to be inserted.
         """
         try:
-            db = self.client[self.db_name]
-            collection = db[self.collection_name]
-            collection.insert_many(json_data)
-            print("Data inserted successfully.")
-            return True
+            if self.deduplicator:
+                json_data, blobs = self.deduplicator.deduplicate(json_data)
+                if blobs:
+                    self.__insert_blobs(blobs)
+            chunks, ok = self.__chunks([{'_id': event['log_id'], **event} for event in json_data])
+            for chunk in chunks:
+                ok = self.__insert(self.collection, chunk) and ok
+            return ok
         except Exception as e:
             print("An error occurred while inserting data:", e)
+            return False
+
+
+    def __chunks(self, documents: list):
+        """
+        Splits the documents into chunks below the size limits. Returns the chunks and False if a document had to be skipped.
+        """
+        chunks, chunk, chunk_bytes, complete = [], [], 0, True
+        for document in documents:
+            size = len(bson.encode(document))
+            if size > MAX_DOCUMENT_BYTES:
+                print(f"Skipping {document['_id']}, {size} bytes exceeds the MongoDB document limit")
+                complete = False
+                continue
+            if chunk and (len(chunk) >= self.max_chunk_documents or chunk_bytes + size > self.max_chunk_bytes):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append(document)
+            chunk_bytes += size
+        if chunk:
+            chunks.append(chunk)
+        return chunks, complete
+
+
+    def __insert(self, collection, documents: list) -> bool:
+        """
+        Inserts the documents unordered, retrying transient errors. Returns False if any document other than a duplicate failed.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                collection.insert_many(documents, ordered=False)
+                return True
+            except BulkWriteError as e:
+                errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+                if not errors and not e.details.get('writeConcernErrors'):
+                    return True
+                if errors:
+                    print(f"Failed to insert {len(errors)} of {len(documents)} logs: {errors[0].get('errmsg')}")
+                    return False
+                if attempt == self.max_retries:
+                    print(f"Write concern not satisfied: {e.details['writeConcernErrors'][0].get('errmsg')}")
+                    return False
+            except (AutoReconnect, NetworkTimeout) as e:
+                if attempt == self.max_retries:
+                    print("An error occurred while inserting data:", e)
+                    return False
+            time.sleep(self.retry_backoff * 2 ** attempt * (0.5 + random.random()))
+        return False
+
+
+    def __insert_blobs(self, blobs: dict):
+        chunks, ok = self.__chunks([{'_id': blob_hash, 'content': content} for blob_hash, content in blobs.items()])
+        for chunk in chunks:
+            # Blobs stored by an earlier run or a concurrent batch are expected, anything else means the references would dangle
+            ok = self.__insert(self.blob_collection, chunk) and ok
+        if not ok:
+            raise RuntimeError("Failed to store message blobs")
+        self.deduplicator.confirm(blobs)
+
+
+    def load_blobs(self, hashes: list) -> dict:
+        """
+        Returns the stored messages for the given hashes, for use with extensitrace.dedup.rehydrate.
+        """
+        return {blob['_id']: blob['content'] for blob in self.blob_collection.find({'_id': {'$in': list(hashes)}})}
@@ -0,0 +1,209 @@
+from __future__ import annotations
+import atexit
+import json
+import os
+import threading
+import time
+from .base_connector import BaseConnector
+
+
+JSON_COLUMNS = ('args', 'result', 'metadata')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export requires the pyarrow package, install it with `pip install pyarrow`")
+    return pyarrow
+
+
+def event_schema():
+    """
+    Arrow schema of the Task fields, with args/result/metadata as JSON strings and the duration and
+    token usage of completion events broken out as their own columns.
+    """
+    pa = _require_pyarrow()
+    return pa.schema([
+        ('log_id', pa.string()),
+        ('function_name', pa.string()),
+        ('start_time', pa.float64()),
+        ('end_time', pa.float64()),
+        ('duration', pa.float64()),
+        ('args', pa.string()),
+        ('result', pa.string()),
+        ('task_id', pa.string()),
+        ('agent_id', pa.string()),
+        ('parent_log_id', pa.string()),
+        ('metadata', pa.string()),
+        ('inferred_accuracy', pa.float64()),
+        ('accuracy_reasoning', pa.string()),
+        ('model', pa.string()),
+        ('prompt_tokens', pa.int64()),
+        ('completion_tokens', pa.int64()),
+        ('total_tokens', pa.int64()),
+    ])
+
+
+def to_record_batch(logs: list, schema=None):
+    """
+    Converts events to an Arrow record batch column by column.
+    """
+    pa = _require_pyarrow()
+    schema = schema or event_schema()
+    columns = {name: [] for name in schema.names}
+    for log in logs:
+        for name in ('log_id', 'function_name', 'start_time', 'end_time', 'task_id', 'agent_id', 'parent_log_id', 'inferred_accuracy', 'accuracy_reasoning'):
+            columns[name].append(log.get(name))
+        for name in JSON_COLUMNS:
+            value = log.get(name)
+            columns[name].append(None if value is None else json.dumps(value, default=str))
+        start_time, end_time = log.get('start_time'), log.get('end_time')
+        columns['duration'].append(end_time - start_time if start_time is not None and end_time is not None else None)
+
+        result = log.get('result')
+        usage = result.get('usage') if isinstance(result, dict) else None
+        usage = usage if isinstance(usage, dict) else {}
+        columns['model'].append(result.get('model') if isinstance(result, dict) and isinstance(result.get('model'), str) else None)
+        for name in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+            columns[name].append(usage.get(name))
+    return pa.RecordBatch.from_arrays([pa.array(columns[field.name], type=field.type) for field in schema], schema=schema)
+
+
+class ParquetConnector(BaseConnector):
+    def __init__(self, directory: str, row_group_size: int=100000, max_rows_per_file: int=1000000,
+                 compression: str='zstd', file_prefix: str='events', max_linger_time: float=60.0):
+        """
+        Initialize the Parquet Connector.
+
+        Flushed events are only readable, and survive a crash, once the file holding them is finished.
+        A file is finished when it reaches max_rows_per_file, when its oldest event has waited
+        max_linger_time seconds, and on close.
+
+        :param directory: Directory the Parquet files are written to, read it back with pyarrow.dataset.dataset(directory).
+        :param row_group_size: Events buffered in memory before they are written out as one row group.
+        :param max_rows_per_file: Start a new file once the current one holds this many events.
+        :param compression: Parquet compression codec, e.g. 'zstd', 'snappy' or None.
+        :param file_prefix: Prefix of the file names.
+        :param max_linger_time: Seconds after which flushed events are written and their file finished even if
+                                the row group is not full, None to only write them on close.
+        """
+        self.pa = _require_pyarrow()
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.max_rows_per_file = max_rows_per_file
+        self.compression = compression
+        self.file_prefix = file_prefix
+        self.max_linger_time = max_linger_time
+        self.schema = event_schema()
+        self.buffer = []
+        self.writer = None
+        self.current_path = None
+        self.file_rows = 0
+        self.file_count = 0
+        self.linger_timer = None
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.close)
+
+
+    def flush(self, logs: list) -> bool:
+        """
+        Buffers the logs and writes a row group whenever row_group_size events are buffered.
+        Returning True does not mean the logs are on disk yet, see max_linger_time.
+        """
+        try:
+            with self.lock:
+                if logs and self.linger_timer is None and self.max_linger_time is not None:
+                    self.linger_timer = threading.Timer(self.max_linger_time, self.__linger_expired)
+                    self.linger_timer.daemon = True
+                    self.linger_timer.start()
+                self.buffer.extend(logs)
+                while len(self.buffer) >= self.row_group_size:
+                    rows, self.buffer = self.buffer[:self.row_group_size], self.buffer[self.row_group_size:]
+                    self.__write_row_group(rows)
+            return True
+        except Exception as e:
+            print(f'Error writing parquet file: {e}')
+            return False
+
+
+    def close(self):
+        """
+        Writes the buffered events and finishes the current file.
+        """
+        with self.lock:
+            self.__write_pending()
+
+
+    def __linger_expired(self):
+        try:
+            with self.lock:
+                self.__write_pending()
+        except Exception as e:
+            print(f'Error writing parquet file: {e}')
+
+
+    def __write_pending(self):
+        # Every event flushed so far ends up in a finished file
+        if self.linger_timer is not None:
+            self.linger_timer.cancel()
+            self.linger_timer = None
+        if self.buffer:
+            rows, self.buffer = self.buffer, []
+            self.__write_row_group(rows)
+        self.__finish_file()
+
+
+    def __write_row_group(self, rows: list):
+        if self.writer is None:
+            self.file_count += 1
+            name = f'{self.file_prefix}-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{self.file_count:05d}.parquet'
+            self.current_path = os.path.join(self.directory, name)
+            # Parquet files are only readable once their footer is written, so they get their name on close.
+            # Until then the leading dot keeps pyarrow.dataset from reading them.
+            self.writer = self.pa.parquet.ParquetWriter(self.__in_progress_path(), self.schema, compression=self.compression)
+        self.writer.write_batch(to_record_batch(rows, self.schema), row_group_size=len(rows))
+        self.file_rows += len(rows)
+        if self.file_rows >= self.max_rows_per_file:
+            self.__finish_file()
+
+
+    def __finish_file(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        os.replace(self.__in_progress_path(), self.current_path)
+        self.writer = None
+        self.file_rows = 0
+
+
+    def __in_progress_path(self) -> str:
+        return os.path.join(self.directory, f'.{os.path.basename(self.current_path)}.inprogress')
+
+
+def jsonl_to_parquet(jsonl_path: str, parquet_path: str, row_group_size: int=100000, compression: str='zstd', blobs=None) -> int:
+    """
+    Converts a JSON Lines log (plain, .gz or .zst) to a single Parquet file, streaming it in row groups.
+
+    :param blobs: Blob mapping or loader to rehydrate deduplicated messages, see extensitrace.reader.TraceReader.
+    :return: Number of events converted.
+    """
+    pa = _require_pyarrow()
+    from ..reader import TraceReader
+
+    schema = event_schema()
+    count = 0
+    rows = []
+    with pa.parquet.ParquetWriter(parquet_path, schema, compression=compression) as writer:
+        for task in TraceReader(jsonl_path, blobs=blobs).iter_tasks():
+            rows.append(vars(task))
+            if len(rows) >= row_group_size:
+                writer.write_batch(to_record_batch(rows, schema), row_group_size=len(rows))
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_batch(to_record_batch(rows, schema), row_group_size=len(rows))
+            count += len(rows)
+    return count
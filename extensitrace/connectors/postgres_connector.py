@@ -1,64 +1,187 @@
+import io
 import json
+import random
+import time
 import psycopg2
 import atexit
-from psycopg2 import OperationalError
-from extensitrace.model import Task
+from psycopg2 import OperationalError, InterfaceError, sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
+from ..dedup import MessageDeduplicator
+from ..event import encode_json, encode_json_array
 from .base_connector import BaseConnector
 
+
+COLUMNS = ('log_id', 'function_name', 'start_time', 'end_time', 'args', 'result', 'task_id', 'agent_id',
+           'parent_log_id', 'metadata', 'inferred_accuracy', 'accuracy_reasoning')
+STAGING_TABLE = 'extensitrace_staging'
+
+
 class PostgresConnector(BaseConnector):
-    def __init__(self, connection_string: str, table_name: str):
+    def __init__(self, connection_string: str, table_name: str, dedup: bool=False, min_connections: int=1,
+                 max_connections: int=4, copy_threshold: int=500, max_retries: int=3, retry_backoff: float=0.5,
+                 create_table: bool=True):
         """
         Initialize the PostgreSQL Connector using a connection string.
         :param connection_string: PostgreSQL connection URI.
-        :param table_name: Name of the PostgreSQL table.
+        :param table_name: Name of the PostgreSQL table, optionally schema qualified (e.g. 'traces.logs').
+        :param dedup: Store repeated completion messages once in the <table_name>_blobs table.
+        :param min_connections: Connections the pool keeps open.
+        :param max_connections: Upper bound of the pool, one connection per concurrently flushing thread.
+        :param copy_threshold: Batches of at least this many events are loaded with COPY, smaller ones with a single INSERT.
+        :param max_retries: Retries of a batch after the connection was lost, each on a fresh connection.
+        :param retry_backoff: Base of the exponential backoff between retries in seconds.
+        :param create_table: Create the schema, table and indexes if they do not exist.
         """
         self.connection_string = connection_string
         self.table_name = table_name
-        self.connection = None
+        self.blob_table_name = f'{table_name}_blobs'
+        self.deduplicator = MessageDeduplicator() if dedup else None
+        self.copy_threshold = copy_threshold
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.table = sql.Identifier(*table_name.split('.'))
+        self.blob_table = sql.Identifier(*self.blob_table_name.split('.'))
+        self.pool = None
         try:
-            self.connection = psycopg2.connect(self.connection_string)
-            self.connection.autocommit = True
+            self.pool = ThreadedConnectionPool(min_connections, max_connections, self.connection_string)
             print('Connection successful')
         except OperationalError as e:
             print("Failed to connect to PostgreSQL:", e)
+        if self.pool and create_table:
+            try:
+                self.__run(self.__create_schema)
+            except Exception as e:
+                print(f"Failed to create table {table_name}: {e}")
         atexit.register(self.close)
 
-        
+
     def close(self):
         """
-        Close the database connection.
+        Close the database connections.
         """
-        if self.connection:
-            self.connection.close()
+        if self.pool and not self.pool.closed:
+            self.pool.closeall()
             print("Database connection closed.")
 
 
     def flush(self, json_data: list) -> bool:
-        if not self.connection:
+        if not self.pool:
             print("Database connection is not established.")
             return False
 
         if not json_data:
-            print("No data to insert.")
-            return False
+            return True
 
-        tasks = [Task(**item) for item in json_data]
+        blobs = {}
+        if self.deduplicator:
+            json_data, blobs = self.deduplicator.deduplicate(json_data)
 
-        conn = self.connection
         try:
-            cur = conn.cursor()
-            insert_query = """
-            INSERT INTO logs (log_id, function_name, start_time, end_time, args, result, task_id, agent_id, parent_log_id, metadata, inferred_accuracy, accuracy_reasoning)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cur.executemany(insert_query, [(task.log_id, task.function_name, task.start_time, task.end_time, 
-                                            json.dumps(task.args), json.dumps(task.result), task.task_id, 
-                                            task.agent_id, task.parent_log_id, json.dumps(task.metadata), 
-                                            task.inferred_accuracy, task.accuracy_reasoning) for task in tasks])
-            conn.commit()
-            cur.close()
-            return True
+            self.__run(lambda cur: self.__insert(cur, json_data, blobs))
         except Exception as e:
             print(f"Error inserting data: {e}")
             return False
+        if blobs:
+            self.deduplicator.confirm(blobs)
+        return True
+
+
+    def __run(self, operation):
+        """
+        Runs operation(cursor) in a transaction on a pooled connection. Lost connections are discarded
+        and the operation is retried on a new one, other errors are raised right away.
+        """
+        for attempt in range(self.max_retries + 1):
+            conn = self.pool.getconn()
+            try:
+                with conn:
+                    with conn.cursor() as cur:
+                        result = operation(cur)
+                self.pool.putconn(conn)
+                return result
+            except (OperationalError, InterfaceError) as e:
+                self.pool.putconn(conn, close=True)
+                if attempt == self.max_retries:
+                    raise
+                print(f"PostgreSQL connection lost, retrying: {e}")
+                time.sleep(self.retry_backoff * 2 ** attempt * (0.5 + random.random()))
+            except Exception:
+                self.pool.putconn(conn)
+                raise
+
+
+    def __create_schema(self, cur):
+        if '.' in self.table_name:
+            cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(self.table_name.split('.')[0])))
+        cur.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} (
+            log_id TEXT NOT NULL,
+            function_name TEXT,
+            start_time DOUBLE PRECISION,
+            end_time DOUBLE PRECISION,
+            args JSONB,
+            result JSONB,
+            task_id TEXT,
+            agent_id TEXT,
+            parent_log_id TEXT,
+            metadata JSONB,
+            inferred_accuracy DOUBLE PRECISION,
+            accuracy_reasoning TEXT
+        )
+        """).format(self.table))
+        bare_name = self.table_name.split('.')[-1]
+        # A unique index rather than a primary key, so tables created by older versions get one too
+        cur.execute(sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} (log_id)").format(sql.Identifier(f'{bare_name}_log_id_idx'), self.table))
+        for column in ('task_id', 'agent_id', 'start_time'):
+            cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} ({})").format(
+                sql.Identifier(f'{bare_name}_{column}_idx'), self.table, sql.Identifier(column)))
+        if self.deduplicator:
+            cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} (hash TEXT PRIMARY KEY, content JSONB NOT NULL)").format(self.blob_table))
+
+
+    def __insert(self, cur, logs: list, blobs: dict):
+        if blobs:
+            # Blobs are committed in the same transaction as the logs referencing them
+            execute_values(cur, sql.SQL("INSERT INTO {} (hash, content) VALUES %s ON CONFLICT (hash) DO NOTHING").format(self.blob_table),
+                           [(blob_hash, json.dumps(content, default=str)) for blob_hash, content in blobs.items()])
+
+        # Events are sent as JSON and split into columns by the server, one encoding per event instead of one per JSON column
+        columns = sql.SQL(', ').join(map(sql.Identifier, COLUMNS))
+        if len(logs) < self.copy_threshold:
+            cur.execute(sql.SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM jsonb_populate_recordset(NULL::{table}, %s::jsonb) "
+                                "ON CONFLICT (log_id) DO NOTHING").format(table=self.table, columns=columns),
+                        (encode_json_array(logs).decode('utf-8'),))
+            return
+
+        # COPY cannot skip conflicting rows, so the batch is copied into a staging table first.
+        # Re-delivered events are then ignored the same way as with the INSERT path.
+        cur.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {} (event JSONB) ON COMMIT DELETE ROWS").format(sql.Identifier(STAGING_TABLE)))
+        cur.copy_expert(sql.SQL("COPY {} (event) FROM STDIN").format(sql.Identifier(STAGING_TABLE)), copy_buffer(logs))
+        cur.execute(sql.SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} CROSS JOIN LATERAL jsonb_populate_record(NULL::{table}, event) "
+                            "ON CONFLICT (log_id) DO NOTHING").format(table=self.table, columns=columns, staging=sql.Identifier(STAGING_TABLE)))
+
+
+    def load_blobs(self, hashes: list) -> dict:
+        """
+        Returns the stored messages for the given hashes, for use with extensitrace.dedup.rehydrate.
+        """
+        def select(cur):
+            cur.execute(sql.SQL("SELECT hash, content FROM {} WHERE hash = ANY(%s)").format(self.blob_table), (list(hashes),))
+            return cur.fetchall()
+        # psycopg2 decodes JSONB columns itself, blob tables created by older versions store TEXT
+        return {blob_hash: json.loads(content) if isinstance(content, str) else content for blob_hash, content in self.__run(select)}
+
+
+def copy_buffer(logs: list) -> io.StringIO:
+    """
+    Encodes events as the rows of a single JSONB column, in the text format of COPY FROM STDIN.
+    """
+    buffer = io.StringIO()
+    for log in logs:
+        # JSON escapes tabs and line breaks itself, only its backslashes have to be escaped for COPY
+        buffer.write(encode_json(log).decode('utf-8').replace('\\', '\\\\'))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
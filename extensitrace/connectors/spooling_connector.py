@@ -0,0 +1,186 @@
+import asyncio
+import atexit
+import inspect
+import threading
+import time
+from collections import deque
+from ..spool import Spool
+from .base_connector import BaseConnector
+
+
+class SpoolingConnector(BaseConnector):
+    """
+    Wraps a connector so batches it fails to flush are kept in an on-disk spool instead of being lost.
+
+    While the wrapped connector is failing new batches go straight to the spool. A replay thread
+    retries the oldest spooled batch every replay_interval seconds and drains the spool once it
+    succeeds. Batches spooled before a restart are replayed by the next process using the directory.
+    Delivery is at least once: a batch may reach the connector twice, connectors that key events on
+    log_id (MongoConnector, PostgresConnector) store it once.
+
+    A failing batch followed by one that is delivered is rejected by the connector rather than hitting
+    an outage (e.g. a 400 response or an oversized document), replay skips it and moves on. After
+    max_replay_attempts such rounds it is quarantined, so it never blocks the rest of the spool.
+
+    Events that do not fit into a flush queue are handed to overflow, which only queues them: the
+    replay thread writes them to the spool, so a traced call never waits on the disk.
+    """
+    def __init__(self, connector, spool_dir: str, max_spool_bytes: int=1024 ** 3, replay_interval: float=5.0, fsync: bool=True,
+                 max_replay_attempts: int=3, max_overflow_events: int=10000):
+        """
+        :param connector: Connector the batches are delivered to.
+        :param spool_dir: Directory of the spool.
+        :param max_spool_bytes: Batches that do not fit into the spool any more are dropped.
+        :param replay_interval: Seconds between delivery attempts while the connector is failing.
+        :param fsync: Sync every spooled batch to disk.
+        :param max_replay_attempts: Replays a batch may fail while later batches are delivered before it is quarantined.
+        :param max_overflow_events: Overflowed events waiting to be spooled, further ones are dropped.
+        """
+        self.connector = connector
+        self.spool = Spool(spool_dir, max_bytes=max_spool_bytes, fsync=fsync)
+        self.replay_interval = replay_interval
+        self.max_replay_attempts = max_replay_attempts
+        self.available = True
+        self._attempts = {}
+        self._delivered = False
+        self.replayed = 0
+        self.max_overflow_events = max_overflow_events
+        self._overflow = deque()
+        self._overflow_events = 0
+        self._overflow_lock = threading.Lock()
+        self._local = threading.local()
+        self._replay_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._replay_loop, name='extensitrace-spool-replay', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+
+    def flush(self, logs: list) -> bool:
+        """
+        Delivers the logs, or spools them if the connector is failing. Returns False only if the spool rejected them.
+        """
+        if self.available:
+            if self.__deliver(logs):
+                self._delivered = True
+                return True
+            self.available = False
+        return self.spool.write(logs)
+
+
+    def overflow(self, logs: list) -> bool:
+        """
+        Queues logs that did not fit into a flush queue for the replay thread to spool, for FlushWorker's overflow.
+        Returns False, and the logs count as dropped, if max_overflow_events are waiting already.
+        """
+        with self._overflow_lock:
+            if not self._stop.is_set():
+                if self._overflow_events + len(logs) > self.max_overflow_events:
+                    return False
+                self._overflow.append(logs)
+                self._overflow_events += len(logs)
+                self._wake.set()
+                return True
+        # Nothing drains the queue after close
+        return self.spool.write(logs)
+
+
+    def replay(self) -> bool:
+        """
+        Delivers spooled batches oldest first until two batches in a row fail. Returns True if the spool was drained.
+        """
+        with self._replay_lock:
+            # Whether the connector took a batch since the last replay, so a failing batch is not due to an outage
+            delivered, self._delivered = self._delivered, False
+            failed = None
+            for path in self.spool.batches():
+                if self._stop.is_set():
+                    return False
+                try:
+                    logs = self.spool.read(path)
+                except FileNotFoundError:
+                    continue
+                if not self.__deliver(logs):
+                    if failed is not None:
+                        self.available = False
+                        return False
+                    failed = (path, len(logs))
+                    continue
+                self.spool.remove(path)
+                self._attempts.pop(path, None)
+                self.replayed += len(logs)
+                self.available = True
+                if failed is not None:
+                    # The connector is up, the failed batch is rejected rather than waiting for an outage to end
+                    self.__reject(*failed)
+                    failed = None
+            if failed is not None:
+                if delivered:
+                    self.__reject(*failed)
+                elif failed[0] not in self._attempts:
+                    # A batch rejected before says nothing about the connector, anything else may be an outage
+                    self.available = False
+                return False
+            return True
+
+
+    def close(self, timeout: float=None):
+        """
+        Stops the replay thread, batches still spooled stay on disk for the next run.
+        """
+        with self._overflow_lock:
+            self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self.__write_overflow()
+
+
+    def stats(self) -> dict:
+        return {**self.spool.stats(), 'replayed': self.replayed, 'available': self.available}
+
+
+    def _replay_loop(self):
+        next_replay = time.monotonic() + self.replay_interval
+        while not self._stop.is_set():
+            self._wake.wait(max(next_replay - time.monotonic(), 0))
+            self._wake.clear()
+            self.__write_overflow()
+            if time.monotonic() >= next_replay and not self._stop.is_set():
+                next_replay = time.monotonic() + self.replay_interval
+                if self.spool.batches():
+                    self.replay()
+
+
+    def __write_overflow(self):
+        # Everything queued since the last write goes into one batch, one file and one fsync
+        with self._overflow_lock:
+            batches, self._overflow = self._overflow, deque()
+            self._overflow_events = 0
+        if batches:
+            self.spool.write([log for logs in batches for log in logs])
+
+
+    def __reject(self, path: str, events: int):
+        attempts = self._attempts.get(path, 0) + 1
+        if attempts < self.max_replay_attempts:
+            self._attempts[path] = attempts
+            return
+        self._attempts.pop(path, None)
+        print(f"Quarantining spooled batch {path} after {attempts} rejected replays")
+        self.spool.quarantine(path, events)
+
+
+    def __deliver(self, logs: list) -> bool:
+        try:
+            result = self.connector.flush(logs)
+            if inspect.isawaitable(result):
+                # Flushes run on the flush worker and on the replay thread, each gets its own event loop
+                loop = getattr(self._local, 'loop', None)
+                if loop is None:
+                    loop = self._local.loop = asyncio.new_event_loop()
+                result = loop.run_until_complete(result)
+            return result is not False
+        except Exception as e:
+            print(f"An error occurred while flushing logs: {e}")
+            return False
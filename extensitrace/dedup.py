@@ -0,0 +1,117 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Mapping, Union
+
+
+BLOB_REF_KEY = '$blob'
+COMPLETION_FUNCTION_NAMES = ('openai.chat.completions.create',)
+
+
+class MessageDeduplicator:
+    """
+    Replaces the messages of completion events with references to content-addressed blobs.
+
+    In multi-turn agents every completion repeats the whole history, so each message is stored once
+    under the sha256 of its canonical JSON and events only carry {'$blob': <hash>} references. Hashes
+    confirmed as written are remembered (up to max_known_blobs, least recently used first) so their
+    content is not written again.
+
+    A connector's flush workers and spool replay share it. A hash only counts as known once the connector
+    confirms its blob was written, until then concurrent batches write it too rather than reference a blob
+    that may not exist yet. Blobs of a failed write are simply not confirmed, the next batch writes them again.
+    """
+    def __init__(self, max_known_blobs: int=100000):
+        self.max_known_blobs = max_known_blobs
+        self._known = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def deduplicate(self, logs: List[dict]):
+        """
+        Returns the events with messages replaced by references and the blobs not written before.
+
+        The connector must persist the returned blobs and then call confirm with their hashes once written.
+        """
+        events = []
+        messages_by_hash = {}
+        for log in logs:
+            messages = (log.get('args') or {}).get('messages')
+            if log['function_name'] not in COMPLETION_FUNCTION_NAMES or not isinstance(messages, list):
+                events.append(log)
+                continue
+            refs = []
+            for message in messages:
+                encoded = canonical_json(message)
+                blob_hash = hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+                messages_by_hash.setdefault(blob_hash, message)
+                refs.append({BLOB_REF_KEY: blob_hash})
+            events.append({**log, 'args': {**log['args'], 'messages': refs}})
+
+        new_blobs = {}
+        with self._lock:
+            for blob_hash, message in messages_by_hash.items():
+                if blob_hash in self._known:
+                    self._known.move_to_end(blob_hash)
+                else:
+                    new_blobs[blob_hash] = message
+        return events, new_blobs
+
+
+    def confirm(self, hashes: Iterable[str]):
+        """
+        Marks blobs returned by deduplicate as written, later batches only reference them.
+        """
+        with self._lock:
+            for blob_hash in hashes:
+                self._known[blob_hash] = None
+                self._known.move_to_end(blob_hash)
+            while len(self._known) > self.max_known_blobs:
+                self._known.popitem(last=False)
+
+
+def canonical_json(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF_KEY in value
+
+
+def blob_refs(logs: Iterable[dict]) -> set:
+    """
+    Returns the blob hashes referenced by the given events.
+    """
+    hashes = set()
+    for log in logs:
+        messages = (log.get('args') or {}).get('messages')
+        if isinstance(messages, list):
+            hashes.update(message[BLOB_REF_KEY] for message in messages if is_blob_ref(message))
+    return hashes
+
+
+def rehydrate(logs: Iterable[dict], blobs: Union[Mapping[str, dict], Callable[[List[str]], Dict[str, dict]]]) -> List[dict]:
+    """
+    Replaces blob references in the events with the stored messages.
+
+    :param logs: Events as written by a connector with dedup enabled.
+    :param blobs: Mapping of hash to message, or a callable loading that mapping for a list of hashes
+                  such as the load_blobs method of a connector.
+    """
+    logs = list(logs)
+    hashes = blob_refs(logs)
+    if not hashes:
+        return logs
+    if callable(blobs):
+        blobs = blobs(sorted(hashes))
+    events = []
+    for log in logs:
+        messages = (log.get('args') or {}).get('messages')
+        if not isinstance(messages, list) or not any(is_blob_ref(message) for message in messages):
+            events.append(log)
+            continue
+        # Unknown references are left in place so a missing blob is visible rather than silently dropped
+        messages = [blobs.get(message[BLOB_REF_KEY], message) if is_blob_ref(message) else message for message in messages]
+        events.append({**log, 'args': {**log['args'], 'messages': messages}})
+    return events
@@ -0,0 +1,145 @@
+import json
+import sys
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+FIELDS = ('log_id', 'function_name', 'start_time', 'end_time', 'args', 'result', 'task_id', 'agent_id',
+          'parent_log_id', 'metadata', 'inferred_accuracy', 'accuracy_reasoning')
+_FIELD_SET = frozenset(FIELDS)
+
+
+class Event(Mapping):
+    """
+    Slotted, read-only event record with the fields of the Task model.
+
+    It reads like the event dict it replaces (event['task_id'], event.get(...), {**event}), takes
+    less than half of the memory, and interns function names and agent ids so repeated values share
+    one string. Encodings are not cached: keeping a second copy of every event until all connectors
+    flushed it costs more than encoding it again for a further connector.
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, log_id, function_name, start_time, end_time, args, result, task_id, agent_id,
+                 parent_log_id, metadata, inferred_accuracy, accuracy_reasoning):
+        self.log_id = log_id
+        self.function_name = sys.intern(function_name) if type(function_name) is str else function_name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.args = args
+        self.result = result
+        self.task_id = task_id
+        self.agent_id = sys.intern(agent_id) if type(agent_id) is str else agent_id
+        self.parent_log_id = parent_log_id
+        self.metadata = metadata
+        self.inferred_accuracy = inferred_accuracy
+        self.accuracy_reasoning = accuracy_reasoning
+
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+
+    def __len__(self):
+        return len(FIELDS)
+
+
+    def __repr__(self):
+        return f'Event({self.to_dict()!r})'
+
+
+    def to_dict(self) -> dict:
+        return {
+            'log_id': self.log_id,
+            'function_name': self.function_name,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'args': self.args,
+            'result': self.result,
+            'task_id': self.task_id,
+            'agent_id': self.agent_id,
+            'parent_log_id': self.parent_log_id,
+            'metadata': self.metadata,
+            'inferred_accuracy': self.inferred_accuracy,
+            'accuracy_reasoning': self.accuracy_reasoning,
+        }
+
+
+    def to_json(self) -> bytes:
+        """
+        Returns the event as UTF-8 JSON.
+        """
+        return dumps_json(self.to_dict())
+
+
+    def to_msgpack(self) -> bytes:
+        """
+        Returns the event as a msgpack map.
+        """
+        return dumps_msgpack(self.to_dict())
+
+
+def dumps_json(value) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass
+    return json.dumps(value, default=str).encode('utf-8')
+
+
+def dumps_msgpack(value) -> bytes:
+    if msgpack is None:
+        raise ImportError("The msgpack format requires the msgpack package, install it with `pip install msgpack`")
+    return msgpack.packb(value, default=str, use_bin_type=True)
+
+
+def encode_json(log) -> bytes:
+    """
+    Encodes an event dict or Event as JSON.
+    """
+    return log.to_json() if type(log) is Event else dumps_json(log)
+
+
+def encode_json_array(logs: list) -> bytes:
+    return b'[' + b','.join(encode_json(log) for log in logs) + b']'
+
+
+def encode_msgpack_array(logs: list) -> bytes:
+    """
+    Encodes events as a msgpack array.
+    """
+    count = len(logs)
+    if count < 16:
+        header = bytes((0x90 | count,))
+    elif count < 1 << 16:
+        header = b'\xdc' + count.to_bytes(2, 'big')
+    else:
+        header = b'\xdd' + count.to_bytes(4, 'big')
+    return header + b''.join(log.to_msgpack() if type(log) is Event else dumps_msgpack(log) for log in logs)
+
+
+def decode_array(data: bytes) -> list:
+    """
+    Decodes an array written by encode_json_array or encode_msgpack_array.
+    """
+    if data[:1] == b'[':
+        return json.loads(data)
+    if msgpack is None:
+        raise ImportError("The msgpack format requires the msgpack package, install it with `pip install msgpack`")
+    return msgpack.unpackb(data, raw=False)
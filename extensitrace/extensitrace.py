@@ -1,234 +1,650 @@
-import contextlib
+import contextvars
 import inspect
 import functools
 from datetime import datetime
-from queue import Queue
 import threading
+import time
+import traceback
 import uuid
 import openai
 import atexit
 
 from .connectors.local_connector import LocalConnector
+from .connectors.spooling_connector import SpoolingConnector
+from .event import Event
+from .flush_worker import FlushWorker
+from .forking import at_fork_in_child
+from .metrics import MetricsRegistry
+from .serializer import Serializer, argument_binder
 from .singleton import Singleton
-
-
-thread_local_storage = threading.local()
+from .streaming import AsyncTracedStream, TracedStream
+from .summary import DEFAULT_MODEL_PRICES, SUMMARY_FUNCTION_NAME, TaskSummary
+from .task_state import TaskState
+from .sampling import SamplingPolicy
+from .truncation import PayloadPolicy, json_size
+
+
+# Context variables follow both threads and asyncio tasks, so concurrent coroutines get their own task and call stack
+_task: contextvars.ContextVar = contextvars.ContextVar('extensitrace_task', default=None)
+_call_stack: contextvars.ContextVar = contextvars.ContextVar('extensitrace_call_stack', default=())
+# Marks the context of a task dropped by head sampling, decorated calls inside it are not traced
+_UNSAMPLED = object()
+# Log id of the OpenAI call in progress, calls made from within it are not logged again
+_api_call: contextvars.ContextVar = contextvars.ContextVar('extensitrace_api_call', default=None)
+# Client resources whose create calls are logged, as openai.<resource>.create
+API_RESOURCES = ('chat.completions', 'embeddings', 'responses')
+EMBEDDINGS_FUNCTION_NAME = 'openai.embeddings.create'
+MAX_TRACEBACK_FRAMES = 10
+MAX_TRACEBACK_CHARS = 4000
 
 class ExtensiTrace(metaclass=Singleton):
-    def __init__(self, client=None, log_file='./event_log.jsonl', agent_id=None, connector=None, task_flush_limit=1):
+    def __init__(self, client=None, log_file='./event_log.jsonl', agent_id=None, connector=None, task_flush_limit=1,
+                 max_queue_size=10000, max_batch_size=100, max_linger_time=1.0, serializer=None,
+                 max_field_bytes=None, max_event_bytes=None, hash_content=False,
+                 sample_rate=1.0, tail_sample_rate=1.0, slow_task_threshold=None, max_events_per_second=None,
+                 max_live_tasks=None, task_ttl=None, spool_dir=None, max_spool_bytes=1024 ** 3, spool_replay_interval=5.0,
+                 compact_events=False, metrics=None, task_summary=False, model_prices=None):
         self.client = client or openai
         self.log_file = log_file
         self.lock = threading.Lock()
         self.agent_id = agent_id or str(uuid.uuid4())
-        self.data_store = dict() 
+        self.data_store = dict() # Live tasks by task id, only written at task start and completion
+        self.max_live_tasks = max_live_tasks
+        self.task_ttl = task_ttl
+        self.last_task_sweep = time.monotonic()
+        self.evicted_task_count = 0
         self.connector = connector or LocalConnector(log_file)
+        self.spool = None
+        if spool_dir is not None:
+            # Failed batches and events that do not fit into the flush queue are kept on disk and replayed
+            self.connector = SpoolingConnector(self.connector, spool_dir, max_spool_bytes=max_spool_bytes, replay_interval=spool_replay_interval)
+            self.spool = self.connector.spool
         self.task_flush_limit = task_flush_limit
-        self.task_flush_ids = Queue() 
         self.task_count = 0
         self.to_flush = []
+        self.instrumented = False
+        self.compact_events = compact_events
+        self.task_summary = task_summary
+        self.model_prices = {**DEFAULT_MODEL_PRICES, **(model_prices or {})}
+        self.serializer = serializer or Serializer()
+        self.payload_policy = PayloadPolicy(max_field_bytes=max_field_bytes, max_event_bytes=max_event_bytes, hash_content=hash_content)
+        self.sampling_policy = SamplingPolicy(sample_rate=sample_rate, tail_sample_rate=tail_sample_rate, slow_task_threshold=slow_task_threshold, max_events_per_second=max_events_per_second)
+        self.sampling_counts = {'head_sampled_out': 0, 'tail_sampled_out': 0, 'rate_limited': 0}
+        self.sampling_lock = threading.Lock()
+        self.metrics = MetricsRegistry() if metrics is True else (metrics or None)
+        self.call_overhead = None
+        self.__register_metrics()
+        self.flush_worker = FlushWorker(self.connector, max_queue_size=max_queue_size, max_batch_size=max_batch_size, max_linger_time=max_linger_time,
+                                        overflow=self.connector.overflow if self.spool else None, metrics=self.metrics)
         atexit.register(self.__on_exit)
+        at_fork_in_child(self.__after_fork)
+
+
+    def __after_fork(self):
+        """
+        Starts a forked worker process (e.g. gunicorn with preload) with fresh locks and without the tasks of the parent,
+        which stay with the parent and are flushed there.
+        """
+        self.lock = threading.Lock()
+        self.sampling_lock = threading.Lock()
+        self.data_store = dict()
+        self.to_flush = []
+        self.task_count = 0
 
 
     def __on_exit(self):
         """
         Method to ensure all remaining logs are flushed upon program interruption or shutdown.
         """
+        self.close()
+        print("Program interrupted. All pending logs have been flushed.")
+
+
+    def close(self, timeout=None):
+        """
+        Flushes the events of live tasks, marked as incomplete, and of all handed off tasks, then stops the flush worker.
+        Runs at exit unless it was called before. Events logged afterwards are dropped.
+        """
+        atexit.unregister(self.__on_exit)
         with self.lock:
-            while not self.task_flush_ids.empty():
-                task_id = self.task_flush_ids.get()
-                self.__add_to_flush(task_id)
-            self.__flush_queue()
+            for task in list(self.data_store.values()):
+                self.__add_to_flush(task, self.__take_events(task), incomplete=True)
+            logs = self.__take_flush_queue()
             self.task_count = 0
-            self.data_store = dict()  # Optionally reset the data store if needed
-            print("Program interrupted. All pending logs have been flushed.")
+            self.data_store = dict()
+        self.__hand_off(logs)
+        self.flush_worker.close(timeout)
+
+
+    @classmethod
+    def reset(cls, timeout=None):
+        """
+        Closes the tracer, if one was created, so the next ExtensiTrace(...) creates a new one with its own options.
+        Functions decorated by the closed tracer keep logging to it and their events are dropped.
+        """
+        with Singleton._lock:
+            instance = Singleton._instances.pop(cls, None)
+        if instance is not None:
+            instance.close(timeout)
+
+
+    def __register_metrics(self):
+        """
+        Creates the metrics recorded on the call path when metrics are enabled, they are left None otherwise.
+        """
+        if self.metrics is None:
+            return
+        self.call_overhead = self.metrics.histogram('extensitrace_call_overhead_seconds', 'Time spent tracing a decorated call, excluding the call itself')
+        self.events_logged = self.metrics.counter('extensitrace_events_logged_total', 'Events recorded by traced calls')
+        self.lock_wait = self.metrics.histogram('extensitrace_lock_wait_seconds', 'Time spent waiting for the task completion lock')
+        self.events_handed_off = self.metrics.counter('extensitrace_events_handed_off_total', 'Events handed off to the flush worker')
+        self.metrics.gauge('extensitrace_live_tasks', lambda: len(self.data_store), 'Tasks started but not completed')
+        self.metrics.gauge('extensitrace_buffered_events', lambda: sum(len(task.events) for task in list(self.data_store.values())), 'Events held by live tasks')
+        self.metrics.gauge('extensitrace_pending_flush_events', lambda: len(self.to_flush), 'Events of completed tasks waiting for task_flush_limit')
+
+
+    def flush(self, timeout=None):
+        """
+        Blocks until the logs of all handed off tasks have been written by the connector.
+        Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        flushed = self.flush_worker.flush(timeout)
+        # Connectors with queues of their own (CompositeConnector) are waited for as well
+        drain = getattr(self.connector, 'drain', None)
+        if flushed and drain is not None:
+            flushed = drain(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return flushed
+
+
+    def flush_stats(self):
+        """
+        Returns the queued, flushed, dropped, overflowed and pending event counters of the flush worker,
+        and the counters of the connector under 'connector' if it keeps any (spool, composite sinks).
+        """
+        stats = self.flush_worker.stats()
+        connector_stats = getattr(self.connector, 'stats', None)
+        if callable(connector_stats):
+            stats['connector'] = connector_stats()
+        return stats
+
+
+    def task_store_stats(self):
+        """
+        Returns the number of live tasks, the events and approximate JSON bytes they hold, the events
+        waiting for task_flush_limit and the number of tasks evicted so far.
+        """
+        tasks = list(self.data_store.values())
+        events = [event for task in tasks for event in list(task.events)]
+        with self.lock:
+            pending = list(self.to_flush)
+        return {
+            'live_tasks': len(tasks),
+            'buffered_events': len(events),
+            'bytes_held': sum(len(event.to_json()) if type(event) is Event else json_size(event) for event in events + pending),
+            'pending_events': len(pending),
+            'evicted_tasks': self.evicted_task_count,
+        }
+
+
+    def sampling_stats(self):
+        """
+        Returns the number of tasks dropped by head and tail sampling and of events dropped by the rate limit.
+        """
+        with self.sampling_lock:
+            return dict(self.sampling_counts)
+
+
+    def __count_sampled_out(self, key):
+        with self.sampling_lock:
+            self.sampling_counts[key] += 1
 
 
     # The expectation if you're using task_id is that you are responsible for managing the context around it
     # Task id can only be set at the top level function
-    def log(self, track=False, task_id=None):
+    # max_field_bytes, max_event_bytes and hash_content override the payload limits of the constructor for this function
+    # sample_rate, tail_sample_rate, slow_task_threshold and max_events_per_second override the sampling of the constructor,
+    # the sample rates only apply to functions starting a task
+    def log(self, track=False, task_id=None, max_field_bytes=None, max_event_bytes=None, hash_content=None,
+            sample_rate=None, tail_sample_rate=None, slow_task_threshold=None, max_events_per_second=None):
         def decorator(func):
+            bind_arguments = argument_binder(func)
+            payload_policy = self.payload_policy.override(max_field_bytes, max_event_bytes, hash_content)
+            sampling_policy = self.sampling_policy.override(sample_rate, tail_sample_rate, slow_task_threshold, max_events_per_second)
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.instrumented:
+                        self.__instrument_client()
+                    task = _task.get()
+                    if task is _UNSAMPLED or ((task is None or track) and not sampling_policy.sample_head()):
+                        token = self.__enter_unsampled(task, track)
+                        try:
+                            return await func(*args, **kwargs)
+                        finally:
+                            if token is not None:
+                                _task.reset(token)
+                    call = self.__start_call(func, bind_arguments, sampling_policy, track, task_id, args, kwargs)
+                    try:
+                        result = await func(*args, **kwargs)
+                    except BaseException as e:
+                        self.__end_call(func, call, None, payload_policy, sampling_policy, error=e)
+                        raise
+                    self.__end_call(func, call, result, payload_policy, sampling_policy)
+                    return result
+                return async_wrapper
+
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                if track and hasattr(thread_local_storage, 'task_id') and len(self.data_store[thread_local_storage.task_id]['call_stack']) > 0:
-                    raise ValueError("Cannot track a top level function that is already part of a task.")
-                if not hasattr(thread_local_storage, 'task_id') or track:
-                    thread_local_storage.task_id = task_id or str(uuid.uuid4())
-                    with self.lock:
-                        self.task_flush_ids.put(thread_local_storage.task_id)
-                        self.task_count += 1
-                        self.data_store[thread_local_storage.task_id] = {
-                            'queue': Queue(),
-                            'client': self.client,
-                            'call_stack': [],
-                            'patched': False,
-                            'completion_ids': set(),
-                            'last_openai_call': {},
-                            'metadata': None
-                        }
-
-                with self.lock:
-                    self.data_store[thread_local_storage.task_id]['call_stack'].append((func.__name__, str(uuid.uuid4())))
-
-
-                func_args = inspect.signature(func).bind(*args, **kwargs).arguments
-                func_args_dict = self.__serialize_arguments(func_args)
-                start_time = datetime.now().timestamp()
-
-                with self.__patched_create_method():
+                if not self.instrumented:
+                    self.__instrument_client()
+                task = _task.get()
+                if task is _UNSAMPLED or ((task is None or track) and not sampling_policy.sample_head()):
+                    token = self.__enter_unsampled(task, track)
+                    try:
+                        return func(*args, **kwargs)
+                    finally:
+                        if token is not None:
+                            _task.reset(token)
+                call = self.__start_call(func, bind_arguments, sampling_policy, track, task_id, args, kwargs)
+                try:
                     result = func(*args, **kwargs)
-
-                end_time = datetime.now().timestamp()
-                with self.lock:
-                    log = self.data_store[thread_local_storage.task_id]['call_stack'].pop()
-
-                    self.__log_event(
-                        log_id=log[1],
-                        function_name=func.__name__,
-                        start_time=start_time,
-                        end_time=end_time,
-                        args=func_args_dict,
-                        result={'result_string':result} if isinstance(result, str) else result,
-                        task_id=thread_local_storage.task_id,
-                        agent_id=self.agent_id,
-                        parent_log_id=self.data_store[thread_local_storage.task_id]['call_stack'][-1][1] if self.data_store[thread_local_storage.task_id]['call_stack'] else None,
-                        metadata=self.data_store[thread_local_storage.task_id]['metadata'],
-                        inferred_accuracy=None,
-                        accuracy_reasoning=None
-                    )
-
+                except BaseException as e:
+                    self.__end_call(func, call, None, payload_policy, sampling_policy, error=e)
+                    raise
+                self.__end_call(func, call, result, payload_policy, sampling_policy)
                 return result
             return wrapper
         return decorator
 
+
+    def __enter_unsampled(self, task, track):
+        """
+        Enters a call that is not traced, returning a token if it starts a task dropped by head sampling.
+        """
+        if task is _UNSAMPLED:
+            if track:
+                raise ValueError("Cannot track a top level function that is already part of a task.")
+            return None
+        if track and task is not None and _call_stack.get():
+            raise ValueError("Cannot track a top level function that is already part of a task.")
+        self.__count_sampled_out('head_sampled_out')
+        return _task.set(_UNSAMPLED)
+
+
+    def __start_call(self, func, bind_arguments, sampling_policy, track, task_id, args, kwargs):
+        """
+        Enters a decorated call, starting a new task if needed, and returns the state needed to end it.
+        """
+        started = time.perf_counter() if self.call_overhead is not None else None
+        task = _task.get()
+        call_stack = _call_stack.get()
+        if track and task is not None and call_stack:
+            raise ValueError("Cannot track a top level function that is already part of a task.")
+
+        task_token = None
+        if task is None or track:
+            task = TaskState(task_id or str(uuid.uuid4()), sampling_policy)
+            if self.task_summary:
+                task.summary = TaskSummary(self.model_prices)
+            task_token = _task.set(task)
+            self.data_store[task.task_id] = task
+            if self.max_live_tasks is not None and len(self.data_store) > self.max_live_tasks:
+                self.__evict_tasks()
+            elif self.task_ttl is not None and time.monotonic() - self.last_task_sweep > self.task_ttl / 2:
+                self.__evict_tasks()
+
+        log_id = str(uuid.uuid4())
+        parent_log_id = call_stack[-1][1] if call_stack else None
+        # The sampling policy goes with the call, OpenAI calls made inside it are rate limited by it
+        stack_token = _call_stack.set(call_stack + ((func.__name__, log_id, sampling_policy),))
+
+        func_args_dict = self.serializer.serialize_arguments(bind_arguments(args, kwargs))
+        start_time = datetime.now().timestamp()
+        overhead = time.perf_counter() - started if started is not None else None
+        return (task, log_id, parent_log_id, func_args_dict, start_time, stack_token, task_token, overhead)
+
+
+    def __reset_call(self, call):
+        _call_stack.reset(call[5])
+        if call[6] is not None:
+            _task.reset(call[6])
+
+
+    def __end_call(self, func, call, result, payload_policy, sampling_policy, error=None):
+        """
+        Logs a finished call, or a failed one if error is set, and completes the task when it is the top level call.
+        """
+        end_time = datetime.now().timestamp()
+        if call[7] is not None:
+            started = time.perf_counter()
+            try:
+                return self.__finish_call(func, call, result, payload_policy, sampling_policy, error, end_time)
+            finally:
+                self.call_overhead.observe(call[7] + time.perf_counter() - started)
+        return self.__finish_call(func, call, result, payload_policy, sampling_policy, error, end_time)
+
+
+    def __finish_call(self, func, call, result, payload_policy, sampling_policy, error, end_time):
+        task, log_id, parent_log_id, func_args_dict, start_time = call[:5]
+        self.__reset_call(call)
+        if error is not None:
+            task.errored = True
+        if call[6] is not None and not task.sampling_policy.keep_task(task.errored, end_time - start_time):
+            self.__forget_task(task)
+            self.__count_sampled_out('tail_sampled_out')
+            return
+        # Children end first, a call whose children were logged is logged too instead of leaving them orphaned
+        if log_id in task.logged_parents:
+            task.logged_parents.discard(log_id)
+        elif not sampling_policy.allow_event():
+            self.__count_sampled_out('rate_limited')
+            if call[6] is not None:
+                self.__complete_task(task)
+            return
+        if error is not None:
+            result = error_result(error)
+        else:
+            result = {'result_string':result} if isinstance(result, str) else self.serializer.serialize(result)
+        func_args_dict, result = payload_policy.apply(func_args_dict, result)
+        self.__log_event(
+            task,
+            log_id=log_id,
+            function_name=func.__name__,
+            start_time=start_time,
+            end_time=end_time,
+            args=func_args_dict,
+            result=result,
+            task_id=task.task_id,
+            agent_id=self.agent_id,
+            parent_log_id=parent_log_id,
+            metadata=task.metadata,
+            inferred_accuracy=None,
+            accuracy_reasoning=None
+        )
+        if call[6] is not None:
+            self.__complete_task(task)
+
     
     def add_metadata(self, metadata: dict):
-        with self.lock:
-            if self.data_store[thread_local_storage.task_id]['metadata']:
-                metadata = {**metadata, **self.data_store[thread_local_storage.task_id]['metadata']}
-            else:
-                self.data_store[thread_local_storage.task_id]['metadata'] = metadata
+        task = _task.get()
+        if task is _UNSAMPLED:
+            return metadata
+        if task.metadata:
+            metadata = {**metadata, **task.metadata}
+        else:
+            task.metadata = metadata
         return metadata
 
 
-    # TODO: Known bug is mock create getting called multiple times and throws extra logs
-    def mock_create(self, original_create, *args, **kwargs):
+    def __start_api_call(self, kwargs):
         """
-        A mock method to wrap around the original create method, logging additional information.
+        Returns the state of an OpenAI call to log, or None if it is made outside of a task or from within
+        another traced OpenAI call (e.g. a wrapped client calling the create it wraps), which is logged once.
         """
-        with self.lock:
-            patched = self.data_store[thread_local_storage.task_id]['patched']
-
-        if not patched: 
-            chat_args_dict = self.__serialize_arguments(kwargs)
-            chat_call_start_time = datetime.now().timestamp()
-            result = original_create(*args, **kwargs)  
-            chat_call_end_time = datetime.now().timestamp()
-
-            with self.lock:
-                self.__log_event(
-                    log_id=str(uuid.uuid4()),
-                    function_name='openai.chat.completions.create',
-                    start_time=chat_call_start_time,
-                    end_time=chat_call_end_time,
-                    args=chat_args_dict,
-                    result=result.model_dump(),
-                    task_id=getattr(thread_local_storage, 'task_id', str(uuid.uuid4())),
-                    agent_id=self.agent_id,
-                    parent_log_id=self.data_store[thread_local_storage.task_id]['call_stack'][-1][1] if self.data_store[thread_local_storage.task_id]['call_stack'] else None,
-                    metadata=self.data_store[thread_local_storage.task_id]['metadata'],
-                    inferred_accuracy=None,
-                    accuracy_reasoning=None
-                )
-                self.data_store[thread_local_storage.task_id]['patched'] = True
-
-            return result
-        else:
-            # Directly call the original method if already patched
-            return original_create(*args, **kwargs)
+        task = _task.get()
+        call_stack = _call_stack.get()
+        if task is None or task is _UNSAMPLED or not call_stack or _api_call.get() is not None:
+            return None
+        _, parent_log_id, sampling_policy = call_stack[-1]
+        return (task, str(uuid.uuid4()), parent_log_id, self.serializer.serialize_arguments(kwargs), datetime.now().timestamp(), sampling_policy)
 
 
-    @contextlib.contextmanager
-    def __patched_create_method(self):
+    def __log_api_call(self, function_name, call, end_time, result, error=None):
+        """
+        Logs an OpenAI call as a child of the decorated function it was made from.
+        result is the response, or the response assembled from a stream as a dict.
         """
-        A context manager to temporarily patch the create method for logging purposes.
+        task, log_id, parent_log_id, args_dict, start_time, sampling_policy = call
+        if not sampling_policy.allow_event():
+            self.__count_sampled_out('rate_limited')
+            return
+        if error is not None:
+            task.errored = True
+            # A stream failing part way keeps its timings
+            result = {**error_result(error), 'stream': result['stream']} if result is not None else error_result(error)
+        elif function_name == EMBEDDINGS_FUNCTION_NAME:
+            result = embedding_result(result)
+        elif not isinstance(result, dict):
+            result = result.model_dump()
+        args_dict, result = self.payload_policy.apply(args_dict, result)
+        self.__log_event(
+            task,
+            log_id=log_id,
+            function_name=function_name,
+            start_time=start_time,
+            end_time=end_time,
+            args=args_dict,
+            result=result,
+            task_id=task.task_id,
+            agent_id=self.agent_id,
+            parent_log_id=parent_log_id,
+            metadata=task.metadata,
+            inferred_accuracy=None,
+            accuracy_reasoning=None
+        )
+
+
+    def __stream_logger(self, function_name, call):
+        """
+        Returns the callback logging a streamed call when the stream ends, which can be after the decorated
+        function returned. The parent was taken when the call was made.
+        """
+        def log_stream(result, error):
+            self.__log_api_call(function_name, call, datetime.now().timestamp(), result, error=error)
+        return log_stream
+
+
+    def __instrument_client(self):
+        """
+        Wraps the create methods of the client once instead of swapping them in and out on every decorated call.
+        The wrappers look up the calling task through the context variables and pass straight through
+        when they are called outside of a task, so threads and coroutines can share one client.
         """
         with self.lock:
-            patched = self.data_store[thread_local_storage.task_id]['patched']
-        
-        if not patched: 
-            task_id = thread_local_storage.task_id
-            with self.lock:
-                original_create = self.data_store[task_id]['client'].chat.completions.create
-
-            def patched_create(*args, **kwargs):
+            if self.instrumented:
+                return
+            for path in API_RESOURCES:
+                resource = self.client
+                for name in path.split('.'):
+                    resource = getattr(resource, name, None)
+                # Older clients lack some resources, e.g. responses
+                if resource is not None:
+                    self.__instrument_resource(resource, f'openai.{path}.create')
+            self.instrumented = True
+
+
+    def __instrument_resource(self, resource, function_name):
+        original_create = resource.create
+        if getattr(original_create, '__extensitrace_traced__', False):
+            return
+
+        if inspect.iscoroutinefunction(inspect.unwrap(original_create)):
+            async def traced_create(*args, **kwargs):
+                call = self.__start_api_call(kwargs)
+                if call is None:
+                    return await original_create(*args, **kwargs)
+                token = _api_call.set(call[1])
                 try:
-                    return self.mock_create(original_create, *args, **kwargs)
+                    result = await original_create(*args, **kwargs)
+                except BaseException as e:
+                    self.__log_api_call(function_name, call, datetime.now().timestamp(), None, error=e)
+                    raise
                 finally:
-                    # Immediately restore the original method to avoid recursion
-                    with self.lock:
-                        self.data_store[task_id]['client'].chat.completions.create = original_create
-                        self.data_store[thread_local_storage.task_id]['patched'] = False
-
-            with self.lock:
-                self.data_store[task_id]['client'].chat.completions.create = patched_create
-            try:
-                yield
-            finally:
-                # Ensure the original method is restored if not already done
-                with self.lock:
-                    if self.data_store[task_id]['client'].chat.completions.create != original_create:
-                        self.data_store[task_id]['client'].chat.completions.create = original_create
-                        self.data_store[thread_local_storage.task_id]['patched'] = False
+                    _api_call.reset(token)
+                if kwargs.get('stream'):
+                    return AsyncTracedStream(result, self.__stream_logger(function_name, call))
+                self.__log_api_call(function_name, call, datetime.now().timestamp(), result)
+                return result
         else:
-            yield  # If already patched, yield without re-patching
-
-
-    def __serialize_arguments(self, arguments):
-        return {k: self.__serialize_value(v) for k, v in arguments.items()}
-
+            def traced_create(*args, **kwargs):
+                call = self.__start_api_call(kwargs)
+                if call is None:
+                    return original_create(*args, **kwargs)
+                token = _api_call.set(call[1])
+                try:
+                    result = original_create(*args, **kwargs)
+                except BaseException as e:
+                    self.__log_api_call(function_name, call, datetime.now().timestamp(), None, error=e)
+                    raise
+                finally:
+                    _api_call.reset(token)
+                if kwargs.get('stream'):
+                    return TracedStream(result, self.__stream_logger(function_name, call))
+                self.__log_api_call(function_name, call, datetime.now().timestamp(), result)
+                return result
 
-    def __serialize_value(self, value):
-        if isinstance(value, (str, int, float, bool, type(None))):
-            return value
-        elif isinstance(value, (list, tuple)):
-            return [self.__serialize_value(v) for v in value]
-        elif isinstance(value, dict):
-            return {k: self.__serialize_value(v) for k, v in value.items()}
+        traced_create.__extensitrace_traced__ = True
+        resource.create = traced_create
+
+
+    def __log_event(self, task, **log_entry):
+        event = Event(**log_entry) if self.compact_events else log_entry
+        if self.metrics is not None:
+            self.events_logged.inc()
+        with task.lock:
+            completed = task.completed
+            if not completed:
+                task.events.append(event)
+        if completed:
+            # A stream read after its task completed, its event is handed off on its own. Without the tracer lock,
+            # the stream can also be ended by its finalizer, wherever the garbage collector runs it.
+            self.__hand_off([event])
+            return
+        task.logged_parents.add(log_entry['parent_log_id'])
+        if task.summary is not None:
+            task.summary.add(log_entry)
+
+
+    def __complete_task(self, task):
+        """
+        Moves a finished task out of the live tasks, the only point where the call path takes the lock.
+        """
+        self.__forget_task(task)
+        if task.summary is not None:
+            self.__log_summary(task)
+        with task.lock:
+            task.completed = True
+            events, task.events = task.events, []
+        if self.metrics is None:
+            self.lock.acquire()
         else:
-            return str(value)
-
-
-    def __log_event(self, **log_entry):
-        # Example modification to include full call stack in the log
-        task_id = thread_local_storage.task_id
-        if log_entry['function_name'] == 'openai.chat.completions.create':
-            openai_id = log_entry['result']['id']
-            self.data_store[task_id]['last_openai_call'][openai_id] = log_entry['log_id'] 
-
-        self.data_store[task_id]['queue'].put(log_entry)
-
-        if len(self.data_store[task_id]['call_stack']) == 0 and self.task_count >= self.task_flush_limit:
-            # TODO: to be made non-blocking
-            removed = 0
-            while removed < self.task_flush_limit: 
-                task_id = self.task_flush_ids.get()
-                removed += 1
-                self.__add_to_flush(task_id)
-            self.task_count -= self.task_flush_limit
-            self.__flush_queue()
-
-
-    # TODO: add batch flushing with storing in memory
-    def __add_to_flush(self, task_id):
-        while not self.data_store[task_id]['queue'].empty():
-            log_entry = self.data_store[task_id]['queue'].get()
-            # Skip the loop if the log id is not the last openai call
-            if log_entry['function_name'] == 'openai.chat.completions.create' and self.data_store[task_id]['last_openai_call'][log_entry['result']['id']] != log_entry['log_id']:
-                continue
+            waiting = time.perf_counter()
+            self.lock.acquire()
+            self.lock_wait.observe(time.perf_counter() - waiting)
+        logs = []
+        try:
+            self.__add_to_flush(task, events)
+            self.task_count += 1
+            if self.task_count >= self.task_flush_limit:
+                self.task_count = 0
+                logs = self.__take_flush_queue()
+        finally:
+            self.lock.release()
+        self.__hand_off(logs)
+
+
+    def __log_summary(self, task):
+        """
+        Logs the aggregates of a completed task as one more event of the task, so consumers do not have to rebuild the call tree.
+        """
+        summary = task.summary
+        task.summary = None
+        self.__log_event(
+            task,
+            log_id=str(uuid.uuid4()),
+            function_name=SUMMARY_FUNCTION_NAME,
+            start_time=summary.start_time,
+            end_time=summary.end_time,
+            args={},
+            result=summary.result(),
+            task_id=task.task_id,
+            agent_id=self.agent_id,
+            parent_log_id=None,
+            metadata=task.metadata,
+            inferred_accuracy=None,
+            accuracy_reasoning=None
+        )
+
+
+    def __forget_task(self, task):
+        if self.data_store.get(task.task_id) is task:
+            self.data_store.pop(task.task_id, None)
+
+
+    def __evict_tasks(self):
+        """
+        Flushes and drops live tasks over max_live_tasks (oldest first) or older than task_ttl.
+        Their events so far are flushed marked as incomplete, if such a task completes later its remaining events follow normally.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.last_task_sweep = now
+            evicted = []
+            if self.max_live_tasks is not None:
+                while len(self.data_store) > self.max_live_tasks:
+                    try:
+                        task = self.data_store.pop(next(iter(self.data_store)))
+                    except (StopIteration, KeyError, RuntimeError):
+                        break
+                    evicted.append(task)
+            if self.task_ttl is not None:
+                for task_id, task in list(self.data_store.items()):
+                    if now - task.started > self.task_ttl:
+                        self.data_store.pop(task_id, None)
+                        evicted.append(task)
+            for task in evicted:
+                self.__add_to_flush(task, self.__take_events(task), incomplete=True)
+            self.evicted_task_count += len(evicted)
+            logs = self.__take_flush_queue()
+        self.__hand_off(logs)
+
+
+    def __take_events(self, task):
+        with task.lock:
+            events, task.events = task.events, []
+        return events
+
+
+    def __add_to_flush(self, task, events, incomplete=False):
+        for log_entry in events:
+            if incomplete:
+                # Rebuilt rather than modified, the same type keeps compact events compact
+                log_entry = type(log_entry)(**{**log_entry, 'metadata': {**(log_entry['metadata'] or {}), '_incomplete': True}})
             self.to_flush.append(log_entry)
 
     
-    def __flush_queue(self):
-        if self.to_flush:
-            self.connector.flush(self.to_flush)
-            self.to_flush.clear()
+    def __take_flush_queue(self):
+        # Called with the lock held, the logs are handed off after releasing it
+        logs, self.to_flush = self.to_flush, []
+        return logs
+
+
+    def __hand_off(self, logs):
+        # Only queues the logs, connector I/O happens on the flush worker thread and spooling on the replay thread
+        if logs:
+            if self.metrics is not None:
+                self.events_handed_off.inc(len(logs))
+            self.flush_worker.submit(logs)
+
+
+def embedding_result(response) -> dict:
+    """
+    Describes an embeddings response without the vectors, which would dwarf the rest of the log.
+    """
+    return {
+        'object': response.object,
+        'model': response.model,
+        'data': [{'index': item.index, 'dimensions': len(item.embedding)} for item in response.data],
+        'usage': response.usage.model_dump() if response.usage is not None else None,
+    }
+
+
+def error_result(error: BaseException) -> dict:
+    """
+    Describes an exception raised by a traced call, keeping the innermost frames of the traceback.
+    """
+    formatted = ''.join(traceback.format_exception(type(error), error, error.__traceback__, limit=-MAX_TRACEBACK_FRAMES))
+    if len(formatted) > MAX_TRACEBACK_CHARS:
+        formatted = '...' + formatted[-MAX_TRACEBACK_CHARS:]
+    return {'error': {'type': type(error).__qualname__, 'message': str(error), 'traceback': formatted}}
@@ -0,0 +1,187 @@
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from .forking import at_fork_in_child
+
+
+class FlushWorker:
+    """
+    Background thread that drains a bounded hand-off queue of log entries into a connector.
+
+    Callers only append to the queue; batching by size and linger time and all connector I/O
+    happen on the worker thread. When the queue is full new log entries are passed to overflow,
+    or dropped and counted without one.
+    """
+    def __init__(self, connector, max_queue_size: int=10000, max_batch_size: int=100, max_linger_time: float=1.0, name: str='extensitrace-flush',
+                 overflow=None, metrics=None, metrics_label: str=None):
+        """
+        :param connector: Connector whose flush method receives the batches.
+        :param max_queue_size: Maximum number of log entries waiting to be flushed.
+        :param max_batch_size: Maximum number of log entries passed to a single connector flush.
+        :param max_linger_time: Seconds to wait for a batch to fill up before flushing it anyway.
+        :param overflow: Called on the submitting thread with the log entries that did not fit into the queue,
+                         e.g. SpoolingConnector.overflow, so it must not block. Entries are counted as dropped unless it returns True.
+        :param metrics: MetricsRegistry recording queue depth, flush latency and failures, labeled with
+                        metrics_label or the connector class name.
+        """
+        self.connector = connector
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.max_linger_time = max_linger_time
+        self.overflow = overflow
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.overflowed = 0
+        self.flush_seconds = None
+        self.flush_failures = None
+        self.flushed_events = None
+        if metrics is not None:
+            label = metrics_label or type(connector).__name__
+            self.flush_seconds = metrics.histogram('extensitrace_connector_flush_seconds', 'Duration of connector flush calls', connector=label)
+            self.flush_failures = metrics.counter('extensitrace_connector_flush_failures_total', 'Connector flush calls that failed', connector=label)
+            self.flushed_events = metrics.counter('extensitrace_connector_flushed_events_total', 'Events flushed by the connector', connector=label)
+            metrics.gauge('extensitrace_flush_queue_depth', lambda: len(self._queue), 'Events waiting for the connector', connector=label)
+        self._queue = deque()
+        self._in_flight = 0
+        self._flush_waiters = 0
+        self._closed = False
+        self._loop = None
+        self._name = name
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        at_fork_in_child(self._after_fork)
+
+
+    def submit(self, logs: list) -> int:
+        """
+        Hands off log entries to the worker without blocking on connector I/O.
+
+        Returns the number of log entries accepted, the rest are passed to overflow or dropped.
+        """
+        with self._condition:
+            room = 0 if self._closed else self.max_queue_size - len(self._queue)
+            accepted = logs if len(logs) <= room else logs[:max(room, 0)]
+            self._queue.extend(accepted)
+            self.queued += len(accepted)
+            if accepted:
+                self._condition.notify_all()
+        if len(accepted) < len(logs):
+            rejected = logs[len(accepted):]
+            overflowed = self.overflow is not None and self.overflow(rejected) is True
+            with self._condition:
+                if overflowed:
+                    self.overflowed += len(rejected)
+                else:
+                    self.dropped += len(rejected)
+        return len(accepted)
+
+
+    def flush(self, timeout: float=None) -> bool:
+        """
+        Blocks until every log entry handed off so far has been passed to the connector.
+
+        Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_waiters += 1
+            self._condition.notify_all()
+            try:
+                while self._queue or self._in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                return True
+            finally:
+                self._flush_waiters -= 1
+
+
+    def close(self, timeout: float=None):
+        """
+        Flushes everything still queued and stops the worker thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'overflowed': self.overflowed,
+                'pending': len(self._queue) + self._in_flight,
+            }
+
+
+    def _after_fork(self):
+        # Entries queued before the fork are flushed by the parent, the child starts empty with its own thread
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._in_flight = 0
+        self._flush_waiters = 0
+        self._loop = None
+        self.queued = self.flushed = self.dropped = self.overflowed = 0
+        if not self._closed:
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    if self._loop is not None:
+                        self._loop.close()
+                    return
+                deadline = time.monotonic() + self.max_linger_time
+                while len(self._queue) < self.max_batch_size and not self._closed and not self._flush_waiters:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch_size))]
+                self._in_flight = len(batch)
+
+            if self.flush_seconds is None:
+                ok = self._flush_batch(batch)
+            else:
+                started = time.perf_counter()
+                ok = self._flush_batch(batch)
+                self.flush_seconds.observe(time.perf_counter() - started)
+                if ok:
+                    self.flushed_events.inc(len(batch))
+                else:
+                    self.flush_failures.inc()
+
+            with self._condition:
+                self._in_flight = 0
+                if ok:
+                    self.flushed += len(batch)
+                else:
+                    self.dropped += len(batch)
+                self._condition.notify_all()
+
+
+    def _flush_batch(self, batch: list) -> bool:
+        try:
+            result = self.connector.flush(batch)
+            if inspect.isawaitable(result):
+                # Async connectors run on an event loop owned by the worker thread
+                if self._loop is None:
+                    self._loop = asyncio.new_event_loop()
+                result = self._loop.run_until_complete(result)
+            return result is not False
+        except Exception as e:
+            print(f"An error occurred while flushing logs: {e}")
+            return False
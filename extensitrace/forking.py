@@ -0,0 +1,21 @@
+import os
+import weakref
+
+
+def at_fork_in_child(method):
+    """
+    Calls the bound method in the child process after every fork, without keeping its object alive.
+
+    Only the forking thread exists in the child, so locks held by other threads at the time of the fork
+    stay locked and background threads are gone. Objects owning either re-create them here.
+    """
+    if not hasattr(os, 'register_at_fork'):
+        return
+    ref = weakref.WeakMethod(method)
+
+    def after_fork():
+        bound = ref()
+        if bound is not None:
+            bound()
+
+    os.register_at_fork(after_in_child=after_fork)
@@ -0,0 +1,195 @@
+import bisect
+import os
+import threading
+
+
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, labels: dict):
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount: float=1):
+        with self._lock:
+            self.value += amount
+
+
+    def sample(self):
+        return self.value
+
+
+class Gauge:
+    """
+    Gauge reading its value from a callback when a snapshot is taken, so nothing is recorded on the hot path.
+    """
+    type = 'gauge'
+
+    def __init__(self, labels: dict, read):
+        self.labels = labels
+        self.read = read
+
+
+    def sample(self):
+        try:
+            return self.read()
+        except Exception:
+            return None
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, labels: dict, buckets=DEFAULT_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+    def sample(self) -> dict:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[bound] = running
+        return {'count': count, 'sum': total, 'buckets': cumulative}
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms describing the tracer itself.
+
+    Metrics are identified by name and labels, asking for an existing one returns it. snapshot returns
+    the current values as a dict, prometheus_text renders them in the Prometheus text format, and
+    start_exporter hands snapshots to any callable at an interval.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._descriptions = {}
+        self._lock = threading.Lock()
+
+
+    def counter(self, name: str, help: str='', **labels) -> Counter:
+        return self.__get_or_create(name, help, labels, lambda: Counter(labels))
+
+
+    def gauge(self, name: str, read, help: str='', **labels) -> Gauge:
+        """
+        :param read: Callable returning the current value.
+        """
+        return self.__get_or_create(name, help, labels, lambda: Gauge(labels, read))
+
+
+    def histogram(self, name: str, help: str='', buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        return self.__get_or_create(name, help, labels, lambda: Histogram(labels, buckets))
+
+
+    def snapshot(self) -> dict:
+        """
+        Returns {name: {'type', 'help', 'samples': [{'labels', 'value'}]}} with histogram values as {'count', 'sum', 'buckets'}.
+        """
+        with self._lock:
+            metrics = list(self._metrics.items())
+            descriptions = dict(self._descriptions)
+        snapshot = {}
+        for (name, _), metric in metrics:
+            entry = snapshot.setdefault(name, {'type': metric.type, 'help': descriptions[name], 'samples': []})
+            entry['samples'].append({'labels': dict(metric.labels), 'value': metric.sample()})
+        return snapshot
+
+
+    def prometheus_text(self) -> str:
+        lines = []
+        for name, entry in self.snapshot().items():
+            if entry['help']:
+                lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            for sample in entry['samples']:
+                labels, value = sample['labels'], sample['value']
+                if entry['type'] != 'histogram':
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for bound, count in value['buckets'].items():
+                    lines.append(f"{name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {count}")
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+    def start_exporter(self, exporter, interval: float=10.0) -> threading.Event:
+        """
+        Calls exporter(registry) every interval seconds on a background thread.
+        Returns an event, set it to stop exporting.
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    exporter(self)
+                except Exception as e:
+                    print(f"An error occurred while exporting metrics: {e}")
+
+        threading.Thread(target=run, name='extensitrace-metrics-exporter', daemon=True).start()
+        return stop
+
+
+    def __get_or_create(self, name, help, labels, create):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = create()
+                self._descriptions.setdefault(name, help)
+            return metric
+
+
+class PrometheusFileExporter:
+    """
+    Exporter writing the Prometheus text format to a file, e.g. for the node_exporter textfile collector.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+
+    def __call__(self, registry: MetricsRegistry):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(registry.prometheus_text())
+        os.replace(tmp_path, self.path)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
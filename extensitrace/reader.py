@@ -0,0 +1,206 @@
+import gzip
+import itertools
+import json
+import mmap
+import os
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+from .dedup import blob_refs, rehydrate
+from .model import Task
+
+
+INDEX_VERSION = 1
+
+
+class TraceReader:
+    """
+    Streams Task records out of a JSON Lines log written by LocalConnector.
+
+    Records are parsed lazily one line at a time. For uncompressed logs build_index writes a sidecar
+    index (<path>.idx) with the byte offsets of every task and of every time bucket, so reading one
+    task is a handful of seeks into a memory map instead of a scan of the whole file. Records appended
+    after the index was built are found by scanning only the part of the log past the index. The index
+    is extended incrementally as the log grows and rebuilt if the log was rotated or truncated.
+    """
+    def __init__(self, path: str, index_path: str=None, bucket_seconds: int=3600,
+                 blobs: Union[Mapping[str, dict], Callable[[List[str]], Dict[str, dict]]]=None):
+        """
+        :param path: Log file, .gz and .zst files are streamed but cannot be indexed.
+        :param index_path: Sidecar index file, defaults to <path>.idx.
+        :param bucket_seconds: Width of the start_time buckets in the index.
+        :param blobs: Blob mapping or loader (e.g. LocalConnector.load_blobs) to rehydrate deduplicated messages.
+                      A loader is only called for hashes it has not been asked for before.
+        """
+        self.path = path
+        self.index_path = index_path or f'{path}.idx'
+        self.bucket_seconds = bucket_seconds
+        self.blobs = blobs
+        self.loaded_blobs = {}
+        self.missing_blobs = set()
+        self.compressed = path.endswith('.gz') or path.endswith('.zst')
+        self.index = None
+
+
+    def iter_tasks(self, task_id: str=None, agent_id: str=None, function_name: str=None,
+                   since: float=None, until: float=None) -> Iterator[Task]:
+        """
+        Yields the records matching all given filters, since/until bound the start_time of a record.
+        Uses the index for task_id and time range filters when one has been built.
+        """
+        indexed = self.__indexed_offsets(task_id, since, until)
+        if indexed is None:
+            lines = self.__lines()
+        else:
+            offsets, indexed_size = indexed
+            lines = itertools.chain(self.__lines_at(offsets), self.__lines(start=indexed_size))
+        # Cheap substring checks skip most non matching lines before they are parsed. A value is looked for
+        # as orjson writes it and as the stdlib encoder writes it, which escapes non-ASCII characters
+        needles = [needle_forms(value) for value in (task_id, agent_id, function_name) if value is not None]
+        for line in lines:
+            if not line.strip() or not all(any(form in line for form in forms) for forms in needles):
+                continue
+            entry = json.loads(line)
+            if task_id is not None and entry['task_id'] != task_id:
+                continue
+            if agent_id is not None and entry['agent_id'] != agent_id:
+                continue
+            if function_name is not None and entry['function_name'] != function_name:
+                continue
+            if since is not None and entry['start_time'] < since:
+                continue
+            if until is not None and entry['start_time'] > until:
+                continue
+            if self.blobs is not None:
+                entry = self.__rehydrate(entry)
+            yield Task(**entry)
+
+
+    def __rehydrate(self, entry: dict) -> dict:
+        if not callable(self.blobs):
+            return rehydrate([entry], self.blobs)[0]
+        hashes = blob_refs([entry])
+        if not hashes:
+            return entry
+        # Blobs are shared by many records, each one is loaded once per reader
+        wanted = hashes - self.loaded_blobs.keys() - self.missing_blobs
+        if wanted:
+            self.loaded_blobs.update(self.blobs(sorted(wanted)))
+            self.missing_blobs.update(wanted - self.loaded_blobs.keys())
+        return rehydrate([entry], self.loaded_blobs)[0]
+
+
+    def get_task(self, task_id: str) -> List[Task]:
+        """
+        Returns all records of one task.
+        """
+        return list(self.iter_tasks(task_id=task_id))
+
+
+    def build_index(self) -> dict:
+        """
+        Creates or extends the sidecar index and returns it.
+        """
+        if self.compressed:
+            raise ValueError("Compressed logs cannot be indexed, they can only be streamed")
+        stat = os.stat(self.path)
+        index = self.__load_index()
+        if index is None or index['inode'] != stat.st_ino or index['size'] > stat.st_size or index['bucket_seconds'] != self.bucket_seconds:
+            index = {'version': INDEX_VERSION, 'inode': stat.st_ino, 'size': 0, 'bucket_seconds': self.bucket_seconds, 'tasks': {}, 'buckets': {}}
+
+        with open(self.path, 'rb') as f:
+            f.seek(index['size'])
+            offset = index['size']
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A batch still being written, it is picked up by the next build
+                    break
+                if line.strip():
+                    entry = json.loads(line)
+                    index['tasks'].setdefault(entry['task_id'], []).append(offset)
+                    bucket = str(int(entry['start_time'] // self.bucket_seconds))
+                    index['buckets'].setdefault(bucket, []).append(offset)
+                offset += len(line)
+            index['size'] = offset
+
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+        self.index = index
+        return index
+
+
+    def __load_index(self) -> Optional[dict]:
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return index if index.get('version') == INDEX_VERSION else None
+
+
+    def __indexed_offsets(self, task_id, since, until) -> Optional[Tuple[List[int], int]]:
+        """
+        Returns the offsets of candidate lines from the index and the size of the indexed part of the log,
+        lines appended after it are scanned. Returns None when the whole file has to be scanned.
+        """
+        if self.compressed or (task_id is None and since is None and until is None):
+            return None
+        if self.index is None:
+            self.index = self.__load_index()
+        if self.index is None:
+            return None
+        stat = os.stat(self.path)
+        if self.index['inode'] != stat.st_ino or self.index['size'] > stat.st_size:
+            # Rotated or truncated since the index was built
+            return None
+
+        candidates = None
+        if task_id is not None:
+            candidates = set(self.index['tasks'].get(task_id, []))
+        if since is not None or until is not None:
+            first = None if since is None else int(since // self.bucket_seconds)
+            last = None if until is None else int(until // self.bucket_seconds)
+            in_range = set()
+            for bucket, offsets in self.index['buckets'].items():
+                bucket = int(bucket)
+                if (first is None or bucket >= first) and (last is None or bucket <= last):
+                    in_range.update(offsets)
+            candidates = in_range if candidates is None else candidates & in_range
+        return sorted(candidates), self.index['size']
+
+
+    def __lines(self, start: int=0) -> Iterator[bytes]:
+        if self.path.endswith('.gz'):
+            with gzip.open(self.path, 'rb') as f:
+                yield from f
+        elif self.path.endswith('.zst'):
+            import zstandard
+            with open(self.path, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True) as f:
+                buffer = b''
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    lines = (buffer + chunk).split(b'\n')
+                    buffer = lines.pop()
+                    yield from lines
+                if buffer:
+                    yield buffer
+        else:
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                yield from f
+
+
+    def __lines_at(self, offsets: List[int]) -> Iterator[bytes]:
+        if not offsets:
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in offsets:
+                end = mm.find(b'\n', offset)
+                yield mm[offset:end if end != -1 else len(mm)]
+
+
+def needle_forms(value: str) -> tuple:
+    """
+    Returns the byte strings a value can appear as inside a JSON line: unescaped UTF-8 and ASCII with \\u escapes.
+    """
+    return tuple({json.dumps(value, ensure_ascii=False)[1:-1].encode('utf-8'), json.dumps(value)[1:-1].encode('ascii')})
@@ -0,0 +1,80 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing rate events per second on average and bursts of up to burst events.
+    """
+    def __init__(self, rate: float, burst: float=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def consume(self, tokens: float=1) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+
+class SamplingPolicy:
+    """
+    Decides which tasks and events are recorded.
+
+    Head sampling happens when a task starts, so unsampled tasks skip tracing entirely. Tail sampling
+    happens when a task completes: errored tasks and tasks slower than slow_task_threshold are always
+    kept, the rest is kept with tail_sample_rate. max_events_per_second caps recorded events with a token bucket.
+    """
+    def __init__(self, sample_rate: float=1.0, tail_sample_rate: float=1.0, slow_task_threshold: float=None, max_events_per_second: float=None, bucket: TokenBucket=None):
+        """
+        :param sample_rate: Fraction of tasks recorded, decided when the task starts.
+        :param tail_sample_rate: Fraction of successful, fast tasks kept when the task completes.
+        :param slow_task_threshold: Tasks running at least this many seconds are always kept.
+        :param max_events_per_second: Cap on recorded events, events over the cap are dropped.
+        """
+        self.sample_rate = sample_rate
+        self.tail_sample_rate = tail_sample_rate
+        self.slow_task_threshold = slow_task_threshold
+        self.max_events_per_second = max_events_per_second
+        self.bucket = bucket or (TokenBucket(max_events_per_second) if max_events_per_second else None)
+
+
+    def override(self, sample_rate: float=None, tail_sample_rate: float=None, slow_task_threshold: float=None, max_events_per_second: float=None) -> 'SamplingPolicy':
+        """
+        Returns a policy with the given settings replacing the ones of this policy, None keeps a setting.
+        Without its own max_events_per_second the returned policy shares the token bucket of this policy.
+        """
+        if sample_rate is None and tail_sample_rate is None and slow_task_threshold is None and max_events_per_second is None:
+            return self
+        return SamplingPolicy(
+            sample_rate=self.sample_rate if sample_rate is None else sample_rate,
+            tail_sample_rate=self.tail_sample_rate if tail_sample_rate is None else tail_sample_rate,
+            slow_task_threshold=self.slow_task_threshold if slow_task_threshold is None else slow_task_threshold,
+            max_events_per_second=self.max_events_per_second if max_events_per_second is None else max_events_per_second,
+            bucket=self.bucket if max_events_per_second is None else None,
+        )
+
+
+    def sample_head(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+
+    def keep_task(self, errored: bool, duration: float) -> bool:
+        if errored or self.tail_sample_rate >= 1.0:
+            return True
+        if self.slow_task_threshold is not None and duration >= self.slow_task_threshold:
+            return True
+        return random.random() < self.tail_sample_rate
+
+
+    def allow_event(self) -> bool:
+        return self.bucket is None or self.bucket.consume()
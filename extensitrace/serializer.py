@@ -0,0 +1,130 @@
+import base64
+import dataclasses
+import inspect
+from typing import Any, Callable
+
+
+_JSON_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+class Serializer:
+    """
+    Converts function arguments and results into JSON safe values.
+
+    Encoders are registered per type and resolved along the MRO once per type, so serializing a value
+    is a dict lookup instead of an isinstance chain. Scalars are returned as is, lists and dicts are always
+    copied so a logged value does not change when the caller mutates its arguments after the call (and is
+    not mutated while the flush thread encodes it). Encoders registered with json_safe=True (e.g. pydantic's
+    model_dump(mode='json')) are trusted and not walked again. Anything without an encoder falls back to str().
+    """
+    def __init__(self):
+        self._encoders = {}
+        self._resolved = {}
+        for scalar in (str, int, float):
+            # Subclasses such as str enums resolve to these, exact types never reach the lookup
+            self.register(scalar, _identity, json_safe=True)
+        self.register(list, self._encode_sequence, json_safe=True)
+        self.register(tuple, self._encode_sequence, json_safe=True)
+        self.register(set, self._encode_sequence, json_safe=True)
+        self.register(frozenset, self._encode_sequence, json_safe=True)
+        self.register(dict, self._encode_dict, json_safe=True)
+        self.register(bytes, _encode_bytes, json_safe=True)
+        self.register(bytearray, _encode_bytes, json_safe=True)
+        _register_optional_encoders(self)
+
+
+    def register(self, value_type: type, encoder: Callable[[Any], Any], json_safe: bool=False):
+        """
+        Registers an encoder for a type and its subclasses.
+
+        :param value_type: Type handled by the encoder.
+        :param encoder: Callable converting a value of that type.
+        :param json_safe: Whether the encoder output is already JSON safe, otherwise it is serialized again.
+        """
+        if json_safe:
+            self._encoders[value_type] = encoder
+        else:
+            self._encoders[value_type] = lambda value: self.serialize(encoder(value))
+        self._resolved.clear()
+
+
+    def serialize(self, value):
+        value_type = type(value)
+        if value_type in _JSON_SCALARS:
+            return value
+        encoder = self._resolved.get(value_type)
+        if encoder is None:
+            encoder = self._resolve(value_type)
+        return encoder(value)
+
+
+    def serialize_arguments(self, arguments: dict) -> dict:
+        return {k: self.serialize(v) for k, v in arguments.items()}
+
+
+    def _resolve(self, value_type):
+        for base in value_type.__mro__:
+            if base in self._encoders:
+                encoder = self._encoders[base]
+                break
+        else:
+            if dataclasses.is_dataclass(value_type):
+                encoder = lambda value: self.serialize(dataclasses.asdict(value))
+            else:
+                encoder = str
+        self._resolved[value_type] = encoder
+        return encoder
+
+
+    def _encode_sequence(self, value):
+        serialize = self.serialize
+        return [serialize(item) for item in value]
+
+
+    def _encode_dict(self, value):
+        serialize = self.serialize
+        return {key if type(key) is str else str(key): serialize(item) for key, item in value.items()}
+
+
+def _identity(value):
+    return value
+
+
+def _encode_bytes(value):
+    return base64.b64encode(bytes(value)).decode('ascii')
+
+
+def _register_optional_encoders(serializer: Serializer):
+    try:
+        from pydantic import BaseModel
+        serializer.register(BaseModel, lambda value: value.model_dump(mode='json'), json_safe=True)
+    except ImportError:
+        pass
+    try:
+        import numpy
+        serializer.register(numpy.ndarray, lambda value: value.tolist(), json_safe=True)
+        serializer.register(numpy.generic, lambda value: value.item())
+    except ImportError:
+        pass
+
+
+def argument_binder(func: Callable) -> Callable:
+    """
+    Inspects the signature of func once and returns a callable mapping call arguments to parameter names.
+    Plain positional calls are zipped against the cached parameter names, everything else goes through
+    the cached signature's bind.
+    """
+    signature = inspect.signature(func)
+    positional = []
+    for parameter in signature.parameters.values():
+        if parameter.kind not in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            break
+        positional.append(parameter.name)
+    positional = tuple(positional)
+
+    def bind(args, kwargs):
+        if not kwargs and len(args) <= len(positional):
+            return dict(zip(positional, args))
+        return signature.bind(*args, **kwargs).arguments
+
+    return bind
@@ -0,0 +1,115 @@
+import itertools
+import json
+import os
+import threading
+import time
+from .event import encode_json
+
+
+class Spool:
+    """
+    Directory of batch files holding events that could not be delivered yet.
+
+    Every batch is written to a temporary file, fsynced and renamed into place, so a crash leaves
+    either a complete batch or nothing. File names start with the write time, so batches are
+    replayed oldest first, also by a later process using the same directory. Batches the connector
+    keeps rejecting are moved to the rejected subdirectory, where they are kept for inspection.
+    """
+    def __init__(self, directory: str, max_bytes: int=1024 ** 3, fsync: bool=True):
+        """
+        :param directory: Directory of the batch files, created if missing.
+        :param max_bytes: Batches that would grow the spool past this size are rejected.
+        :param fsync: Sync every batch to disk before it counts as spooled.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.spooled = 0
+        self.rejected = 0
+        self.quarantined = 0
+        self.rejected_directory = os.path.join(directory, 'rejected')
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path in self.batches())
+
+
+    def write(self, logs: list) -> bool:
+        """
+        Stores a batch. Returns False if the spool is full or the batch could not be written.
+        """
+        if not logs:
+            return True
+        data = b''.join(encode_json(log) + b'\n' for log in logs)
+        with self._lock:
+            if self.size + len(data) > self.max_bytes:
+                self.rejected += len(logs)
+                return False
+            self.size += len(data)
+
+        path = os.path.join(self.directory, f'{time.time_ns():020d}-{os.getpid()}-{next(self._counter):06d}.jsonl')
+        try:
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            print(f'Error writing to spool: {e}')
+            with self._lock:
+                self.size -= len(data)
+                self.rejected += len(logs)
+            return False
+        with self._lock:
+            self.spooled += len(logs)
+        return True
+
+
+    def batches(self) -> list:
+        """
+        Returns the paths of the spooled batches, oldest first.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in sorted(names) if name.endswith('.jsonl')]
+
+
+    def read(self, path: str) -> list:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+    def remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            # Replayed by another process sharing the directory
+            return
+        with self._lock:
+            self.size = max(self.size - size, 0)
+
+
+    def quarantine(self, path: str, events: int):
+        """
+        Moves a batch out of the replay order into the rejected subdirectory.
+        """
+        os.makedirs(self.rejected_directory, exist_ok=True)
+        try:
+            size = os.path.getsize(path)
+            os.replace(path, os.path.join(self.rejected_directory, os.path.basename(path)))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.size = max(self.size - size, 0)
+            self.quarantined += events
+
+
+    def stats(self) -> dict:
+        batches = self.batches()
+        with self._lock:
+            return {'spooled': self.spooled, 'rejected': self.rejected, 'quarantined': self.quarantined,
+                    'pending_batches': len(batches), 'pending_bytes': self.size}
@@ -0,0 +1,244 @@
+import time
+from array import array
+
+
+class StreamAccumulator:
+    """
+    Assembles the chunks of a streamed chat completion into the completion it stands for, and times them.
+
+    Each chunk only appends its deltas and one timestamp, the message is joined once when the stream ends.
+    Streams of the responses API end with an event carrying the whole response, which is kept instead.
+    """
+    __slots__ = ('started', 'last', 'first_chunk', 'gaps', 'chunks', 'id', 'model', 'created', 'system_fingerprint', 'usage', 'choices', 'response')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = None
+        self.first_chunk = None
+        self.gaps = array('d')
+        self.chunks = 0
+        self.id = None
+        self.model = None
+        self.created = None
+        self.system_fingerprint = None
+        self.usage = None
+        self.choices = {}
+        self.response = None
+
+
+    def add(self, chunk):
+        now = time.perf_counter()
+        if self.last is None:
+            self.first_chunk = now - self.started
+        else:
+            self.gaps.append(now - self.last)
+        self.last = now
+        self.chunks += 1
+        if not hasattr(chunk, 'choices'):
+            response = getattr(chunk, 'response', None)
+            if response is not None:
+                self.response = response
+            return
+        if self.id is None:
+            self.id, self.model, self.created = chunk.id, chunk.model, chunk.created
+        self.system_fingerprint = getattr(chunk, 'system_fingerprint', None) or self.system_fingerprint
+        usage = getattr(chunk, 'usage', None)
+        if usage is not None:
+            self.usage = usage
+        for choice in chunk.choices or ():
+            state = self.choices.get(choice.index)
+            if state is None:
+                state = self.choices[choice.index] = {'role': None, 'content': [], 'tool_calls': {}, 'finish_reason': None}
+            delta = choice.delta
+            if delta is not None:
+                if delta.role:
+                    state['role'] = delta.role
+                if delta.content:
+                    state['content'].append(delta.content)
+                for tool_call in delta.tool_calls or ():
+                    self.__add_tool_call(state['tool_calls'], tool_call)
+            if choice.finish_reason:
+                state['finish_reason'] = choice.finish_reason
+
+
+    @staticmethod
+    def __add_tool_call(tool_calls: dict, delta):
+        # The id, type and name arrive with the first delta of a call, the arguments in pieces after it
+        call = tool_calls.get(delta.index)
+        if call is None:
+            call = tool_calls[delta.index] = {'id': None, 'type': 'function', 'name': None, 'arguments': []}
+        if delta.id:
+            call['id'] = delta.id
+        if delta.type:
+            call['type'] = delta.type
+        function = delta.function
+        if function is not None:
+            if function.name:
+                call['name'] = function.name
+            if function.arguments:
+                call['arguments'].append(function.arguments)
+
+
+    def result(self, completed: bool) -> dict:
+        """
+        Returns the assembled completion in the shape of a non-streamed one, with the stream timings under 'stream'.
+
+        :param completed: Whether the stream was read to the end, rather than closed early or failed.
+        """
+        if self.response is not None:
+            return {**self.response.model_dump(), 'stream': self.timings(completed)}
+        choices = []
+        for index, state in sorted(self.choices.items()):
+            message = {'role': state['role'] or 'assistant', 'content': ''.join(state['content']) if state['content'] else None}
+            if state['tool_calls']:
+                message['tool_calls'] = [{'id': call['id'], 'type': call['type'], 'function': {'name': call['name'], 'arguments': ''.join(call['arguments'])}}
+                                         for _, call in sorted(state['tool_calls'].items())]
+            choices.append({'index': index, 'message': message, 'finish_reason': state['finish_reason']})
+        usage = self.usage
+        if usage is not None and hasattr(usage, 'model_dump'):
+            usage = usage.model_dump()
+        return {
+            'id': self.id,
+            'object': 'chat.completion',
+            'created': self.created,
+            'model': self.model,
+            'system_fingerprint': self.system_fingerprint,
+            'choices': choices,
+            'usage': usage,
+            'stream': self.timings(completed),
+        }
+
+
+    def timings(self, completed: bool) -> dict:
+        gaps = sorted(self.gaps)
+        end = self.last if self.last is not None else time.perf_counter()
+        inter_chunk = None
+        if gaps:
+            inter_chunk = {
+                'mean': round(sum(gaps) / len(gaps), 6),
+                'p50': round(gaps[len(gaps) // 2], 6),
+                'p95': round(gaps[min(int(len(gaps) * 0.95), len(gaps) - 1)], 6),
+                'max': round(gaps[-1], 6),
+            }
+        return {
+            'completed': completed,
+            'chunks': self.chunks,
+            'time_to_first_token': round(self.first_chunk, 6) if self.first_chunk is not None else None,
+            'duration': round(end - self.started, 6),
+            'inter_chunk': inter_chunk,
+        }
+
+
+class TracedStream:
+    """
+    Passes the chunks of a streamed completion through to the caller as they arrive and logs the
+    assembled completion once, when the stream is exhausted, closed or fails. A stream left unfinished,
+    e.g. by a break out of a bare for loop, is logged as not completed once it is garbage collected.
+    """
+    def __init__(self, stream, finish):
+        """
+        :param stream: The openai Stream returned by create(stream=True).
+        :param finish: Called once with (result, error) when the stream ends.
+        """
+        self._stream = stream
+        self._iterator = None
+        self._finish = finish
+        self._accumulator = StreamAccumulator()
+        self._done = False
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._stream)
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._end(completed=True)
+            raise
+        except BaseException as e:
+            self._end(completed=False, error=e)
+            raise
+        self._add(chunk)
+        return chunk
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        self.close()
+
+
+    def close(self):
+        self._end(completed=False)
+        self._stream.close()
+
+
+    def __del__(self):
+        # Looked up in __dict__, __getattr__ would recurse if __init__ did not run
+        if not self.__dict__.get('_done', True):
+            self._end(completed=False)
+
+
+    def __getattr__(self, name):
+        # response and any other attribute of the wrapped stream
+        return getattr(self._stream, name)
+
+
+    def _add(self, chunk):
+        # A chunk the accumulator does not understand must not break the caller's stream
+        try:
+            self._accumulator.add(chunk)
+        except Exception:
+            pass
+
+
+    def _end(self, completed: bool, error: BaseException=None):
+        if self._done:
+            return
+        self._done = True
+        try:
+            self._finish(self._accumulator.result(completed), error)
+        except Exception as e:
+            print(f"An error occurred while logging a streamed completion: {e}")
+
+
+class AsyncTracedStream(TracedStream):
+    """
+    TracedStream for the AsyncStream returned by the async client.
+    """
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._stream.__aiter__()
+        try:
+            chunk = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._end(completed=True)
+            raise
+        except BaseException as e:
+            self._end(completed=False, error=e)
+            raise
+        self._add(chunk)
+        return chunk
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc, exc_tb):
+        await self.close()
+
+
+    async def close(self):
+        self._end(completed=False)
+        await self._stream.close()
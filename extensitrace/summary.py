@@ -0,0 +1,149 @@
+SUMMARY_FUNCTION_NAME = 'extensitrace.task_summary'
+
+# USD per million (input, output) tokens, matched against the longest prefix of the model name in the response.
+# Estimates from public list prices, pass model_prices to ExtensiTrace to override or extend them.
+DEFAULT_MODEL_PRICES = {
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'o1': (15.00, 60.00),
+    'o1-mini': (1.10, 4.40),
+    'o3': (2.00, 8.00),
+    'o3-mini': (1.10, 4.40),
+    'o4-mini': (1.10, 4.40),
+    'text-embedding-3-small': (0.02, 0.0),
+    'text-embedding-3-large': (0.13, 0.0),
+    'text-embedding-ada-002': (0.10, 0.0),
+}
+
+
+class TaskSummary:
+    """
+    Per-task aggregates, updated as each event of the task is logged.
+
+    Events are logged when calls end, so the children of a call are always added before it: the
+    time of each child is added to its parent's child time, and the longest chain of calls below a
+    call is carried up to its parent. Only the calls that are still open keep state.
+    """
+    __slots__ = ('prices', 'functions', 'models', 'child_time', 'longest_path', 'root', 'start_time', 'end_time', 'events', 'errors')
+
+    def __init__(self, prices: dict):
+        self.prices = prices
+        self.functions = {}
+        self.models = {}
+        self.child_time = {}
+        self.longest_path = {}
+        self.root = None
+        self.start_time = None
+        self.end_time = None
+        self.events = 0
+        self.errors = 0
+
+
+    def add(self, event):
+        """
+        :param event: Event dict or Event, as logged by the tracer.
+        """
+        log_id, parent_log_id, name = event['log_id'], event['parent_log_id'], event['function_name']
+        start_time, end_time = event['start_time'], event['end_time']
+        duration = end_time - start_time
+        self.events += 1
+        if self.start_time is None or start_time < self.start_time:
+            self.start_time = start_time
+        if self.end_time is None or end_time > self.end_time:
+            self.end_time = end_time
+
+        # Concurrent children (asyncio.gather) can add up to more than the call itself
+        self_time = max(duration - self.child_time.pop(log_id, 0.0), 0.0)
+        totals = self.functions.get(name)
+        if totals is None:
+            totals = self.functions[name] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] += self_time
+
+        path = ((name, duration),) + self.longest_path.pop(log_id, (None, ()))[1]
+        if parent_log_id is None:
+            if self.root is None or duration > self.root[0]:
+                self.root = (duration, log_id, path)
+        else:
+            self.child_time[parent_log_id] = self.child_time.get(parent_log_id, 0.0) + duration
+            longest = self.longest_path.get(parent_log_id)
+            if longest is None or duration > longest[0]:
+                self.longest_path[parent_log_id] = (duration, path)
+
+        result = event['result']
+        if isinstance(result, dict):
+            if 'error' in result:
+                self.errors += 1
+            # Only the API call events, a decorated function returning the response would count it twice
+            usage = result.get('usage') if name.startswith('openai.') else None
+            if isinstance(usage, dict):
+                self.__add_usage(result.get('model'), usage)
+
+
+    def __add_usage(self, model, usage: dict):
+        # Chat completions and embeddings report prompt/completion tokens, the responses API input/output tokens
+        prompt = usage.get('prompt_tokens', usage.get('input_tokens')) or 0
+        completion = usage.get('completion_tokens', usage.get('output_tokens')) or 0
+        total = usage.get('total_tokens') or prompt + completion
+        totals = self.models.get(model)
+        if totals is None:
+            totals = self.models[model] = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        totals['calls'] += 1
+        totals['prompt_tokens'] += prompt
+        totals['completion_tokens'] += completion
+        totals['total_tokens'] += total
+
+
+    def result(self) -> dict:
+        """
+        Returns the summary of the events added so far.
+        """
+        models, cost, unpriced = {}, 0.0, []
+        for model, totals in self.models.items():
+            price = model_price(model, self.prices)
+            model_cost = None
+            if price is None:
+                unpriced.append(model)
+            else:
+                model_cost = round((totals['prompt_tokens'] * price[0] + totals['completion_tokens'] * price[1]) / 1e6, 8)
+                cost += model_cost
+            models[model or 'unknown'] = {**totals, 'cost': model_cost}
+        root = self.root or (0.0, None, ())
+        return {
+            'duration': _round(root[0]),
+            'root_log_id': root[1],
+            'events': self.events,
+            'errors': self.errors,
+            'functions': {name: {'calls': calls, 'total_time': _round(total), 'self_time': _round(own)}
+                          for name, (calls, total, own) in self.functions.items()},
+            'critical_path': [{'function_name': name, 'duration': _round(duration)} for name, duration in root[2]],
+            'tokens': {key: sum(totals[key] for totals in self.models.values()) for key in ('prompt_tokens', 'completion_tokens', 'total_tokens')},
+            'models': models,
+            'cost': round(cost, 8),
+            'unpriced_models': unpriced,
+        }
+
+
+def model_price(model, prices: dict):
+    """
+    Returns the (input, output) price per million tokens of the longest matching model name prefix, or None.
+    Prefixes only match whole name parts, gpt-4o-2024-08-06 is priced as gpt-4o but gpt-4.5 not as gpt-4.
+    """
+    if not model:
+        return None
+    best = None
+    for name, price in prices.items():
+        if model.startswith(name) and model[len(name):len(name) + 1] in ('', '-', ':') and (best is None or len(name) > len(best[0])):
+            best = (name, price)
+    return best[1] if best else None
+
+
+def _round(seconds: float) -> float:
+    return round(seconds, 6)
@@ -0,0 +1,24 @@
+import threading
+import time
+
+
+class TaskState:
+    """
+    Per-task tracing state. It is only reachable through the task's context, so the decorated
+    call path reads and writes it without taking the tracer lock.
+    """
+    __slots__ = ('task_id', 'sampling_policy', 'events', 'metadata', 'errored', 'started', 'summary', 'completed', 'logged_parents', 'lock')
+
+    def __init__(self, task_id: str, sampling_policy):
+        self.task_id = task_id
+        self.sampling_policy = sampling_policy
+        self.events = []
+        self.metadata = None
+        self.errored = False
+        self.started = time.monotonic()
+        self.summary = None
+        self.completed = False
+        # Calls with a logged child, which are logged regardless of the rate limit so the call tree stays connected
+        self.logged_parents = set()
+        # Guards events against the owning thread appending while an eviction sweep or the completion takes them
+        self.lock = threading.Lock()
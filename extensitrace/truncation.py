@@ -0,0 +1,100 @@
+import hashlib
+import json
+
+
+class PayloadPolicy:
+    """
+    Byte budgets applied to the args and result of every event before it is buffered.
+
+    Strings longer than max_field_bytes are cut down to that many bytes and suffixed with a marker
+    carrying the original length, or replaced by their sha256 when hash_content is set. If the args and
+    result of an event still exceed max_event_bytes, the largest top level fields are replaced by a
+    marker dict until the event fits.
+    """
+    def __init__(self, max_field_bytes: int=None, max_event_bytes: int=None, hash_content: bool=False):
+        """
+        :param max_field_bytes: Maximum UTF-8 size of a single string value, None for no limit.
+        :param max_event_bytes: Maximum JSON size of the args and result of an event, None for no limit.
+        :param hash_content: Replace oversized strings with their sha256 instead of a truncated prefix.
+        """
+        self.max_field_bytes = max_field_bytes
+        self.max_event_bytes = max_event_bytes
+        self.hash_content = hash_content
+        self.enabled = max_field_bytes is not None or max_event_bytes is not None
+
+
+    def override(self, max_field_bytes: int=None, max_event_bytes: int=None, hash_content: bool=None) -> 'PayloadPolicy':
+        """
+        Returns a policy with the given settings replacing the ones of this policy, None keeps a setting.
+        """
+        if max_field_bytes is None and max_event_bytes is None and hash_content is None:
+            return self
+        return PayloadPolicy(
+            max_field_bytes=self.max_field_bytes if max_field_bytes is None else max_field_bytes,
+            max_event_bytes=self.max_event_bytes if max_event_bytes is None else max_event_bytes,
+            hash_content=self.hash_content if hash_content is None else hash_content,
+        )
+
+
+    def apply(self, args: dict, result):
+        """
+        Returns the args and result of an event reduced to the budgets. Values are expected to be serialized already.
+        """
+        if not self.enabled:
+            return args, result
+        if self.max_field_bytes is not None:
+            args = self._limit_strings(args)
+            result = self._limit_strings(result)
+        if self.max_event_bytes is not None:
+            args, result = self._limit_event(args, result)
+        return args, result
+
+
+    def _limit_strings(self, value):
+        value_type = type(value)
+        if value_type is str:
+            # A character is at most 4 bytes in UTF-8, so short strings skip the encoding
+            if len(value) * 4 <= self.max_field_bytes:
+                return value
+            encoded = value.encode('utf-8')
+            if len(encoded) <= self.max_field_bytes:
+                return value
+            if self.hash_content:
+                return content_hash(encoded)
+            prefix = encoded[:self.max_field_bytes].decode('utf-8', 'ignore')
+            return f"{prefix}...[truncated, original length {len(encoded)} bytes]"
+        if value_type is dict:
+            limited = {k: self._limit_strings(v) for k, v in value.items()}
+            return value if all(limited[k] is v for k, v in value.items()) else limited
+        if value_type is list:
+            limited = [self._limit_strings(v) for v in value]
+            return value if all(a is b for a, b in zip(limited, value)) else limited
+        return value
+
+
+    def _limit_event(self, args: dict, result):
+        sizes = {('args', k): json_size(v) for k, v in args.items()}
+        sizes[('result', None)] = json_size(result)
+        total = sum(sizes.values())
+        if total <= self.max_event_bytes:
+            return args, result
+
+        args = dict(args)
+        for field, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            if total <= self.max_event_bytes:
+                break
+            marker = {'_truncated': True, 'original_bytes': size}
+            if field[0] == 'args':
+                args[field[1]] = marker
+            else:
+                result = marker
+            total += json_size(marker) - size
+        return args, result
+
+
+def content_hash(encoded: bytes) -> dict:
+    return {'_sha256': hashlib.sha256(encoded).hexdigest(), 'original_bytes': len(encoded)}
+
+
+def json_size(value) -> int:
+    return len(json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'))
@@ -5,4 +5,29 @@ python tests/simple_test.py
 python tests/stress_test.py
 python tests/batch_testing.py
 python tests/verify_extra.py
-python tests/injection_testing.py
\ No newline at end of file
+python tests/injection_testing.py
+python tests/flush_worker_test.py
+python tests/async_test.py
+python tests/openai_capture_test.py
+python tests/serializer_test.py
+python tests/payload_limits_test.py
+python tests/dedup_test.py
+python tests/sampling_test.py
+python tests/task_store_test.py
+python tests/exception_test.py
+python tests/local_connector_test.py
+python tests/reader_test.py
+python tests/parquet_test.py
+python tests/mongo_connector_test.py
+python tests/extensible_connector_test.py
+python tests/spool_test.py
+python tests/composite_test.py
+python tests/collector_test.py
+python tests/event_test.py
+python tests/metrics_test.py
+python -m benchmarks --quick --output /dev/null
+python tests/task_summary_test.py
+python tests/streaming_test.py
+python tests/postgres_connector_test.py
+python tests/close_test.py
+python tests/eviction_race_test.py
\ No newline at end of file
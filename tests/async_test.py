@@ -0,0 +1,68 @@
+import asyncio
+import time
+import httpx
+import openai
+from extensitrace import ExtensiTrace, AsyncBaseConnector
+
+
+def completion_response(request):
+    return httpx.Response(200, json={
+        'id': f'chatcmpl-{time.time_ns()}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': 'gpt-3.5-turbo',
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'hi'}}],
+        'usage': {'prompt_tokens': 5, 'completion_tokens': 1, 'total_tokens': 6},
+    })
+
+
+class MemoryConnector(AsyncBaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    async def flush(self, logs):
+        await asyncio.sleep(0)
+        self.logs.extend(logs)
+
+
+client = openai.AsyncOpenAI(api_key='test', http_client=httpx.AsyncClient(transport=httpx.MockTransport(completion_response)))
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(client=client, connector=connector)
+
+@logger.log(track=True)
+async def agent(index):
+    logger.add_metadata({'index': index})
+    await tool(index)
+    return index
+
+@logger.log()
+async def tool(index):
+    await asyncio.sleep(0.05)
+    await client.chat.completions.create(model='gpt-3.5-turbo', messages=[{'role': 'user', 'content': str(index)}])
+
+
+async def main():
+    return await asyncio.gather(*(agent(i) for i in range(200)))
+
+
+if __name__ == '__main__':
+    start = time.time()
+    assert asyncio.run(main()) == list(range(200))
+    assert time.time() - start < 5, "Tasks on one event loop should run concurrently"
+    logger.flush()
+
+    tasks = {}
+    for log in connector.logs:
+        tasks.setdefault(log['task_id'], []).append(log)
+    assert len(tasks) == 200, "Every coroutine should get its own task"
+
+    for logs in tasks.values():
+        by_name = {log['function_name']: log for log in logs}
+        assert set(by_name) == {'agent', 'tool', 'openai.chat.completions.create'}
+        assert by_name['agent']['parent_log_id'] is None
+        assert by_name['tool']['parent_log_id'] == by_name['agent']['log_id']
+        assert by_name['openai.chat.completions.create']['parent_log_id'] == by_name['tool']['log_id']
+        assert by_name['tool']['end_time'] - by_name['tool']['start_time'] >= 0.05, "Coroutines should be timed until completion"
+        assert by_name['openai.chat.completions.create']['args']['messages'][0]['content'] == str(by_name['agent']['metadata']['index'])
+
+    print('Async test passed!')
@@ -35,6 +35,8 @@ if __name__ == '__main__':
     for i in range(25):
         test()
         if i == 9:
+            logger.flush()
             assert check_num_task_ids() == 10
+    logger.flush()
     assert check_num_task_ids() == 20 
     # Upon destruction there will be 5 tasks which will also be flushed
\ No newline at end of file
@@ -0,0 +1,62 @@
+import threading
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+        return True
+
+
+if __name__ == '__main__':
+    first_connector = MemoryConnector()
+    first = ExtensiTrace(connector=first_connector, max_linger_time=10)
+
+    @first.log()
+    def step():
+        return 1
+
+    started, release = threading.Event(), threading.Event()
+
+    @first.log(track=True)
+    def waiting_task():
+        step()
+        started.set()
+        release.wait(5)
+
+    @first.log(track=True)
+    def task():
+        return step()
+
+    task()
+    thread = threading.Thread(target=waiting_task)
+    thread.start()
+    started.wait(5)
+
+    # Closing flushes the completed task and, marked as incomplete, the live one
+    ExtensiTrace.reset()
+    assert [log['function_name'] for log in first_connector.logs] == ['step', 'task', 'step']
+    assert first_connector.logs[-1]['metadata'] == {'_incomplete': True}
+    release.set()
+    thread.join()
+    assert len(first_connector.logs) == 3, "Events logged after close are dropped"
+
+    second_connector = MemoryConnector()
+    second = ExtensiTrace(connector=second_connector, task_summary=True)
+    assert second is not first and ExtensiTrace() is second
+
+    @second.log(track=True)
+    def summarized():
+        return 2
+
+    summarized()
+    assert second.flush(timeout=5)
+    assert [log['function_name'] for log in second_connector.logs] == ['summarized', 'extensitrace.task_summary']
+    second.close()
+    second.close()
+    ExtensiTrace.reset()
+    ExtensiTrace.reset()
+    print('Close test passed!')
@@ -0,0 +1,56 @@
+import json
+import multiprocessing
+import os
+import time
+from extensitrace import ExtensiTrace
+from extensitrace.collector import Collector
+from extensitrace.connectors import CollectorConnector
+from extensitrace.connectors.local_connector import LocalConnector
+
+
+def worker(index):
+    @et.log(track=True)
+    def task(value):
+        nested(value)
+        return value
+
+    @et.log()
+    def nested(value):
+        return value
+
+    for value in range(100):
+        task(value)
+    assert et.flush(timeout=10)
+
+
+if __name__ == '__main__':
+    for path in ('collector_log.jsonl', 'collector.sock'):
+        if os.path.exists(path):
+            os.remove(path)
+    collector = Collector(LocalConnector('collector_log.jsonl'), 'collector.sock', max_linger_time=0.05).start()
+
+    # Created before forking like a preloaded gunicorn app, every worker gets its own flush thread and connection
+    et = ExtensiTrace(connector=CollectorConnector('collector.sock'), max_linger_time=0.05)
+    worker(-2)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=worker, args=(index,)) for index in range(4)]
+    for process in workers:
+        process.start()
+    worker(-1)
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    # Batches may still be in flight on the sockets after the workers flushed
+    deadline = time.monotonic() + 10
+    while collector.stats()['received'] < 6 * 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert collector.flush(timeout=10)
+    with open('collector_log.jsonl') as f:
+        logs = [json.loads(line) for line in f]
+    assert len(logs) == 6 * 200, f"Expected every event of the 5 processes, got {len(logs)}"
+    assert len({log['log_id'] for log in logs}) == len(logs)
+    assert collector.stats()['connections'] == 5
+    collector.close()
+    os.remove('collector_log.jsonl')
+    print('Collector test passed!')
@@ -0,0 +1,50 @@
+import threading
+import time
+from extensitrace import ExtensiTrace
+from extensitrace.connectors import BaseConnector, CompositeConnector, function_route
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self, delay=0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.logs = []
+        self.lock = threading.Lock()
+
+    def flush(self, logs):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError('sink unavailable')
+        with self.lock:
+            self.logs.extend(logs)
+        return True
+
+
+if __name__ == '__main__':
+    fast, slow, failing, completions = MemoryConnector(), MemoryConnector(delay=0.5), MemoryConnector(fail=True), MemoryConnector()
+    composite = CompositeConnector([fast, slow, failing, (completions, function_route('openai.chat.completions.create'))],
+                                   max_queue_size=1000, max_batch_size=50, max_linger_time=0.01)
+    et = ExtensiTrace(connector=composite, max_linger_time=0.01)
+
+    @et.log(track=True)
+    def task(index):
+        return index
+
+    start = time.perf_counter()
+    for index in range(200):
+        task(index)
+    deadline = time.monotonic() + 5
+    while len(fast.logs) < 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    fast_time = time.perf_counter() - start
+    assert len(fast.logs) == 200, "The fast sink should not wait on the slow one"
+    assert len(slow.logs) < 200, "The slow sink should still be catching up"
+    print(f'Fast sink received 200 events after {fast_time * 1000:.0f}ms')
+
+    composite.flush([{**fast.logs[0], 'log_id': 'completion', 'function_name': 'openai.chat.completions.create'}])
+    assert et.flush(timeout=30)
+    assert len(slow.logs) == 201 and len(fast.logs) == 201
+    assert [log['log_id'] for log in completions.logs] == ['completion'], "Routes should filter the events of a sink"
+    stats = et.flush_stats()['connector']
+    assert stats['2:MemoryConnector']['dropped'] == 201 and stats['0:MemoryConnector']['dropped'] == 0, stats
+    print('Composite connector test passed!')
@@ -0,0 +1,61 @@
+import json
+import os
+from threading import Thread
+from extensitrace.connectors.local_connector import LocalConnector
+from extensitrace.dedup import MessageDeduplicator, blob_refs, rehydrate
+
+
+def completion_event(turn, messages):
+    return {'log_id': f'log_{turn}', 'function_name': 'openai.chat.completions.create', 'start_time': 0, 'end_time': 1,
+            'args': {'model': 'gpt-3.5-turbo', 'messages': messages}, 'result': {'id': f'chatcmpl-{turn}'}, 'task_id': 'task_1',
+            'agent_id': 'agent_1', 'parent_log_id': None, 'metadata': None, 'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+if __name__ == '__main__':
+    for path in ('dedup_log.jsonl', 'dedup_log.jsonl.blobs.jsonl'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    connector = LocalConnector('dedup_log.jsonl', dedup=True)
+    history, events = [], []
+    for turn in range(10):
+        history = history + [{'role': 'user', 'content': f'question {turn}'}, {'role': 'assistant', 'content': f'answer {turn}'}]
+        events.append(completion_event(turn, history))
+    connector.flush(events[:5])
+    connector.flush(events[5:] + [{**events[0], 'log_id': 'function', 'function_name': 'tool'}])
+
+    with open('dedup_log.jsonl.blobs.jsonl') as f:
+        assert len(f.readlines()) == 20, "Every message should be stored exactly once"
+    with open('dedup_log.jsonl') as f:
+        stored = [json.loads(line) for line in f]
+    assert all('$blob' in message for message in stored[9]['args']['messages'])
+    assert stored[10]['args']['messages'] == events[0]['args']['messages'], "Only completion events are deduplicated"
+
+    assert rehydrate(stored, connector.load_blobs) == events + [{**events[0], 'log_id': 'function', 'function_name': 'tool'}]
+
+    deduplicator = MessageDeduplicator()
+    _, first = deduplicator.deduplicate(events[:1])
+    _, second = deduplicator.deduplicate(events[:1])
+    assert first and second == first, "Blobs not confirmed as written should be handed out again rather than referenced"
+    deduplicator.confirm(first)
+    assert deduplicator.deduplicate(events[:1])[1] == {}
+
+    # Flush workers of several sinks share the deduplicator, a small max_known_blobs keeps them evicting each other's hashes
+    for path in ('dedup_log.jsonl', 'dedup_log.jsonl.blobs.jsonl'):
+        os.remove(path)
+    connector = LocalConnector('dedup_log.jsonl', dedup=True)
+    connector.deduplicator.max_known_blobs = 5
+    results = []
+    def flush_batches(worker):
+        for batch in range(20):
+            results.append(connector.flush([{**event, 'log_id': f'{worker}_{batch}_{event["log_id"]}'} for event in events[batch % 10:]]))
+    threads = [Thread(target=flush_batches, args=(worker,)) for worker in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [True] * 160
+    with open('dedup_log.jsonl') as f:
+        stored = [json.loads(line) for line in f]
+    assert blob_refs(stored) <= set(connector.load_blobs(sorted(blob_refs(stored)))), "Every reference should have its blob written"
+    print('Dedup test passed!')
@@ -0,0 +1,87 @@
+import json
+import os
+import time
+import tracemalloc
+from extensitrace import ExtensiTrace
+from extensitrace.collector import Collector
+from extensitrace.connectors import BaseConnector, CollectorConnector
+from extensitrace.event import Event, decode_array, encode_json_array, encode_msgpack_array
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+        return True
+
+
+def event_dict(index):
+    return {'log_id': f'log_{index}', 'function_name': 'step', 'start_time': 1700000000.0 + index, 'end_time': 1700000001.0 + index,
+            'args': {'index': index}, 'result': {'value': index}, 'task_id': f'task_{index // 10}', 'agent_id': 'agent_1',
+            'parent_log_id': None, 'metadata': None, 'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+def allocated(build):
+    tracemalloc.start()
+    values = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, values
+
+
+if __name__ == '__main__':
+    event = Event(**event_dict(1))
+    assert event == event_dict(1) and dict(event) == event_dict(1) and {**event} == event_dict(1)
+    assert event['task_id'] == 'task_0' and event.get('missing') is None and 'log_id' in event
+    assert json.loads(event.to_json()) == event_dict(1)
+    assert Event(**event_dict(2)).function_name is Event(**event_dict(3)).function_name
+
+    batch = [Event(**event_dict(index)) for index in range(20)] + [event_dict(20)]
+    assert decode_array(encode_json_array(batch)) == [event_dict(index) for index in range(21)]
+    if msgpack is not None:
+        assert decode_array(encode_msgpack_array(batch)) == [event_dict(index) for index in range(21)]
+    else:
+        print('msgpack is not installed, skipping the msgpack encoding checks')
+
+    # Only the values a task buffers differ between the two representations
+    values = [({'index': index}, {'value': index}, f'log_{index}', f'task_{index // 10}') for index in range(10000)]
+    dict_bytes, _ = allocated(lambda: [{**event_dict(0), 'args': a, 'result': r, 'log_id': l, 'task_id': t} for a, r, l, t in values])
+    event_bytes, _ = allocated(lambda: [Event(**{**event_dict(0), 'args': a, 'result': r, 'log_id': l, 'task_id': t}) for a, r, l, t in values])
+    print(f'Per event container: dict {dict_bytes / 10000:.0f} bytes, Event {event_bytes / 10000:.0f} bytes')
+    assert event_bytes < dict_bytes / 2
+
+    # Compact events end to end, over the msgpack wire format of the collector when it is installed
+    if os.path.exists('event.sock'):
+        os.remove('event.sock')
+    memory = MemoryConnector()
+    collector = Collector(memory, 'event.sock', max_linger_time=0.01).start()
+    et = ExtensiTrace(connector=CollectorConnector('event.sock', wire_format='msgpack' if msgpack else 'json'), compact_events=True, max_linger_time=0.01)
+
+    @et.log(track=True)
+    def task(value):
+        return nested(value)
+
+    @et.log()
+    def nested(value):
+        return value * 2
+
+    for value in range(50):
+        task(value)
+    assert et.flush(timeout=10)
+    deadline = time.monotonic() + 10
+    while collector.stats()['received'] < 100 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert collector.flush(timeout=10)
+    assert len(memory.logs) == 100
+    top = [log for log in memory.logs if log['function_name'] == 'task']
+    assert sorted(log['result'] for log in top) == [value * 2 for value in range(50)]
+    assert all(log['parent_log_id'] in {parent['log_id'] for parent in top} for log in memory.logs if log['function_name'] == 'nested')
+    collector.close()
+    print('Event test passed!')
@@ -0,0 +1,51 @@
+import sys
+from threading import Thread
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+connector = MemoryConnector()
+# Every new task sweeps the live tasks, so tasks are evicted while their threads are still logging
+logger: ExtensiTrace = ExtensiTrace(connector=connector, max_live_tasks=1)
+
+THREADS = 8
+TASKS = 20
+CHILDREN = 50
+
+@logger.log(track=True)
+def task(index):
+    for i in range(CHILDREN):
+        child(index, i)
+
+@logger.log()
+def child(index, i):
+    return i
+
+def run(index):
+    for _ in range(TASKS):
+        task(index)
+
+
+if __name__ == '__main__':
+    sys.setswitchinterval(1e-6)
+    threads = [Thread(target=run, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logger.flush()
+
+    assert logger.task_store_stats()['evicted_tasks'] > 0
+    log_ids = [log['log_id'] for log in connector.logs]
+    assert len(log_ids) == len(set(log_ids)), "Events should be flushed once, by the eviction or by the completion"
+    children = [log for log in connector.logs if log['function_name'] == 'child']
+    assert len(children) == THREADS * TASKS * CHILDREN, "Events logged while their task was evicted should not be lost"
+    assert len(connector.logs) == THREADS * TASKS * (CHILDREN + 1)
+    print('Eviction race test passed!')
@@ -0,0 +1,62 @@
+import asyncio
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(connector=connector)
+
+@logger.log(track=True)
+def agent():
+    try:
+        tool()
+    except KeyError:
+        pass
+    step()
+
+@logger.log()
+def tool():
+    raise KeyError('missing')
+
+@logger.log()
+def step():
+    raise ValueError('step failed')
+
+@logger.log(track=True)
+async def async_agent():
+    await asyncio.sleep(0)
+    raise RuntimeError('async failed')
+
+
+if __name__ == '__main__':
+    try:
+        agent()
+    except ValueError:
+        pass
+    try:
+        agent()
+    except ValueError:
+        pass
+    try:
+        asyncio.run(async_agent())
+    except RuntimeError:
+        pass
+    logger.flush()
+
+    assert logger.task_store_stats()['live_tasks'] == 0, "Failed tasks should be flushed and released"
+    assert len({log['task_id'] for log in connector.logs}) == 3
+    logs = {log['function_name']: log for log in connector.logs}
+    assert logs['tool']['result']['error']['type'] == 'KeyError'
+    assert logs['step']['result']['error']['message'] == 'step failed'
+    assert 'ValueError: step failed' in logs['step']['result']['error']['traceback']
+    assert logs['step']['parent_log_id'] == logs['agent']['log_id'], "The call stack should unwind to the caller"
+    assert logs['agent']['result']['error']['type'] == 'ValueError'
+    assert logs['async_agent']['result']['error']['type'] == 'RuntimeError'
+    print('Exception test passed!')
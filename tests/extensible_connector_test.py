@@ -0,0 +1,77 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from extensitrace.connectors.extensible_connector import ExtensibleConnector
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    responses_to_send = []
+    received = []
+    connections = set()
+    encodings = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        Handler.connections.add(self.client_address)
+        Handler.encodings.append(self.headers.get('Content-Encoding'))
+        status, headers = Handler.responses_to_send.pop(0) if Handler.responses_to_send else (201, {})
+        if status == 201:
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            Handler.received.append(json.loads(body))
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def event(index):
+    return {'log_id': f'log_{index}', 'function_name': 'step', 'start_time': index, 'end_time': index + 1,
+            'args': {'payload': 'x' * 1000}, 'result': None, 'task_id': 'task_1', 'agent_id': 'agent_1',
+            'parent_log_id': None, 'metadata': None, 'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connector = ExtensibleConnector(f'http://127.0.0.1:{server.server_port}/api/push_tasks', max_request_bytes=50000,
+                                    retry_backoff=0.01, timeout=5)
+
+    events = [event(index) for index in range(200)]
+    assert connector.flush(events)
+    assert len(Handler.received) > 1 and all(len(json.dumps(batch, separators=(',', ':'))) <= 50000 for batch in Handler.received), "Batches should be split by size"
+    assert [log['log_id'] for batch in Handler.received for log in batch] == [log['log_id'] for log in events]
+    assert len(Handler.connections) == 1, "Requests should reuse one keep-alive connection"
+    assert set(Handler.encodings) == {None}, "Bodies should only be compressed when asked for"
+
+    Handler.received.clear()
+    Handler.encodings.clear()
+    compressed = ExtensibleConnector(f'http://127.0.0.1:{server.server_port}/api/push_tasks', compress=True)
+    assert compressed.flush(events[:5])
+    assert Handler.encodings == ['gzip'] and Handler.received[0] == events[:5]
+    compressed.close()
+
+    # 429 with Retry-After and 5xx responses are retried
+    Handler.received.clear()
+    Handler.responses_to_send = [(429, {'Retry-After': '0'}), (503, {})]
+    assert connector.flush(events[:5])
+    assert len(Handler.received) == 1 and len(Handler.received[0]) == 5
+
+    # Client errors are not retried, exhausted retries report the batch as failed
+    Handler.responses_to_send = [(400, {})]
+    assert connector.flush(events[:5]) is False
+    Handler.responses_to_send = [(500, {})] * 4
+    assert connector.flush(events[:5]) is False
+    assert not Handler.responses_to_send
+
+    server.shutdown()
+    server.server_close()
+    unreachable = ExtensibleConnector(f'http://127.0.0.1:{server.server_port}/api/push_tasks', retry_backoff=0.01, max_retries=1)
+    assert unreachable.flush(events[:5]) is False, "Connection errors should be reported after the retries"
+    print('Extensible connector test passed!')
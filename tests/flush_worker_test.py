@@ -0,0 +1,32 @@
+import time
+from extensitrace.connectors.base_connector import BaseConnector
+from extensitrace.flush_worker import FlushWorker
+
+
+class SlowConnector(BaseConnector):
+    def __init__(self):
+        self.batches = []
+
+    def flush(self, logs):
+        time.sleep(0.05)
+        self.batches.append(list(logs))
+
+
+if __name__ == '__main__':
+    connector = SlowConnector()
+    worker = FlushWorker(connector, max_queue_size=50, max_batch_size=20, max_linger_time=10)
+
+    start = time.time()
+    accepted = worker.submit([{'log_id': i} for i in range(60)])
+    assert time.time() - start < 0.05, "submit should not wait on the connector"
+    assert accepted == 50, "Entries over max_queue_size should be dropped"
+
+    assert worker.flush(timeout=5)
+    assert all(len(batch) <= 20 for batch in connector.batches), "Batches should respect max_batch_size"
+    assert sum(len(batch) for batch in connector.batches) == 50
+
+    worker.submit([{'log_id': 'last'}])
+    worker.close()
+    assert connector.batches[-1] == [{'log_id': 'last'}], "close should drain the queue"
+    assert worker.stats() == {'queued': 51, 'flushed': 51, 'dropped': 10, 'overflowed': 0, 'pending': 0}
+    print('Flush worker test passed!')
@@ -18,6 +18,7 @@ if __name__ == '__main__':
         os.remove('extensitrace.jsonl')
 
     entry()
+    logger.flush()
 
     with open('extensitrace.jsonl', 'r') as file:
         log_data = [json.loads(line) for line in file]
@@ -0,0 +1,43 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+from multiprocessing import Process
+from extensitrace.connectors.local_connector import LocalConnector
+
+LOG_DIR = 'local_connector_logs'
+
+
+def write_logs(worker, compression, max_bytes):
+    connector = LocalConnector(os.path.join(LOG_DIR, f'events.jsonl{".gz" if compression else ""}'), compression=compression, max_bytes=max_bytes, fsync=True)
+    for batch in range(50):
+        assert connector.flush([{'log_id': f'{worker}-{batch}-{i}', 'args': {'text': 'x' * 200}, 'result': {1: 'non string key'}} for i in range(10)])
+    connector.close()
+
+
+def read_log_ids(pattern, opener):
+    log_ids = []
+    for path in glob.glob(os.path.join(LOG_DIR, pattern)):
+        with opener(path, 'rt') as f:
+            log_ids.extend(json.loads(line)['log_id'] for line in f)
+    return log_ids
+
+
+if __name__ == '__main__':
+    for compression, pattern, opener in ((None, 'events*.jsonl', open), ('gzip', 'events*.jsonl.gz', gzip.open)):
+        shutil.rmtree(LOG_DIR, ignore_errors=True)
+        processes = [Process(target=write_logs, args=(worker, compression, 20000)) for worker in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+            assert p.exitcode == 0
+
+        assert len(glob.glob(os.path.join(LOG_DIR, pattern))) > 1, "The log file should have been rotated"
+        log_ids = read_log_ids(pattern, opener)
+        assert len(log_ids) == 4 * 50 * 10, "Every line written by every process should be intact"
+        assert len(set(log_ids)) == len(log_ids)
+
+    shutil.rmtree(LOG_DIR, ignore_errors=True)
+    print('Local connector test passed!')
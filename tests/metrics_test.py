@@ -0,0 +1,80 @@
+import os
+import time
+from extensitrace import ExtensiTrace
+from extensitrace.connectors import BaseConnector, CompositeConnector
+from extensitrace.metrics import MetricsRegistry, PrometheusFileExporter
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.logs = []
+
+    def flush(self, logs):
+        if self.fail:
+            raise ConnectionError('sink unavailable')
+        self.logs.extend(logs)
+        return True
+
+
+def sample(snapshot, name, **labels):
+    for entry in snapshot[name]['samples']:
+        if entry['labels'] == labels:
+            return entry['value']
+    raise KeyError((name, labels))
+
+
+if __name__ == '__main__':
+    registry = MetricsRegistry()
+    assert registry.counter('requests_total', 'Requests', route='a') is registry.counter('requests_total', route='a')
+    registry.counter('requests_total', route='a').inc(2)
+    histogram = registry.histogram('latency_seconds', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    registry.gauge('depth', lambda: 7, 'Depth', queue='q"1')
+    text = registry.prometheus_text()
+    assert '# HELP requests_total Requests' in text and 'requests_total{route="a"} 2' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text and 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text and 'latency_seconds_count 3' in text
+    assert 'depth{queue="q\\"1"} 7' in text
+
+    metrics = MetricsRegistry()
+    memory, failing = MemoryConnector(), MemoryConnector(fail=True)
+    composite = CompositeConnector([memory, failing], max_linger_time=0.01, metrics=metrics)
+    et = ExtensiTrace(connector=composite, max_linger_time=0.01, metrics=metrics)
+
+    @et.log(track=True)
+    def task(value):
+        return nested(value)
+
+    @et.log()
+    def nested(value):
+        return value * 2
+
+    for value in range(100):
+        task(value)
+    assert et.flush(timeout=10)
+
+    snapshot = et.metrics.snapshot()
+    assert sample(snapshot, 'extensitrace_events_logged_total') == 200
+    assert sample(snapshot, 'extensitrace_events_handed_off_total') == 200
+    assert sample(snapshot, 'extensitrace_call_overhead_seconds')['count'] == 200
+    assert sample(snapshot, 'extensitrace_lock_wait_seconds')['count'] == 100
+    assert sample(snapshot, 'extensitrace_live_tasks') == 0
+    assert sample(snapshot, 'extensitrace_connector_flushed_events_total', connector='CompositeConnector') == 200
+    assert sample(snapshot, 'extensitrace_connector_flushed_events_total', connector='0:MemoryConnector') == 200
+    assert sample(snapshot, 'extensitrace_connector_flush_failures_total', connector='1:MemoryConnector') > 0
+    assert sample(snapshot, 'extensitrace_flush_queue_depth', connector='0:MemoryConnector') == 0
+    overhead = sample(snapshot, 'extensitrace_call_overhead_seconds')
+    print(f"Mean call overhead: {overhead['sum'] / overhead['count'] * 1e6:.1f}us")
+
+    exporter = PrometheusFileExporter('metrics_test.prom')
+    stop = et.metrics.start_exporter(exporter, interval=0.01)
+    deadline = time.monotonic() + 5
+    while not os.path.exists('metrics_test.prom') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    with open('metrics_test.prom') as f:
+        assert 'extensitrace_events_logged_total 200' in f.read()
+    os.remove('metrics_test.prom')
+    print('Metrics test passed!')
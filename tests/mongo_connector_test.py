@@ -0,0 +1,61 @@
+import sys
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+try:
+    import mongomock
+except ImportError:
+    print('mongomock is not installed, skipping the MongoDB connector test')
+    sys.exit(0)
+
+from extensitrace.connectors.mongo_connector import MongoConnector
+
+
+def event(index, size=10):
+    return {'log_id': f'log_{index}', 'function_name': 'step', 'start_time': index, 'end_time': index + 1,
+            'args': {'payload': 'x' * size}, 'result': None, 'task_id': f'task_{index // 10}', 'agent_id': 'agent_1',
+            'parent_log_id': None, 'metadata': None, 'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+if __name__ == '__main__':
+    connector = MongoConnector('', 'test', 'logs', client=mongomock.MongoClient(), write_concern={'w': 1},
+                               max_chunk_documents=40, max_chunk_bytes=20000, retry_backoff=0)
+    collection = connector.collection
+    assert len(collection.index_information()) > 1, "Indexes for task and agent lookups should be created"
+
+    inserts = []
+    insert_many = collection.insert_many
+    def counting_insert_many(documents, **kwargs):
+        inserts.append(len(documents))
+        assert kwargs.get('ordered') is False
+        return insert_many(documents, **kwargs)
+    collection.insert_many = counting_insert_many
+
+    events = [event(index) for index in range(100)] + [event(100 + index, size=5000) for index in range(10)]
+    assert connector.flush(events)
+    assert inserts[:2] == [40, 40] and len(inserts) > 3 and sum(inserts) == 110, f"Batches should be chunked by count and bytes, got {inserts}"
+    assert collection.count_documents({}) == 110
+    assert collection.find_one({'_id': 'log_5'})['task_id'] == 'task_0'
+    assert '_id' not in events[0], "Events handed to the connector must not be modified"
+
+    # Re-delivering a partially stored batch is idempotent
+    assert connector.flush([event(index) for index in range(90, 120)])
+    assert collection.count_documents({}) == 120
+
+    # Transient network errors are retried
+    failures = [AutoReconnect('connection reset')]
+    def flaky_insert_many(documents, **kwargs):
+        if failures:
+            # The connection drops after part of the chunk was stored
+            try:
+                insert_many(documents[:len(documents) // 2], **kwargs)
+            except BulkWriteError:
+                pass
+            raise failures.pop()
+        return insert_many(documents, **kwargs)
+    collection.insert_many = flaky_insert_many
+    assert connector.flush([event(index) for index in range(200, 220)])
+    assert collection.count_documents({}) == 140
+
+    failures = [AutoReconnect('down')] * 10
+    assert connector.flush([event(300), event(301)]) is False, "A batch should be reported as failed once retries are exhausted"
+    print('MongoDB connector test passed!')
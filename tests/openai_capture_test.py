@@ -0,0 +1,98 @@
+import time
+from threading import Thread
+import httpx
+import openai
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+def completion_response(request):
+    if request.url.path.endswith('/embeddings'):
+        return httpx.Response(200, json={
+            'object': 'list',
+            'model': 'text-embedding-3-small',
+            'data': [{'object': 'embedding', 'index': 0, 'embedding': [0.1] * 1536}],
+            'usage': {'prompt_tokens': 3, 'total_tokens': 3},
+        })
+    return httpx.Response(200, json={
+        'id': f'chatcmpl-{time.time_ns()}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': 'gpt-3.5-turbo',
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'hi'}}],
+        'usage': {'prompt_tokens': 5, 'completion_tokens': 1, 'total_tokens': 6},
+    })
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+client = openai.OpenAI(api_key='test', http_client=httpx.Client(transport=httpx.MockTransport(completion_response)))
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(client=client, connector=connector)
+
+def chat():
+    return client.chat.completions.create(model='gpt-3.5-turbo', messages=[{'role': 'user', 'content': 'hello'}])
+
+@logger.log(track=True)
+def agent():
+    chat()
+    tool()
+    chat()
+    client.embeddings.create(model='text-embedding-3-small', input='hello')
+
+@logger.log()
+def tool():
+    chat()
+
+def run(count):
+    for _ in range(count):
+        agent()
+
+
+if __name__ == '__main__':
+    threads = [Thread(target=run, args=(20,)) for _ in range(32)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    create = client.chat.completions.create
+    chat()
+    logger.flush()
+
+    assert client.chat.completions.create is create, "The client should only be instrumented once"
+    tasks = {}
+    for log in connector.logs:
+        tasks.setdefault(log['task_id'], []).append(log)
+    assert len(tasks) == 32 * 20
+
+    for logs in tasks.values():
+        names = {log['log_id']: log['function_name'] for log in logs}
+        completions = [log for log in logs if log['function_name'] == 'openai.chat.completions.create']
+        assert sorted(names[log['parent_log_id']] for log in completions) == ['agent', 'agent', 'tool'], "Every completion should be logged to its own task"
+        embedding = next(log for log in logs if log['function_name'] == 'openai.embeddings.create')
+        assert names[embedding['parent_log_id']] == 'agent' and embedding['result']['data'] == [{'index': 0, 'dimensions': 1536}]
+
+    # A create wrapping another traced create (retries in a wrapped client) is logged once
+    class RetryingCompletions:
+        def create(self, **kwargs):
+            create(**kwargs)
+            return create(**kwargs)
+
+    retrying = RetryingCompletions()
+    logger._ExtensiTrace__instrument_resource(retrying, 'openai.retrying.create')
+
+    @logger.log(track=True)
+    def retry_agent():
+        retrying.create(model='gpt-3.5-turbo', messages=[{'role': 'user', 'content': 'hello'}])
+
+    connector.logs.clear()
+    retry_agent()
+    logger.flush()
+    assert sorted(log['function_name'] for log in connector.logs) == ['openai.retrying.create', 'retry_agent']
+
+    print('OpenAI capture test passed!')
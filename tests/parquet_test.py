@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import sys
+import time
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    print('pyarrow is not installed, skipping the Parquet test')
+    sys.exit(0)
+
+from extensitrace.connectors.local_connector import LocalConnector
+from extensitrace.connectors.parquet_connector import ParquetConnector, jsonl_to_parquet
+
+
+def event(index):
+    completion = index % 2 == 0
+    return {'log_id': f'log_{index}', 'function_name': 'openai.chat.completions.create' if completion else 'step',
+            'start_time': index, 'end_time': index + 0.5, 'args': {'index': index},
+            'result': {'model': 'gpt-4', 'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}} if completion else 'done',
+            'task_id': f'task_{index // 10}', 'agent_id': 'agent_1', 'parent_log_id': None, 'metadata': None,
+            'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+if __name__ == '__main__':
+    shutil.rmtree('parquet_logs', ignore_errors=True)
+    for path in ('parquet_log.jsonl', 'parquet_log.parquet'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    events = [event(index) for index in range(2500)]
+    connector = ParquetConnector('parquet_logs', row_group_size=1000, max_rows_per_file=2000)
+    for start in range(0, len(events), 100):
+        assert connector.flush(events[start:start + 100])
+    assert [name.endswith('.parquet') for name in os.listdir('parquet_logs')] == [True], "The remaining events stay buffered"
+    connector.close()
+
+    files = sorted(os.listdir('parquet_logs'))
+    assert len(files) == 2 and all(name.endswith('.parquet') for name in files)
+    assert pq.ParquetFile(os.path.join('parquet_logs', files[0])).num_row_groups == 2
+    table = ds.dataset('parquet_logs').to_table()
+    assert table.num_rows == 2500
+    assert pc.sum(table['total_tokens']).as_py() == 1250 * 15
+    assert pc.mean(table['duration']).as_py() == 0.5
+    assert json.loads(table.filter(pc.field('log_id') == 'log_3')['args'][0].as_py()) == {'index': 3}
+
+    # A partial row group is written, and its file finished, once its events waited max_linger_time
+    shutil.rmtree('parquet_logs')
+    connector = ParquetConnector('parquet_logs', row_group_size=1000, max_linger_time=0.2)
+    assert connector.flush(events[:10]) and connector.flush(events[10:20])
+    assert os.listdir('parquet_logs') == []
+    deadline = time.monotonic() + 5
+    while not any(name.endswith('.parquet') for name in os.listdir('parquet_logs')) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert ds.dataset('parquet_logs').to_table().num_rows == 20
+    # Files still being written are skipped by readers
+    assert connector.flush(events[20:1030])
+    assert ds.dataset('parquet_logs').to_table().num_rows == 20
+    connector.close()
+    assert ds.dataset('parquet_logs').to_table().num_rows == 1030
+    assert len(os.listdir('parquet_logs')) == 2 and all(name.endswith('.parquet') for name in os.listdir('parquet_logs'))
+
+    LocalConnector('parquet_log.jsonl').flush(events)
+    start = time.perf_counter()
+    assert jsonl_to_parquet('parquet_log.jsonl', 'parquet_log.parquet', row_group_size=1000) == 2500
+    print(f'Converted 2500 events in {(time.perf_counter() - start) * 1000:.1f}ms')
+    assert pq.read_table('parquet_log.parquet').num_rows == 2500
+
+    shutil.rmtree('parquet_logs')
+    print('Parquet test passed!')
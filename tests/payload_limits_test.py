@@ -0,0 +1,42 @@
+import hashlib
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(connector=connector, max_field_bytes=100, max_event_bytes=1000)
+
+@logger.log(track=True)
+def agent(prompt, history):
+    return tool(prompt)
+
+@logger.log(hash_content=True)
+def tool(prompt):
+    return {'echo': prompt}
+
+
+if __name__ == '__main__':
+    prompt = 'é' * 200
+    history = [{'role': 'user', 'content': f'{i}' * 90} for i in range(20)]
+    agent(prompt, history)
+    logger.flush()
+
+    logs = {log['function_name']: log for log in connector.logs}
+    agent_log, tool_log = logs['agent'], logs['tool']
+
+    truncated = agent_log['args']['prompt']
+    assert truncated.startswith('é' * 50) and truncated.endswith('...[truncated, original length 400 bytes]')
+    assert agent_log['args']['history']['_truncated'] and agent_log['args']['history']['original_bytes'] > 1000, "Largest field should be dropped to fit the event budget"
+    assert agent_log['result'] == {'echo': truncated}
+
+    digest = {'_sha256': hashlib.sha256(prompt.encode()).hexdigest(), 'original_bytes': 400}
+    assert tool_log['args']['prompt'] == digest, "Per function override should hash instead of truncating"
+    assert tool_log['result'] == {'echo': digest}
+    print('Payload limits test passed!')
@@ -0,0 +1,152 @@
+import json
+import psycopg2
+from extensitrace.connectors import postgres_connector
+from extensitrace.connectors.postgres_connector import PostgresConnector, copy_buffer
+from extensitrace.event import Event
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, args=None):
+        self.connection.check()
+        self.connection.statements.append(query)
+        self.connection.arguments.append(args)
+
+    def copy_expert(self, query, buffer):
+        self.connection.check()
+        self.connection.copied.append(buffer.read())
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.statements = []
+        self.arguments = []
+        self.copied = []
+        self.committed = False
+
+    def check(self):
+        if self.pool.failures:
+            error = self.pool.failures.pop(0)
+            raise error('server closed the connection unexpectedly')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.committed = exc_type is None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakePool:
+    """
+    Stands in for ThreadedConnectionPool, failures are raised by the next statements executed.
+    """
+    def __init__(self, minconn, maxconn, dsn):
+        self.failures = []
+        self.connections = []
+        self.returned = []
+        self.outstanding = 0
+        self.closed = False
+
+    def getconn(self):
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        self.outstanding += 1
+        return connection
+
+    def putconn(self, connection, close=False):
+        self.outstanding -= 1
+        self.returned.append((connection, close))
+
+    def closeall(self):
+        self.closed = True
+
+
+def read_copy(text):
+    """
+    Decodes the COPY text format back into rows, the inverse of copy_buffer.
+    """
+    escapes = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r'}
+    rows = []
+    for line in text.split('\n')[:-1]:
+        row = []
+        for field in line.split('\t'):
+            if field == '\\N':
+                row.append(None)
+                continue
+            value, index = [], 0
+            while index < len(field):
+                if field[index] == '\\':
+                    value.append(escapes[field[index + 1]])
+                    index += 2
+                else:
+                    value.append(field[index])
+                    index += 1
+            row.append(''.join(value))
+        rows.append(row)
+    return rows
+
+
+def event(index, **overrides):
+    return {'log_id': f'log_{index}', 'function_name': 'step', 'start_time': 1700000000.123456789, 'end_time': 0.1 + 0.2,
+            'args': {'prompt': 'tab\there\nnew line \\ backslash \r'}, 'result': None, 'task_id': 'task\t1', 'agent_id': 'agent\\1',
+            'parent_log_id': None, 'metadata': {'_incomplete': True}, 'inferred_accuracy': None, 'accuracy_reasoning': 'line\nbreak', **overrides}
+
+
+if __name__ == '__main__':
+    # Each event is copied as one JSONB field, whatever its strings contain
+    logs = [event(0), Event(**event(1)), event(2, start_time=0.1 + 0.2, args=None)]
+    text = copy_buffer(logs).read()
+    assert text.count('\n') == 3 and '\t' not in text, "Line breaks and tabs inside values must stay escaped"
+    decoded = read_copy(text)
+    assert all(len(row) == 1 for row in decoded)
+    assert [json.loads(row[0]) for row in decoded] == [event(0), event(1), event(2, start_time=0.1 + 0.2, args=None)]
+    assert decoded[1][0] == logs[1].to_json().decode('utf-8'), "The cached encoding of an Event should be reused"
+    assert json.loads(decoded[0][0])['start_time'] == 1700000000.123456789, "Floats should keep their full precision"
+
+    postgres_connector.ThreadedConnectionPool = FakePool
+    connector = PostgresConnector('postgresql://fake', 'traces.logs', copy_threshold=10, max_retries=2, retry_backoff=0)
+    pool = connector.pool
+    assert any('CREATE SCHEMA' in repr(statement) for statement in pool.connections[0].statements)
+
+    # Small batches go through INSERT, a lost connection is discarded and the batch retried on a new one
+    pool.returned.clear()
+    pool.failures = [psycopg2.OperationalError]
+    assert connector.flush([event(index) for index in range(5)])
+    assert [close for _, close in pool.returned] == [True, False]
+    connection = pool.returned[-1][0]
+    assert connection.committed and 'jsonb_populate_recordset' in repr(connection.statements[-1])
+    assert json.loads(connection.arguments[-1][0]) == [event(index) for index in range(5)]
+
+    # Large batches are copied into the staging table and inserted from there
+    pool.returned.clear()
+    assert connector.flush([event(index) for index in range(20)])
+    connection = pool.returned[-1][0]
+    assert [json.loads(row[0]) for row in read_copy(connection.copied[0])] == [event(index) for index in range(20)]
+    assert 'jsonb_populate_record' in repr(connection.statements[-1]) and 'ON CONFLICT' in repr(connection.statements[-1])
+
+    # Exhausted retries and other errors fail the batch, every connection goes back to the pool
+    pool.returned.clear()
+    pool.failures = [psycopg2.InterfaceError] * 3
+    assert connector.flush([event(1)]) is False
+    assert [close for _, close in pool.returned] == [True, True, True]
+    pool.returned.clear()
+    pool.failures = [psycopg2.DataError]
+    assert connector.flush([event(1)]) is False
+    assert [close for _, close in pool.returned] == [False] and not pool.returned[0][0].committed
+    assert pool.outstanding == 0, "A connection was never returned to the pool"
+
+    connector.close()
+    assert pool.closed
+    print('Postgres connector test passed!')
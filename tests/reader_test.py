@@ -0,0 +1,87 @@
+import gzip
+import os
+import time
+from extensitrace.connectors.local_connector import LocalConnector
+from extensitrace.reader import TraceReader
+
+
+def event(task, index, start_time, agent_id='agent_1'):
+    return {'log_id': f'log_{task}_{index}', 'function_name': 'step' if index else 'top', 'start_time': start_time, 'end_time': start_time + 1,
+            'args': {'index': index}, 'result': None, 'task_id': f'task_{task}', 'agent_id': agent_id, 'parent_log_id': None,
+            'metadata': None, 'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+if __name__ == '__main__':
+    for path in ('reader_log.jsonl', 'reader_log.jsonl.idx', 'reader_log.jsonl.gz', 'reader_ascii.jsonl', 'reader_dedup.jsonl', 'reader_dedup.jsonl.blobs.jsonl'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    connector = LocalConnector('reader_log.jsonl')
+    for task in range(200):
+        connector.flush([event(task, index, task * 60, agent_id=f'agent_{task % 2}') for index in range(5)])
+
+    reader = TraceReader('reader_log.jsonl')
+    scanned = reader.get_task('task_7')
+    assert [record.log_id for record in scanned] == [f'log_7_{index}' for index in range(5)]
+    assert len(list(reader.iter_tasks(agent_id='agent_1', function_name='top'))) == 100
+    assert len(list(reader.iter_tasks(since=60 * 10, until=60 * 19))) == 50
+
+    reader.build_index()
+    assert reader.get_task('task_7') == scanned, "Indexed reads should match a scan"
+    assert reader.get_task('missing') == []
+    assert len(list(reader.iter_tasks(since=60 * 10, until=60 * 19))) == 50
+    assert len(list(reader.iter_tasks(task_id='task_150', since=0, until=60 * 100))) == 0
+
+    # Appended records are found by scanning past the indexed part until the index is extended
+    connector.flush([event(7, 5, 7 * 60)])
+    assert reader._TraceReader__indexed_offsets('task_7', None, None) is not None, "The index should still be used after an append"
+    assert len(reader.get_task('task_7')) == 6
+    assert len(list(reader.iter_tasks(since=7 * 60, until=7 * 60))) == 6
+    index = reader.build_index()
+    assert index['size'] == os.path.getsize('reader_log.jsonl')
+    assert len(reader.get_task('task_7')) == 6
+
+    start = time.perf_counter()
+    for _ in range(100):
+        reader.get_task('task_199')
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(100):
+        list(TraceReader('reader_log.jsonl', index_path='missing.idx').iter_tasks(task_id='task_199'))
+    scan = time.perf_counter() - start
+    print(f'get_task over 1001 records: indexed {indexed * 10:.2f}ms, scan {scan * 10:.2f}ms')
+
+    with open('reader_log.jsonl', 'rb') as src, gzip.open('reader_log.jsonl.gz', 'wb') as dst:
+        dst.write(src.read())
+    assert len(TraceReader('reader_log.jsonl.gz').get_task('task_7')) == 6, "Compressed logs are streamed"
+
+    # The stdlib encoder escapes non-ASCII characters, the filters still have to find them
+    for encoder in ('json', 'auto'):
+        ascii_connector = LocalConnector('reader_ascii.jsonl', json_encoder=encoder)
+        ascii_connector.flush([{**event(1, 0, 0, agent_id='agent-é'), 'function_name': 'größe'}])
+        ascii_connector.close()
+        ascii_reader = TraceReader('reader_ascii.jsonl')
+        assert len(list(ascii_reader.iter_tasks(function_name='größe'))) == 1, encoder
+        assert len(list(ascii_reader.iter_tasks(agent_id='agent-é', task_id='task_1'))) == 1, encoder
+        os.remove('reader_ascii.jsonl')
+
+    # Deduplicated messages are loaded once per reader, records without references never call the loader
+    dedup_connector = LocalConnector('reader_dedup.jsonl', dedup=True)
+    history = []
+    for turn in range(100):
+        history = history + [{'role': 'user', 'content': f'turn {turn}'}]
+        dedup_connector.flush([{**event(turn, 1, turn), 'function_name': 'openai.chat.completions.create', 'args': {'messages': history}},
+                               event(turn, 2, turn)])
+    dedup_connector.close()
+    requested = []
+
+    def load_blobs(hashes):
+        requested.append(hashes)
+        return dedup_connector.load_blobs(hashes)
+
+    records = list(TraceReader('reader_dedup.jsonl', blobs=load_blobs).iter_tasks())
+    assert len(records) == 200 and records[-2].args['messages'] == history
+    assert len(requested) == 100 and all(len(hashes) == 1 for hashes in requested), "Each blob should be loaded once"
+    os.remove('reader_dedup.jsonl')
+    os.remove('reader_dedup.jsonl.blobs.jsonl')
+    print('Reader test passed!')
@@ -0,0 +1,86 @@
+import time
+import httpx
+import openai
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+def completion_response(request):
+    return httpx.Response(200, json={
+        'id': f'chatcmpl-{time.time_ns()}', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'gpt-4o-mini',
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'hi'}}],
+    })
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+client = openai.OpenAI(api_key='test', http_client=httpx.Client(transport=httpx.MockTransport(completion_response)))
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(client=client, connector=connector, sample_rate=0.0)
+
+@logger.log(track=True)
+def unsampled():
+    logger.add_metadata({'key': 'value'})
+    return child()
+
+@logger.log()
+def child():
+    return 'child'
+
+@logger.log(track=True, sample_rate=1.0, tail_sample_rate=0.0, slow_task_threshold=0.05)
+def tail_sampled(sleep, fail):
+    time.sleep(sleep)
+    if fail:
+        try:
+            failing()
+        except ValueError:
+            pass
+
+@logger.log()
+def failing():
+    raise ValueError('failed')
+
+@logger.log(track=True, sample_rate=1.0, max_events_per_second=5)
+def rate_limited():
+    pass
+
+@logger.log(track=True, sample_rate=1.0)
+def chatty():
+    return chat()
+
+# The rate limit of a function applies to the OpenAI calls made inside it
+@logger.log(max_events_per_second=0.5)
+def chat():
+    for _ in range(10):
+        client.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'hi'}])
+
+
+if __name__ == '__main__':
+    for _ in range(100):
+        assert unsampled() == 'child'
+    tail_sampled(0, False)
+    tail_sampled(0.06, False)
+    tail_sampled(0, True)
+    for _ in range(20):
+        rate_limited()
+    rate_limited_before = logger.sampling_stats()['rate_limited']
+    chatty()
+    logger.flush()
+
+    names = [log['function_name'] for log in connector.logs]
+    assert 'unsampled' not in names and 'child' not in names, "Head sampled out tasks should not be recorded"
+    assert names.count('tail_sampled') == 2, "Only the slow and the errored task should be kept"
+    assert names.count('rate_limited') == 5, "Events over the token bucket should be dropped"
+    assert names.count('openai.chat.completions.create') == 1, "The enclosing function's rate limit should apply to its OpenAI calls"
+    assert logger.sampling_stats()['rate_limited'] - rate_limited_before == 9
+    # Over its rate limit, but logged since its child was, so the child is not left orphaned
+    assert names.count('chat') == 1
+    log_ids = {log['log_id'] for log in connector.logs}
+    assert all(log['parent_log_id'] is None or log['parent_log_id'] in log_ids for log in connector.logs)
+    assert logger.sampling_stats() == {'head_sampled_out': 100, 'tail_sampled_out': 1, 'rate_limited': 24}
+    print('Sampling test passed!')
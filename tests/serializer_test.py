@@ -0,0 +1,77 @@
+import dataclasses
+import enum
+from pydantic import BaseModel
+from extensitrace import ExtensiTrace, BaseConnector
+from extensitrace.serializer import Serializer, argument_binder
+
+
+class Message(BaseModel):
+    role: str
+    content: str
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: tuple
+
+class Color(str, enum.Enum):
+    RED = 'red'
+
+class Opaque:
+    def __str__(self):
+        return 'opaque'
+
+def func(a, b, *args, c=None, **kwargs):
+    pass
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+if __name__ == '__main__':
+    serializer = Serializer()
+    safe = {'messages': [{'role': 'user', 'content': 'hi'}], 'n': 1}
+    copy = serializer.serialize(safe)
+    assert copy == safe and copy is not safe and copy['messages'] is not safe['messages'] and copy['messages'][0] is not safe['messages'][0], \
+        "Lists and dicts should be copied so later mutations do not change the logged value"
+
+    value = {'message': Message(role='user', content='hi'), 'point': Point(1, (2, 3)), 'raw': b'\x00\x01', 'color': Color.RED, 'other': Opaque(), 1: {2}}
+    assert serializer.serialize(value) == {
+        'message': {'role': 'user', 'content': 'hi'},
+        'point': {'x': 1, 'y': [2, 3]},
+        'raw': 'AAE=',
+        'color': Color.RED,
+        'other': 'opaque',
+        '1': [2],
+    }
+
+    serializer.register(Opaque, lambda value: {'opaque': (1, 2)})
+    assert serializer.serialize([Opaque()]) == [{'opaque': [1, 2]}]
+
+    bind = argument_binder(func)
+    assert bind((1, 2), {}) == {'a': 1, 'b': 2}
+    assert bind((1, 2, 3), {'c': 4, 'd': 5}) == {'a': 1, 'b': 2, 'args': (3,), 'c': 4, 'kwargs': {'d': 5}}
+
+    # A caller growing a history between calls, as multi-turn agents do
+    connector = MemoryConnector()
+    et = ExtensiTrace(connector=connector)
+
+    @et.log(track=True)
+    def step(messages):
+        return {'seen': messages}
+
+    messages = []
+    for turn in range(3):
+        messages.append({'role': 'user', 'content': f'turn {turn}'})
+        step(messages)
+    messages.append({'role': 'user', 'content': 'after'})
+    messages[0]['content'] = 'changed'
+    et.flush()
+    assert [len(log['args']['messages']) for log in connector.logs] == [1, 2, 3]
+    assert [len(log['result']['seen']) for log in connector.logs] == [1, 2, 3]
+    assert all(log['args']['messages'][0]['content'] == 'turn 0' for log in connector.logs)
+    print('Serializer test passed!')
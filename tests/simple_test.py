@@ -24,6 +24,7 @@ def test3():
 if __name__ == '__main__':
     test()
     test3()
+    logger.flush()
     
     # Load event_log.json and make sure the length is one
     with open('event_log.jsonl', 'r') as file:
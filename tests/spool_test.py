@@ -0,0 +1,106 @@
+import os
+import shutil
+import threading
+import time
+from extensitrace import ExtensiTrace
+from extensitrace.connectors import BaseConnector, SpoolingConnector
+
+
+class FlakyConnector(BaseConnector):
+    def __init__(self, delay=0):
+        self.down = False
+        self.delay = delay
+        self.stored = {}
+        self.lock = threading.Lock()
+
+    def flush(self, logs):
+        time.sleep(self.delay)
+        if self.down:
+            raise ConnectionError('downstream unavailable')
+        if any(log['log_id'] == 'poison' for log in logs):
+            return False
+        with self.lock:
+            for log in logs:
+                self.stored[log['log_id']] = log
+        return True
+
+
+def event(index):
+    return {'log_id': f'log_{index}', 'function_name': 'step', 'start_time': index, 'end_time': index + 1, 'args': {},
+            'result': None, 'task_id': 'task_1', 'agent_id': 'agent_1', 'parent_log_id': None, 'metadata': None,
+            'inferred_accuracy': None, 'accuracy_reasoning': None}
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+if __name__ == '__main__':
+    for directory in ('spool_a', 'spool_b', 'spool_c', 'spool_d'):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # Failed batches are spooled and replayed once the connector recovers
+    flaky = FlakyConnector()
+    connector = SpoolingConnector(flaky, 'spool_a', replay_interval=0.05)
+    flaky.down = True
+    assert connector.flush([event(index) for index in range(10)])
+    assert connector.flush([event(index) for index in range(10, 20)])
+    assert len(os.listdir('spool_a')) == 2 and not flaky.stored
+    flaky.down = False
+    assert wait_for(lambda: len(flaky.stored) == 20), "The spool should drain once the connector recovers"
+    assert wait_for(lambda: connector.available) and os.listdir('spool_a') == []
+    connector.close()
+
+    # The spool is bounded and survives a restart
+    flaky = FlakyConnector()
+    flaky.down = True
+    connector = SpoolingConnector(flaky, 'spool_b', max_spool_bytes=3000, replay_interval=60)
+    assert connector.flush([event(index) for index in range(10)])
+    assert connector.flush([event(index) for index in range(10, 20)]) is False, "Batches over max_spool_bytes should be rejected"
+    assert connector.stats()['rejected'] == 10
+    connector.close()
+    recovered = FlakyConnector()
+    restarted = SpoolingConnector(recovered, 'spool_b', replay_interval=0.05)
+    assert wait_for(lambda: len(recovered.stored) == 10), "Batches spooled by an earlier run should be replayed"
+    restarted.close()
+
+    # A batch the connector always rejects is skipped and quarantined instead of blocking the spool
+    flaky = FlakyConnector()
+    connector = SpoolingConnector(flaky, 'spool_d', replay_interval=0.05, max_replay_attempts=3)
+    assert connector.flush([{**event(0), 'log_id': 'poison'}])
+    for batch in range(5):
+        assert connector.flush([event(batch * 10 + index) for index in range(10)])
+    assert wait_for(lambda: len(flaky.stored) == 50), "Batches behind a rejected one should be delivered"
+    # Further traffic shows the connector is up while the batch keeps failing
+    for batch in range(5, 10):
+        connector.flush([event(batch * 10 + index) for index in range(10)])
+        time.sleep(0.1)
+    assert wait_for(lambda: connector.stats()['quarantined'] == 1), connector.stats()
+    assert wait_for(lambda: len(flaky.stored) == 100) and connector.stats()['pending_batches'] == 0
+    assert os.listdir('spool_d/rejected') and connector.available
+    connector.close()
+
+    # Events that do not fit into the flush queue spill over into the spool instead of being dropped
+    slow = FlakyConnector(delay=0.01)
+    et = ExtensiTrace(connector=slow, spool_dir='spool_c', spool_replay_interval=0.05, max_queue_size=20, max_batch_size=10)
+
+    @et.log(track=True)
+    def task(index):
+        return index
+
+    # Spooling happens on the replay thread, traced calls never wait on the disk
+    write = et.spool.write
+    et.spool.write = lambda logs: time.sleep(0.2) or write(logs)
+    start = time.perf_counter()
+    for index in range(500):
+        task(index)
+    assert time.perf_counter() - start < 1, "Overflowing tasks should not wait for the spool"
+    stats = et.flush_stats()
+    assert stats['dropped'] == 0 and stats['overflowed'] > 0, stats
+    assert wait_for(lambda: len(slow.stored) == 500), f"Every event should arrive, got {len(slow.stored)}"
+    print(f"Spool test passed! {et.flush_stats()}")
+    for directory in ('spool_a', 'spool_b', 'spool_c', 'spool_d'):
+        shutil.rmtree(directory, ignore_errors=True)
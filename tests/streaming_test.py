@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+import httpx
+import openai
+from extensitrace import ExtensiTrace, BaseConnector
+from types import SimpleNamespace
+from extensitrace.streaming import AsyncTracedStream, StreamAccumulator
+
+COMPLETION = 'openai.chat.completions.create'
+
+
+def chunk(delta, finish_reason=None, **extra):
+    return {'id': 'chatcmpl-1', 'object': 'chat.completion.chunk', 'created': 1700000000, 'model': 'gpt-4o-mini',
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}], **extra}
+
+
+TEXT_CHUNKS = [chunk({'role': 'assistant', 'content': ''}), chunk({'content': 'Hello'}), chunk({'content': ', '}),
+               chunk({'content': 'world'}), chunk({}, 'stop'),
+               {**chunk({}), 'choices': [], 'usage': {'prompt_tokens': 7, 'completion_tokens': 3, 'total_tokens': 10}}]
+TOOL_CHUNKS = [chunk({'role': 'assistant', 'tool_calls': [{'index': 0, 'id': 'call_1', 'type': 'function', 'function': {'name': 'search', 'arguments': ''}}]}),
+               chunk({'tool_calls': [{'index': 0, 'function': {'arguments': '{"query": '}}]}),
+               chunk({'tool_calls': [{'index': 0, 'function': {'arguments': '"weather"}'}}]}),
+               chunk({}, 'tool_calls')]
+
+
+def stream_response(request):
+    chunks = TOOL_CHUNKS if b'tools' in request.content else TEXT_CHUNKS
+
+    def body():
+        for index, data in enumerate(chunks):
+            time.sleep(0.05 if index == 0 else 0.01)
+            yield f'data: {json.dumps(data)}\n\n'.encode()
+        yield b'data: [DONE]\n\n'
+    return httpx.Response(200, headers={'content-type': 'text/event-stream'}, content=body())
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+client = openai.OpenAI(api_key='test', http_client=httpx.Client(transport=httpx.MockTransport(stream_response)))
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(client=client, connector=connector, max_linger_time=0.01)
+
+def create(**kwargs):
+    return client.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'hi'}], stream=True, **kwargs)
+
+@logger.log(track=True)
+def read_stream():
+    return ''.join(part.choices[0].delta.content or '' for part in create() if part.choices)
+
+@logger.log(track=True)
+def return_stream():
+    return create()
+
+@logger.log(track=True)
+def read_tool_call():
+    for _ in create(tools=[{'type': 'function', 'function': {'name': 'search', 'parameters': {}}}]):
+        pass
+
+@logger.log(track=True)
+def break_early():
+    for _ in create():
+        break
+
+@logger.log(track=True)
+def close_early():
+    with create() as stream:
+        for _ in stream:
+            break
+
+
+class FakeAsyncStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for data in self.chunks:
+            await asyncio.sleep(0.01)
+            yield openai.types.chat.ChatCompletionChunk(**data)
+
+    async def close(self):
+        self.closed = True
+
+
+def logs_of(task_name):
+    task_log = next(log for log in connector.logs if log['function_name'] == task_name)
+    return task_log, [log for log in connector.logs if log['task_id'] == task_log['task_id'] and log['function_name'] == COMPLETION]
+
+
+async def read_async(stream):
+    return [part async for part in stream]
+
+
+if __name__ == '__main__':
+    assert read_stream() == 'Hello, world'
+    stream = return_stream()
+    chunks_read = 0
+    for part in stream:
+        chunks_read += 1
+    read_tool_call()
+    close_early()
+    break_early()
+    # Dropped unfinished after its task completed
+    stream = return_stream()
+    next(stream)
+    del stream
+    logger.flush()
+
+    task_log, completions = logs_of('read_stream')
+    assert len(completions) == 1 and completions[0]['parent_log_id'] == task_log['log_id']
+    result = completions[0]['result']
+    assert result['choices'] == [{'index': 0, 'message': {'role': 'assistant', 'content': 'Hello, world'}, 'finish_reason': 'stop'}]
+    assert result['usage'] == {'prompt_tokens': 7, 'completion_tokens': 3, 'total_tokens': 10} and result['model'] == 'gpt-4o-mini'
+    timings = result['stream']
+    assert timings['completed'] and timings['chunks'] == len(TEXT_CHUNKS)
+    assert timings['time_to_first_token'] >= 0.04 and timings['inter_chunk']['max'] >= 0.005 and timings['duration'] >= timings['time_to_first_token']
+    assert completions[0]['end_time'] - completions[0]['start_time'] >= timings['duration'] - 0.01
+
+    # Read after the decorated function returned and its task completed
+    task_log, completions = logs_of('return_stream')
+    assert chunks_read == len(TEXT_CHUNKS) and len(completions) == 1
+    assert completions[0]['parent_log_id'] == task_log['log_id'] and completions[0]['result']['stream']['completed']
+    dropped = [log for log in connector.logs if log['function_name'] == COMPLETION and log['result']['stream']['completed'] is False
+               and log['result']['stream']['chunks'] == 1 and log['task_id'] != task_log['task_id']]
+    assert len(dropped) == 3, "Closed, broken out of and dropped streams should each be logged once"
+
+    _, completions = logs_of('read_tool_call')
+    message = completions[0]['result']['choices'][0]['message']
+    assert message['tool_calls'] == [{'id': 'call_1', 'type': 'function', 'function': {'name': 'search', 'arguments': '{"query": "weather"}'}}]
+    assert completions[0]['result']['choices'][0]['finish_reason'] == 'tool_calls'
+
+    for name in ('close_early', 'break_early'):
+        task_log, completions = logs_of(name)
+        assert len(completions) == 1 and completions[0]['parent_log_id'] == task_log['log_id']
+        assert completions[0]['result']['stream']['completed'] is False and completions[0]['result']['stream']['chunks'] == 1
+
+    logged = []
+    fake = FakeAsyncStream(TEXT_CHUNKS)
+    parts = asyncio.run(read_async(AsyncTracedStream(fake, lambda result, error: logged.append((result, error)))))
+    assert len(parts) == len(TEXT_CHUNKS) and len(logged) == 1 and logged[0][1] is None
+    assert logged[0][0]['choices'][0]['message']['content'] == 'Hello, world' and logged[0][0]['stream']['completed']
+
+    # Responses API streams end with an event carrying the whole response
+    accumulator = StreamAccumulator()
+    response = {'id': 'resp_1', 'model': 'gpt-4o-mini', 'usage': {'input_tokens': 5, 'output_tokens': 2, 'total_tokens': 7}}
+    accumulator.add(SimpleNamespace(type='response.output_text.delta', delta='Hi'))
+    accumulator.add(SimpleNamespace(type='response.completed', response=SimpleNamespace(model_dump=lambda: response)))
+    result = accumulator.result(completed=True)
+    assert result['usage'] == response['usage'] and result['stream']['chunks'] == 2
+    print('Streaming test passed!')
@@ -0,0 +1,61 @@
+import time
+from threading import Event, Thread
+from extensitrace import ExtensiTrace, BaseConnector
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(connector=connector, max_live_tasks=3, task_ttl=0.2)
+
+release = Event()
+
+@logger.log(track=True)
+def stuck(index):
+    child(index)
+    release.wait()
+
+@logger.log()
+def child(index):
+    return index
+
+@logger.log(track=True)
+def completed():
+    pass
+
+
+if __name__ == '__main__':
+    threads = []
+    for i in range(5):
+        threads.append(Thread(target=stuck, args=(i,)))
+        threads[-1].start()
+        time.sleep(0.01)
+    stats = logger.task_store_stats()
+    assert stats['live_tasks'] == 3 and stats['evicted_tasks'] == 2, "Tasks over max_live_tasks should be evicted oldest first"
+    assert stats['buffered_events'] == 3 and stats['bytes_held'] > 0
+
+    time.sleep(0.3)
+    completed()
+    logger.flush()
+    stats = logger.task_store_stats()
+    assert stats['live_tasks'] == 0 and stats['evicted_tasks'] == 5, "Tasks older than task_ttl should be evicted"
+
+    children = [log for log in connector.logs if log['function_name'] == 'child']
+    assert sorted(log['args']['index'] for log in children) == list(range(5))
+    assert all(log['metadata'] == {'_incomplete': True} for log in children), "Events of evicted tasks should be marked incomplete"
+    assert [log['metadata'] for log in connector.logs if log['function_name'] == 'completed'] == [None]
+
+    release.set()
+    for t in threads:
+        t.join()
+    logger.flush()
+    stuck_logs = [log for log in connector.logs if log['function_name'] == 'stuck']
+    assert len(stuck_logs) == 5 and all(log['metadata'] is None for log in stuck_logs), "Evicted tasks completing later should flush their remaining events"
+    assert len(connector.logs) == 11
+    print('Task store test passed!')
@@ -0,0 +1,95 @@
+import time
+import httpx
+import openai
+from extensitrace import ExtensiTrace, BaseConnector
+from extensitrace.summary import SUMMARY_FUNCTION_NAME, TaskSummary, model_price, DEFAULT_MODEL_PRICES
+
+
+def completion_response(request):
+    time.sleep(0.01)
+    return httpx.Response(200, json={
+        'id': f'chatcmpl-{time.time_ns()}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': 'gpt-4o-mini-2024-07-18',
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'hi'}}],
+        'usage': {'prompt_tokens': 1000, 'completion_tokens': 200, 'total_tokens': 1200},
+    })
+
+
+class MemoryConnector(BaseConnector):
+    def __init__(self):
+        self.logs = []
+
+    def flush(self, logs):
+        self.logs.extend(logs)
+
+
+def span(log_id, parent_log_id, name, start, end, result=None):
+    return {'log_id': log_id, 'parent_log_id': parent_log_id, 'function_name': name, 'start_time': start, 'end_time': end, 'result': result}
+
+
+client = openai.OpenAI(api_key='test', http_client=httpx.Client(transport=httpx.MockTransport(completion_response)))
+connector = MemoryConnector()
+logger: ExtensiTrace = ExtensiTrace(client=client, connector=connector, task_summary=True, max_linger_time=0.01)
+
+@logger.log(track=True)
+def agent():
+    plan()
+    search()
+
+@logger.log()
+def plan():
+    return client.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'plan'}])
+
+@logger.log()
+def search():
+    time.sleep(0.05)
+    fetch()
+
+@logger.log()
+def fetch():
+    time.sleep(0.02)
+
+
+if __name__ == '__main__':
+    assert model_price('gpt-4o-mini-2024-07-18', DEFAULT_MODEL_PRICES) == DEFAULT_MODEL_PRICES['gpt-4o-mini']
+    assert model_price('gpt-4-0613', DEFAULT_MODEL_PRICES) == DEFAULT_MODEL_PRICES['gpt-4']
+    assert model_price('gpt-4.5-preview', DEFAULT_MODEL_PRICES) is None
+
+    # Children are added before their parents, as the tracer logs them when the calls end
+    summary = TaskSummary(DEFAULT_MODEL_PRICES)
+    summary.add(span('c', 'b', 'leaf', 1.0, 3.0))
+    summary.add(span('b', 'a', 'slow', 0.5, 4.0))
+    summary.add(span('d', 'a', 'openai.responses.create', 4.0, 5.0, {'model': 'custom-model', 'usage': {'input_tokens': 3, 'output_tokens': 4}}))
+    summary.add(span('a', None, 'root', 0.0, 6.0))
+    result = summary.result()
+    assert result['duration'] == 6.0 and result['root_log_id'] == 'a'
+    assert result['functions']['root'] == {'calls': 1, 'total_time': 6.0, 'self_time': 1.5}
+    assert result['functions']['slow']['self_time'] == 1.5
+    assert [step['function_name'] for step in result['critical_path']] == ['root', 'slow', 'leaf']
+    assert result['tokens'] == {'prompt_tokens': 3, 'completion_tokens': 4, 'total_tokens': 7}
+    assert result['unpriced_models'] == ['custom-model'] and result['cost'] == 0
+    summary.add(span('e', None, 'returns_response', 6.0, 7.0, {'model': 'custom-model', 'usage': {'input_tokens': 3, 'output_tokens': 4}}))
+    assert summary.result()['tokens']['total_tokens'] == 7, "Only API call events should count tokens"
+    assert not summary.child_time and not summary.longest_path, "State of finished calls should be released"
+
+    for _ in range(3):
+        agent()
+    logger.flush()
+
+    summaries = [log for log in connector.logs if log['function_name'] == SUMMARY_FUNCTION_NAME]
+    assert len(summaries) == 3 and len({log['task_id'] for log in summaries}) == 3
+    for summary_log in summaries:
+        events = [log for log in connector.logs if log['task_id'] == summary_log['task_id'] and log is not summary_log]
+        result = summary_log['result']
+        root = next(log for log in events if log['function_name'] == 'agent')
+        assert result['root_log_id'] == root['log_id'] and result['events'] == len(events) == 5
+        assert abs(result['duration'] - (root['end_time'] - root['start_time'])) < 1e-5
+        assert [step['function_name'] for step in result['critical_path']] == ['agent', 'search', 'fetch']
+        assert result['functions']['search']['self_time'] >= 0.045 and result['functions']['agent']['self_time'] < 0.01
+        assert result['tokens'] == {'prompt_tokens': 1000, 'completion_tokens': 200, 'total_tokens': 1200}
+        model = result['models']['gpt-4o-mini-2024-07-18']
+        assert model['calls'] == 1 and abs(model['cost'] - (1000 * 0.15 + 200 * 0.60) / 1e6) < 1e-12
+        assert result['cost'] == model['cost'] and summary_log['metadata'] == root['metadata']
+    print('Task summary test passed!')